@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Parallel Scaling Benchmark
+--------------------------
+Measures how EdgeDetector scales with the number of row-band worker
+threads on a single large synthetic image.
+
+Usage: python benchmarks/parallel_scaling.py [--width W] [--height H]
+       [--workers 1 2 4 8] [--repeat N]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.edge_detection import EdgeDetector  # noqa: E402
+
+
+def make_test_image(width, height, seed=0):
+    """Create a textured BGR test image with some solid shapes"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (7, 7), 0)
+    cv2.circle(image, (width // 2, height // 2), min(width, height) // 4,
+               (30, 200, 90), -1)
+    cv2.rectangle(image, (width // 10, height // 10),
+                  (width // 3, height // 3), (240, 240, 240), -1)
+    return image
+
+
+def time_method(detector, method, image, out, repeat):
+    """Return the best wall time in seconds over repeat runs"""
+    detector.apply(method, image, out=out)  # Warm up threads and buffers
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detector.apply(method, image, out=out)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark row-band parallel edge detection")
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    image = make_test_image(args.width, args.height)
+    out = np.empty(image.shape[:2], dtype=np.uint8)
+    print(f"Image: {args.width}x{args.height}, CPU cores: {os.cpu_count()}")
+    print(f"{'Method':<10} {'Workers':>7} {'Time (ms)':>10} {'Speedup':>8}")
+
+    for method in EdgeDetector.METHODS:
+        baseline = None
+        for workers in args.workers:
+            detector = EdgeDetector(workers=workers)
+            elapsed = time_method(detector, method, image, out, args.repeat)
+            baseline = baseline or elapsed
+            print(f"{method:<10} {workers:>7} {elapsed * 1000:>10.1f} "
+                  f"{baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,12 @@
 Edge Detection Application
 -------------------------
 Main entry point for the Flower Edge Detection Application.
+
+Run without arguments to start the GUI, or as
+`python main.py batch INPUT_DIR OUTPUT_DIR [options]` to process a
+directory of images without a display, or as
+`python main.py stream SOURCE [options]` to process a video file or
+camera.
 """
 
 import os
@@ -23,6 +29,15 @@ logger = logging.getLogger('edge_detection')
 
 def main():
     """Main entry point for the application"""
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        # Headless mode; must not import PyQt6
+        from src.app.batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "stream":
+        # Headless video mode; must not import PyQt6 either
+        from src.app.stream import main as stream_main
+        sys.exit(stream_main(sys.argv[2:]))
+
     try:
         # Import the main app module
         from src.app.main import run_pyqt_app_with_splash
@@ -0,0 +1,512 @@
+"""
+Headless batch processing for Flower Edge Detection.
+
+Runs the edge detectors over whole directories without starting the PyQt6
+GUI, so it works on servers and in containers without a display:
+
+    python main.py batch INPUT_DIR OUTPUT_DIR [options]
+    python -m src.app.batch INPUT_DIR OUTPUT_DIR [options]
+
+Results are written as {Method}_{basename}.png (or .webp, .npz with
+--format), the same names the GUI's "Save Results" uses, mirroring the input
+directory layout.
+
+With --memmap, .npy, .raw and uncompressed TIFF inputs are memory-mapped,
+the detectors run tile by tile, and every result is written straight into
+a memory-mapped {Method}_{basename}.npy file, so images and datasets far
+larger than the RAM can be processed.
+"""
+
+import os
+import sys
+import time
+import fnmatch
+import logging
+import argparse
+
+from src.utils.batch_executor import SharedMemoryExecutor
+from src.utils.edge_detection import EdgeDetector
+from src.utils.image_processor import (ImageProcessor, PNG_STRATEGIES,
+                                       SAVE_FORMATS)
+from src.utils.pipeline import EdgeDetectionPipeline
+from src.utils.result_cache import ResultCache
+from src.utils.tiling import DEFAULT_TILE_SIZE, TiledEdgeDetector
+
+logger = logging.getLogger('edge_detection.batch')
+
+# Same file types the GUI's open dialog offers
+DEFAULT_PATTERNS = ["*.jpg", "*.jpeg", "*.png", "*.bmp", "*.gif"]
+
+# Also included with --memmap, the files ImageProcessor.map_image can map
+MAPPABLE_PATTERNS = ["*.npy", "*.raw", "*.tif", "*.tiff"]
+
+
+def find_images(input_dir, patterns=None, recursive=False):
+    """Find the image files in a directory
+
+    Parameters:
+    - input_dir: Directory to search
+    - patterns: Glob patterns file names must match (case-insensitive)
+    - recursive: Whether to descend into subdirectories
+
+    Returns:
+    - Sorted list of image paths
+    """
+    patterns = [p.lower() for p in (patterns or DEFAULT_PATTERNS)]
+    image_paths = []
+    for root, dirs, files in os.walk(input_dir):
+        for name in files:
+            if any(fnmatch.fnmatch(name.lower(), p) for p in patterns):
+                image_paths.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return sorted(image_paths)
+
+
+def result_path(image_path, input_dir, output_dir, method,
+                extension=".png"):
+    """Path a result is written to, mirroring the input directory layout"""
+    relative_dir = os.path.relpath(os.path.dirname(image_path), input_dir)
+    return os.path.normpath(os.path.join(
+        output_dir, relative_dir,
+        ImageProcessor.result_filename(method, image_path, extension)))
+
+
+def method_params(args):
+    """Extra detector arguments per method from the command line"""
+    return {
+        "Canny": {"threshold1": args.canny_low,
+                  "threshold2": args.canny_high,
+                  "blur_ksize": args.blur_ksize,
+                  "auto_threshold": args.canny_auto,
+                  "sigma": args.canny_sigma},
+        "Laplacian": {"blur_ksize": args.blur_ksize},
+    }
+
+
+def save_options(args):
+    """ImageProcessor.save_image arguments from the command line"""
+    return {"compression": args.png_compression,
+            "strategy": args.png_strategy,
+            "bilevel": args.bilevel}
+
+
+def decode_options(args):
+    """ImageProcessor.read_image arguments from the command line"""
+    target_size = None
+    if args.max_size:
+        target_size = (args.max_size, args.max_size)
+    return {"target_size": target_size, "grayscale": args.gray_decode}
+
+
+def make_detector(args):
+    """Create the edge detector, with a result cache if one was requested"""
+    cache = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir,
+                            max_bytes=int(args.cache_size * 2**20),
+                            pack_binary=args.pack_binary)
+    return EdgeDetector(precision=args.precision, workers=args.threads,
+                        cache=cache, scales=args.scales, fusion=args.fusion)
+
+
+def process_file(image_path, args, detector, image_processor):
+    """Run the selected methods on one image and save the results
+
+    Returns:
+    - Number of result images written
+    """
+    image = image_processor.load_image(image_path, **decode_options(args))
+    if image is None:
+        raise ValueError("Could not read the image")
+
+    # One preprocessing context shared by all methods
+    context = detector.prepare(image)
+    params = method_params(args)
+    results = {method: detector.apply(method, context,
+                                      **params.get(method, {}))
+               for method in args.methods}
+    return save_results(image_path, results, args, image_processor)
+
+
+def save_results(image_path, results, args, image_processor):
+    """Save the result images of one input image
+
+    Returns:
+    - Number of result images written
+    """
+    for method, result in results.items():
+        save_path = result_path(image_path, args.input_dir, args.output_dir,
+                                method, SAVE_FORMATS[args.format])
+        if not image_processor.save_image(result, save_path,
+                                          **save_options(args)):
+            raise IOError(f"Could not write {save_path}")
+    return len(results)
+
+
+def run_sequential(image_paths, args):
+    """Process the images one after another in this process
+
+    Yields:
+    - (image path, saved result count, error message or None)
+    """
+    detector = make_detector(args)
+    image_processor = ImageProcessor()
+    for image_path in image_paths:
+        try:
+            saved = process_file(image_path, args, detector, image_processor)
+            yield image_path, saved, None
+        except Exception as e:
+            yield image_path, 0, str(e)
+    if detector.cache is not None:
+        logger.info(detector.cache.stats_text())
+
+
+def run_processes(image_paths, args):
+    """Process the images on a pool of worker processes
+
+    The images are decoded and the results encoded in this process while
+    the workers run the detectors on frames in shared memory.
+
+    Yields:
+    - (image path, saved result count, error message or None)
+    """
+    image_processor = ImageProcessor()
+    unreadable = []
+
+    def frames():
+        for image_path in image_paths:
+            image = image_processor.load_image(image_path,
+                                               **decode_options(args))
+            if image is None:
+                unreadable.append(image_path)
+                continue
+            yield image_path, image
+
+    with SharedMemoryExecutor(
+            args.methods, processes=args.processes,
+            precision=args.precision, threads=args.threads,
+            scales=args.scales, fusion=args.fusion,
+            params=method_params(args), max_in_flight=args.max_in_flight,
+            chunk_size=args.chunk_size) as executor:
+        for image_path, results, error in executor.map(
+                frames(), ordered=not args.unordered):
+            while unreadable:
+                yield unreadable.pop(0), 0, "Could not read the image"
+            if error is not None:
+                yield image_path, 0, error
+                continue
+            try:
+                saved = save_results(
+                    image_path, results, args, image_processor)
+                yield image_path, saved, None
+            except Exception as e:
+                yield image_path, 0, str(e)
+    for image_path in unreadable:
+        yield image_path, 0, "Could not read the image"
+
+
+def run_pipeline(image_paths, args):
+    """Process the images with concurrent decode, detect and encode stages
+
+    Yields:
+    - (image path, saved result count, error message or None)
+    """
+    detector = make_detector(args)
+    pipeline = EdgeDetectionPipeline(
+        args.methods, detector=detector, params=method_params(args),
+        queue_size=args.queue_size, decoders=args.io_threads,
+        encoders=args.io_threads, save_options=save_options(args),
+        **decode_options(args))
+    jobs = ((image_path,
+             {method: result_path(image_path, args.input_dir,
+                                  args.output_dir, method,
+                                  SAVE_FORMATS[args.format])
+              for method in args.methods})
+            for image_path in image_paths)
+    yield from pipeline.run(jobs)
+    if detector.cache is not None:
+        logger.info(detector.cache.stats_text())
+
+
+def run_mapped(image_paths, args):
+    """Process memory-mapped images tile by tile into memory-mapped results
+
+    Only a few tiles of the input and of each result are in memory at a
+    time. Files that cannot be mapped, e.g. JPEG or compressed TIFF
+    files, are decoded into memory, and their results are still written
+    to memory-mapped files.
+
+    Yields:
+    - (image path, saved result count, error message or None)
+    """
+    tiled = TiledEdgeDetector(EdgeDetector(precision=args.precision),
+                              tile_size=args.tile_size, workers=args.threads)
+    image_processor = ImageProcessor()
+    params = method_params(args)
+    try:
+        for image_path in image_paths:
+            try:
+                image = image_processor.map_image(image_path, args.raw_shape)
+                if image is None:
+                    image = image_processor.read_image(
+                        image_path, **decode_options(args))
+                if image is None:
+                    raise ValueError("Could not read the image")
+                for method in args.methods:
+                    out = image_processor.map_output(
+                        result_path(image_path, args.input_dir,
+                                    args.output_dir, method, ".npy"),
+                        image.shape[:2])
+                    tiled.apply(method, image, out=out,
+                                **params.get(method, {}))
+                    out.flush()
+                    del out
+                yield image_path, len(args.methods), None
+            except Exception as e:
+                yield image_path, 0, str(e)
+    finally:
+        tiled.shutdown()
+
+
+def run_batch(args):
+    """Process every matching image in the input directory
+
+    Returns:
+    - Tuple (processed image count, failed image count)
+    """
+    patterns = args.pattern
+    if patterns is None and args.memmap:
+        patterns = DEFAULT_PATTERNS + MAPPABLE_PATTERNS
+    image_paths = find_images(args.input_dir, patterns, args.recursive)
+    if not image_paths:
+        logger.warning(f"No images found in {args.input_dir}")
+        return 0, 0
+
+    if args.memmap:
+        outcomes = run_mapped(image_paths, args)
+    elif args.processes > 1:
+        outcomes = run_processes(image_paths, args)
+    elif args.pipeline:
+        outcomes = run_pipeline(image_paths, args)
+    else:
+        outcomes = run_sequential(image_paths, args)
+
+    processed = failed = 0
+    start = time.perf_counter()
+    for index, (image_path, saved, error) in enumerate(outcomes, 1):
+        if error is None:
+            processed += 1
+            logger.info(f"[{index}/{len(image_paths)}] {image_path}: "
+                        f"{saved} results saved")
+        else:
+            failed += 1
+            logger.error(f"[{index}/{len(image_paths)}] {image_path}: "
+                         f"{error}")
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Processed {processed} images ({failed} failed) in "
+                f"{elapsed:.1f}s, {rate:.2f} images/s")
+    return processed, failed
+
+
+def add_detector_arguments(parser):
+    """Add the detector and method options shared with the stream mode"""
+    parser.add_argument(
+        "--precision", choices=EdgeDetector.PRECISIONS,
+        default=EdgeDetector.PRECISION_FLOAT32,
+        help="Gradient arithmetic precision (default: %(default)s)")
+    parser.add_argument(
+        "--threads", type=int, default=1,
+        help="Threads each image is split across (default: %(default)s)")
+    parser.add_argument(
+        "--scales", type=int, default=1,
+        help="Pyramid levels each method runs on and fuses, 1 for the "
+             "image resolution only (default: %(default)s)")
+    parser.add_argument(
+        "--fusion", choices=EdgeDetector.FUSIONS,
+        default=EdgeDetector.FUSION_MAX,
+        help="How --scales levels are combined (default: %(default)s)")
+    parser.add_argument("--canny-low", type=float, default=100,
+                        help="Canny low threshold (default: %(default)s)")
+    parser.add_argument("--canny-high", type=float, default=200,
+                        help="Canny high threshold (default: %(default)s)")
+    parser.add_argument(
+        "--canny-auto", choices=EdgeDetector.AUTO_THRESHOLDS,
+        help="Estimate the Canny thresholds per image from the median "
+             "intensity or by Otsu's method on the gradient magnitude, "
+             "instead of --canny-low/--canny-high")
+    parser.add_argument(
+        "--canny-sigma", type=float, default=0.33,
+        help="Spread around the median for --canny-auto median "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--blur-ksize", type=int, default=5,
+        help="Gaussian blur kernel size for Canny and Laplacian "
+             "(default: %(default)s)")
+
+
+def raw_shape(text):
+    """Parse a HEIGHTxWIDTH or HEIGHTxWIDTHx3 argument"""
+    try:
+        shape = tuple(int(size) for size in text.lower().split("x"))
+    except ValueError:
+        shape = ()
+    if len(shape) not in (2, 3) or min(shape) < 1 \
+            or (len(shape) == 3 and shape[2] != 3):
+        raise argparse.ArgumentTypeError(
+            f"expected HEIGHTxWIDTH or HEIGHTxWIDTHx3, got {text!r}")
+    return shape
+
+
+def add_save_arguments(parser):
+    """Add the result file format options shared with the stream mode"""
+    parser.add_argument(
+        "--format", choices=list(SAVE_FORMATS), default="png",
+        help="Lossless format of the result files; webp files are smaller "
+             "but much slower to write, npz files hold NumPy arrays with "
+             "binary edge maps bit-packed (default: %(default)s)")
+    parser.add_argument(
+        "--png-compression", type=int, choices=range(10), metavar="LEVEL",
+        help="PNG zlib level from 0 (fastest) to 9 (smallest) "
+             "(default: OpenCV's, tuned for speed)")
+    parser.add_argument(
+        "--png-strategy", choices=list(PNG_STRATEGIES),
+        help="PNG zlib strategy; rle with --png-compression 1 or more "
+             "gives the smallest edge maps quickly (default: OpenCV's)")
+    parser.add_argument(
+        "--bilevel", action="store_true",
+        help="Write binary edge maps, e.g. Canny, as PNG with 1 bit per "
+             "pixel")
+
+
+def build_parser():
+    """Create the command line parser"""
+    parser = argparse.ArgumentParser(
+        prog="batch",
+        description="Apply edge detection to every image in a directory "
+                    "without starting the GUI.")
+    parser.add_argument("input_dir", help="Directory containing the images")
+    parser.add_argument("output_dir", help="Directory to write results to")
+    parser.add_argument(
+        "-m", "--methods", nargs="+", choices=EdgeDetector.METHODS,
+        default=list(EdgeDetector.METHODS), metavar="METHOD",
+        help="Methods to apply: %(choices)s (default: all)")
+    parser.add_argument(
+        "-p", "--pattern", action="append", metavar="GLOB",
+        help="File name pattern to include, may be repeated "
+             f"(default: {' '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="Also process images in subdirectories")
+    parser.add_argument(
+        "--max-size", type=int, metavar="PIXELS",
+        help="Scale images down to fit PIXELS x PIXELS before processing, "
+             "e.g. for thumbnails; JPEG files are then decoded at reduced "
+             "size")
+    parser.add_argument(
+        "--gray-decode", action="store_true",
+        help="Decode JPEG files straight to grayscale, which is faster; "
+             "results may differ by a grey level at a few pixels")
+    add_detector_arguments(parser)
+    add_save_arguments(parser)
+    parser.add_argument(
+        "--processes", type=int, default=1,
+        help="Worker processes running the detectors; frames are passed "
+             "through shared memory (default: %(default)s)")
+    parser.add_argument(
+        "--chunk-size", type=int, default=1,
+        help="Images sent to a worker process at a time "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--max-in-flight", type=int, default=None,
+        help="Images decoded but not yet saved, bounds memory use "
+             "(default: four chunks per process)")
+    parser.add_argument(
+        "--unordered", action="store_true",
+        help="Save results as soon as they are ready instead of in "
+             "input order")
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Decode, detect and encode in concurrent stages connected by "
+             "bounded queues")
+    parser.add_argument(
+        "--queue-size", type=int, default=4,
+        help="Images held between two pipeline stages "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--io-threads", type=int, default=1,
+        help="Decoding and encoding threads of the pipeline "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--memmap", action="store_true",
+        help="Memory-map .npy, .raw and uncompressed TIFF inputs (TIFF "
+             "needs the tifffile package), process them tile by tile and "
+             "write each result into a memory-mapped .npy file, for images "
+             "larger than the RAM")
+    parser.add_argument(
+        "--tile-size", type=int, default=DEFAULT_TILE_SIZE, metavar="PIXELS",
+        help="Edge length of the tiles with --memmap (default: %(default)s)")
+    parser.add_argument(
+        "--raw-shape", type=raw_shape, metavar="HxW[x3]",
+        help="Height and width of .raw inputs, followed by x3 for BGR "
+             "colour images")
+    parser.add_argument(
+        "--cache-dir", metavar="DIR",
+        help="Reuse results cached in DIR from earlier runs with the same "
+             "images and parameters (not used with --processes or "
+             "--memmap)")
+    parser.add_argument(
+        "--cache-size", type=float, default=512, metavar="MB",
+        help="Size cap of the result cache; least recently used results "
+             "are deleted beyond it (default: %(default)s)")
+    parser.add_argument(
+        "--pack-binary", action="store_true",
+        help="Store binary edge maps, e.g. Canny, in the result cache "
+             "bit-packed or as edge point lists, at most an eighth of the "
+             "size")
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the batch mode
+
+    Parameters:
+    - argv: Command line arguments (default: sys.argv[1:])
+
+    Returns:
+    - Process exit code
+    """
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: Input directory not found: {args.input_dir}")
+        return 2
+    if args.blur_ksize < 1 or args.blur_ksize % 2 == 0:
+        print("Error: --blur-ksize must be a positive odd number")
+        return 2
+    if args.processes < 1 or args.chunk_size < 1:
+        print("Error: --processes and --chunk-size must be at least 1")
+        return 2
+    if args.pipeline and args.processes > 1:
+        print("Error: --pipeline cannot be combined with --processes")
+        return 2
+    if args.memmap and (args.processes > 1 or args.pipeline
+                        or args.scales > 1 or args.max_size):
+        print("Error: --memmap cannot be combined with --processes, "
+              "--pipeline, --scales or --max-size")
+        return 2
+    if args.tile_size < 1:
+        print("Error: --tile-size must be at least 1")
+        return 2
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    _, failed = run_batch(args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from src.utils.image_processor import ImageProcessor
+
+
+class DetectionSignals(QObject):
+    """Signals of a DetectionTask, delivered on the GUI thread
+
+    Every signal carries the generation the task was started for, so the
+    receiver can drop results of images that were replaced meanwhile.
+    """
+
+    # generation, method, edge image, edge image scaled for display
+    result = pyqtSignal(int, str, object, object)
+    error = pyqtSignal(int, str, str)  # generation, method, message
+    finished = pyqtSignal(int)  # generation
+
+
+class DetectionTask(QRunnable):
+    """Run edge detection methods on a QThreadPool thread
+
+    The methods run one after another and each result is posted back
+    through the signals as soon as it is ready. Setting the shared cancel
+    event, or calling cancel() for this task alone, stops the task before
+    its next method; a method that already started runs to completion, and
+    its result is discarded by the receiver.
+
+    Scaling a large result down to the display size takes about as long
+    as some detectors, so it is done here as well instead of on the GUI
+    thread.
+    """
+
+    def __init__(self, detector, context, methods, generation,
+                 cancelled=None, display_size=None, params=None):
+        """Create a detection task
+
+        Parameters:
+        - detector: EdgeDetector to run the methods with
+        - context: PreprocessContext of the image
+        - methods: Names of the methods to apply
+        - generation: Number identifying the image the task belongs to
+        - cancelled: threading.Event that cancels the task when set
+        - display_size: Tuple (width, height) the posted previews fit in,
+          or None to post the full results as previews
+        - params: Dict of extra arguments per method, e.g. thresholds
+        """
+        super().__init__()
+        self.detector = detector
+        self.context = context
+        self.methods = list(methods)
+        self.generation = generation
+        self.cancelled = cancelled if cancelled is not None \
+            else threading.Event()
+        self.display_size = display_size
+        self.params = params or {}
+        self._superseded = threading.Event()
+        self.image_processor = ImageProcessor()
+        self.signals = DetectionSignals()
+
+    def cancel(self):
+        """Cancel this task only, e.g. when a newer task replaces it"""
+        self._superseded.set()
+
+    def run(self):
+        for method in self.methods:
+            if self.cancelled.is_set() or self._superseded.is_set():
+                break
+            try:
+                result = self.detector.apply(
+                    method, self.context, **self.params.get(method, {}))
+                preview = result
+                if self.display_size is not None:
+                    preview = self.image_processor.resize_for_display(
+                        result, self.display_size)
+            except Exception as e:
+                self.signals.error.emit(self.generation, method, str(e))
+                continue
+            self.signals.result.emit(self.generation, method, result, preview)
+        self.signals.finished.emit(self.generation)
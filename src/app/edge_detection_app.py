@@ -1,17 +1,48 @@
 import os
-import cv2
+import threading
 import numpy as np
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QLabel, QFileDialog, QMessageBox, QFrame, QGridLayout, QCheckBox, QMenuBar)
-from PyQt6.QtGui import QPixmap, QImage, QAction, QIcon
-from PyQt6.QtCore import Qt, QSize
+                             QPushButton, QLabel, QFileDialog, QMessageBox, QFrame, QGridLayout, QCheckBox, QMenuBar, QSlider,
+                             QComboBox, QProgressBar)
+from PyQt6.QtGui import QPixmap, QAction, QActionGroup, QIcon
+from PyQt6.QtCore import Qt, QEvent, QSize, QThreadPool, QTimer
 import platform
 import sys  # Import sys for MEIPASS
 
 # Import from modular structure
 # Unused Tkinter imports removed
+from src.app.detection_worker import DetectionTask
+from src.app.save_worker import SaveTask
 from src.utils.edge_detection import EdgeDetector
-from src.utils.image_processor import ImageProcessor
+from src.utils.image_cache import DEFAULT_IMAGE_CACHE_BYTES
+from src.utils.image_processor import ImageProcessor, SAVE_FORMATS
+from src.utils.result_cache import ResultCache
+from src.utils.video import SYNTHETIC_SOURCE, VideoStream
+
+# Pyramid levels the detectors fuse when "Multi-Scale" is checked
+MULTI_SCALE_LEVELS = 3
+
+# Magnification of one mouse wheel step over the original image, and the
+# fewest full resolution pixels a zoomed view still shows across
+ZOOM_STEP = 1.25
+MIN_ZOOM_VIEW = 16
+
+# Milliseconds between two checks for a new video frame, about the
+# display refresh rate
+STREAM_DISPLAY_INTERVAL = 16
+
+# Formats offered by "Save Results": (menu label, format name in
+# SAVE_FORMATS, ImageProcessor.save_image options). OpenCV's default PNG
+# settings are the fastest; zlib's RLE strategy makes files about a tenth
+# smaller in two to three times the time, and lossless WebP about a
+# quarter smaller in ten times the time. NumPy archives hold binary edge
+# maps bit-packed.
+SAVE_PRESETS = [
+    ("PNG (&Fast)", "png", {}),
+    ("PNG (&Small)", "png", {"compression": 1, "strategy": "rle"}),
+    ("&WebP (Lossless)", "webp", {}),
+    ("&NumPy Archive", "npz", {}),
+]
 
 
 class EdgeDetectionApp(QMainWindow):
@@ -28,15 +59,46 @@ class EdgeDetectionApp(QMainWindow):
         self.apply_platform_adjustments()
 
         # Initialize components
-        self.image_processor = ImageProcessor()
-        self.edge_detector = EdgeDetector()
+        # Recently opened images stay in memory for quick switching, with
+        # their Canny edge maps bit-packed
+        self.image_processor = ImageProcessor(
+            cache_bytes=DEFAULT_IMAGE_CACHE_BYTES, pack_binary=True)
+        self.result_cache = self.open_result_cache()
+        self.edge_detector = EdgeDetector(cache=self.result_cache)
+        # Previews and live slider updates are cheap to recompute and would
+        # flood the result cache, so they bypass it
+        self.live_detector = EdgeDetector()
 
         # Variables
         self.image_path = None
         self.original_image = None
         self.original_image_qimage = None  # For PyQt display
+        self.preprocessed = None  # Grayscale/blur shared by all detectors
+        self.preview_context = None  # Display-sized proxy of the image
         self.processed_images = {}
         self.display_size = QSize(256, 256)  # Standard display size for PyQt
+        # Wheel zoom of the original image's tile, drawn from its pyramid
+        self.zoom = 1.0
+        self.zoom_center = None  # (x, y) in full resolution pixels
+
+        # Detection runs on worker threads; results of an older generation
+        # (a previously loaded image) are dropped when they arrive
+        self.thread_pool = QThreadPool(self)
+        self.generation = 0
+        self.cancelled = threading.Event()
+        self.running_tasks = 0
+        self.latest_tasks = {}  # method -> task whose result is shown next
+
+        # Result files are written on their own pool, so saving neither
+        # waits for nor delays detection
+        self.save_pool = QThreadPool(self)
+        self.saving = None  # Progress of the running "Save Results"
+
+        # Video stream, whose newest frame is shown at display rate
+        self.stream = None
+        self.stream_name = None
+        self.stream_index = -1  # Frame shown last
+        self.stream_methods = ["Sobel"]
 
         # Create GUI components
         self.create_widgets()
@@ -123,6 +185,15 @@ class EdgeDetectionApp(QMainWindow):
         except Exception as e:
             print(f"Error setting app icon: {e}")
 
+    def open_result_cache(self):
+        """Open the on-disk edge map cache, or run without one on failure"""
+        try:
+            # Canny edge maps are stored bit-packed, an eighth of the size
+            return ResultCache(pack_binary=True)
+        except OSError as e:
+            print(f"Warning: Result cache disabled: {e}")
+            return None
+
     def apply_platform_adjustments(self):
         """Apply platform-specific UI adjustments"""
         # PyQt handles many platform specifics automatically.
@@ -196,6 +267,70 @@ class EdgeDetectionApp(QMainWindow):
             self.update_displays)
         self.top_frame_layout.addWidget(self.show_pixel_count_checkbox)
 
+        # Progressive preview checkbox
+        self.progressive_checkbox = QCheckBox("Progressive Preview")
+        self.progressive_checkbox.setToolTip(
+            "Show results computed at display size immediately, then "
+            "replace them with the full resolution results")
+        self.progressive_checkbox.setChecked(True)
+        self.top_frame_layout.addWidget(self.progressive_checkbox)
+
+        # Multi-scale detection checkbox
+        self.multiscale_checkbox = QCheckBox("Multi-Scale")
+        self.multiscale_checkbox.setToolTip(
+            "Combine the edges found at full, half and quarter resolution "
+            "to pick up coarse outlines and suppress fine texture")
+        self.multiscale_checkbox.stateChanged.connect(
+            self.on_multiscale_toggled)
+        self.top_frame_layout.addWidget(self.multiscale_checkbox)
+
+        # Canny parameter sliders, applied live while dragging
+        self.canny_frame_layout = QHBoxLayout()
+        canny_widget = QWidget()
+        canny_widget.setLayout(self.canny_frame_layout)
+        self.main_layout.addWidget(canny_widget)
+        self.canny_sliders = {}
+        self.canny_value_labels = {}
+        for name, text, minimum, maximum, value in [
+                ("threshold1", "Canny Low", 0, 500, 100),
+                ("threshold2", "Canny High", 0, 500, 200),
+                # Slider position n selects the odd kernel size 2n + 1
+                ("blur_ksize", "Blur Kernel", 0, 7, 2)]:
+            self.canny_frame_layout.addWidget(QLabel(text))
+            slider = QSlider(Qt.Orientation.Horizontal)
+            slider.setRange(minimum, maximum)
+            slider.setValue(value)
+            slider.valueChanged.connect(self.on_canny_slider_changed)
+            self.canny_frame_layout.addWidget(slider)
+            self.canny_sliders[name] = slider
+            value_label = QLabel("")
+            value_label.setMinimumWidth(30)
+            self.canny_frame_layout.addWidget(value_label)
+            self.canny_value_labels[name] = value_label
+
+        # Manual thresholds from the sliders, or estimated per image
+        self.canny_mode_combo = QComboBox()
+        self.canny_mode_combo.addItem("Manual Thresholds", None)
+        self.canny_mode_combo.addItem("Auto (Median)",
+                                      EdgeDetector.AUTO_MEDIAN)
+        self.canny_mode_combo.addItem("Auto (Otsu)", EdgeDetector.AUTO_OTSU)
+        self.canny_mode_combo.currentIndexChanged.connect(
+            self.on_canny_slider_changed)
+        self.canny_frame_layout.addWidget(self.canny_mode_combo)
+        self.update_canny_labels()
+
+        # Restarted by every slider move, so a full resolution Canny only
+        # starts once the slider rests for a moment
+        self.canny_timer = QTimer(self)
+        self.canny_timer.setSingleShot(True)
+        self.canny_timer.setInterval(40)
+        self.canny_timer.timeout.connect(self.recompute_canny)
+
+        # Shows the newest processed frame while a video is streaming
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(STREAM_DISPLAY_INTERVAL)
+        self.stream_timer.timeout.connect(self.update_stream)
+
         # Save Images button
         self.save_btn = QPushButton(
             QIcon.fromTheme("document-save"), " Save Results")
@@ -246,6 +381,10 @@ class EdgeDetectionApp(QMainWindow):
 
             self.images_grid_layout.addWidget(frame, pos[0], pos[1])
 
+        # Scrolling over the original image zooms into it
+        self.image_labels["Original"].installEventFilter(self)
+        self.image_labels["Original"].setToolTip("Scroll to zoom")
+
         # Configure grid weights for responsiveness
         for i in range(2):  # 2 rows
             self.images_grid_layout.setRowStretch(i, 1)
@@ -258,6 +397,20 @@ class EdgeDetectionApp(QMainWindow):
             "background-color: #383838; color: #FFFFFF; padding: 3px;")
         self.status_bar.showMessage("Ready")
 
+        # Progress of "Save Results", only shown while files are written
+        self.save_progress = QProgressBar()
+        self.save_progress.setMaximumWidth(160)
+        self.save_progress.setFormat("Saving %v/%m")
+        self.save_progress.hide()
+        self.status_bar.addPermanentWidget(self.save_progress)
+
+        # Result cache statistics, shown permanently on the right
+        self.image_cache_label = QLabel("")
+        self.status_bar.addPermanentWidget(self.image_cache_label)
+        self.cache_label = QLabel("")
+        self.status_bar.addPermanentWidget(self.cache_label)
+        self.update_cache_label()
+
     def upload_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Select Image", "",
@@ -266,45 +419,109 @@ class EdgeDetectionApp(QMainWindow):
 
         if not file_path:
             return
+        self.open_image(file_path)
 
+    def open_image(self, file_path):
+        """Load an image and show it, restoring cached results if any"""
         try:
+            # The last frame of a video would replace the image on stopping
+            self.stop_stream()
             self.image_path = file_path
-            self.original_image = cv2.imread(file_path)
+            self.original_image = self.image_processor.load_image(file_path)
 
             if self.original_image is None:
                 raise ValueError("Could not read the image")
 
-            # Convert from BGR to RGB for display
-            rgb_image = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2RGB)
-            self.original_image_qimage = self.convert_cv_to_qimage(rgb_image)
+            # Work still running for the previous image is obsolete
+            self.cancel_processing()
+
+            # Preprocessing and proxy of an image opened before are reused
+            entry = self.image_processor.cached_image
+            if entry is not None and entry.context is not None:
+                self.preprocessed = entry.context
+                self.preview_context = entry.preview_context
+            else:
+                self.prepare_image()
+                if entry is not None:
+                    entry.context = self.preprocessed
+                    entry.preview_context = self.preview_context
+            proxy = self.original_image if self.preview_context is None \
+                else self.preview_context.image
+
+            # Shown straight from the BGR pixels, without conversion or copy
+            self.original_image_qimage = self.convert_cv_to_qimage(proxy)
 
+            self.zoom, self.zoom_center = 1.0, None
             self.display_qimage("Original", self.original_image_qimage)
-            self.enable_buttons(True)
             self.status_bar.showMessage(
                 f"Image loaded: {os.path.basename(file_path)}")
             # Clear previous results
             self.processed_images = {}
-            for method in ["Sobel", "Prewitt", "Canny", "Laplacian"]:
-                if method in self.image_labels:
-                    self.image_labels[method].clear()
-                    self.image_labels[method].setText(
-                        " ")  # Placeholder to keep size
-                    self.image_labels[method].setStyleSheet(
-                        "background-color: #404040; border-radius: 3px;")
-                if method in self.info_labels:
-                    self.info_labels[method].setText("")
+            self.clear_results(EdgeDetector.METHODS)
+            if entry is not None:
+                self.restore_results(entry)
+            self.enable_buttons(True)
+            self.image_processor.image_cache.trim()
+            self.update_cache_label()
 
         except Exception as e:
             QMessageBox.critical(
                 self, "Error", f"Could not load image: {str(e)}")
             self.status_bar.showMessage("Error loading image")
 
+    def clear_results(self, methods):
+        """Empty the result tiles of the given methods"""
+        for method in methods:
+            if method in self.image_labels:
+                self.image_labels[method].clear()
+                self.image_labels[method].setText(
+                    " ")  # Placeholder to keep size
+                self.image_labels[method].setStyleSheet(
+                    "background-color: #404040; border-radius: 3px;")
+            if method in self.info_labels:
+                self.info_labels[method].setText("")
+
+    def prepare_image(self):
+        """Create the preprocessing context and display proxy of the image"""
+        # Grayscale and blurred variants are computed once per image
+        self.preprocessed = self.edge_detector.prepare(self.original_image)
+
+        # Proxy at display size for previews and the original's tile;
+        # images that already fit are previewed by their full results
+        display_size = (self.display_size.width(),
+                        self.display_size.height())
+        height, width = self.original_image.shape[:2]
+        if width > display_size[0] or height > display_size[1]:
+            proxy = self.image_processor.resize_for_display(
+                self.original_image, display_size)
+            self.preview_context = self.live_detector.prepare(proxy)
+        else:
+            self.preview_context = None
+
+    def result_key(self, method, detector=None, params=None):
+        """Everything a result of a method depends on besides the image"""
+        detector = detector or self.edge_detector
+        if params is None:
+            params = self.method_params().get(method, {})
+        # keep_gradients only changes how Canny computes the same result
+        return (method, detector.precision, detector.scales, detector.fusion,
+                tuple(sorted((name, value) for name, value in params.items()
+                             if name != "keep_gradients")))
+
+    def restore_results(self, entry):
+        """Show the cached results still matching the current parameters"""
+        for method, (key, _) in entry.results.items():
+            cached = entry.pixmaps.get(method)
+            if key != self.result_key(method) or cached is None \
+                    or cached[0] != key:
+                continue
+            self.processed_images[method] = entry.result(method)
+            self.image_labels[method].setPixmap(cached[1])
+            self.update_info_label(method)
+
     def convert_cv_to_qimage(self, cv_img):
-        height, width, channel = cv_img.shape
-        bytes_per_line = 3 * width
-        q_img = QImage(cv_img.data, width, height,
-                       bytes_per_line, QImage.Format.Format_RGB888)
-        return q_img.copy()  # Important to copy, otherwise data might go out of scope
+        # Zero-copy; the QImage keeps cv_img alive
+        return self.image_processor.convert_to_qimage(cv_img)
 
     def display_qimage(self, name, q_image):
         if name not in self.image_labels:
@@ -318,6 +535,59 @@ class EdgeDetectionApp(QMainWindow):
         if name != "Original" and name in self.processed_images:
             self.update_info_label(name)
 
+    def eventFilter(self, watched, event):
+        if watched is self.image_labels.get("Original") \
+                and event.type() == QEvent.Type.Wheel:
+            self.zoom_original(event)
+            return True
+        return super().eventFilter(watched, event)
+
+    def zoom_original(self, event):
+        """Zoom the original image's tile around the point under the mouse"""
+        if self.original_image is None or self.stream is not None \
+                or self.image_processor.pyramid is None:
+            return
+        steps = event.angleDelta().y() / 120
+        if not steps:
+            return
+        height, width = self.original_image.shape[:2]
+        max_zoom = max(min(height, width) / MIN_ZOOM_VIEW, 1.0)
+        zoom = min(max(self.zoom * ZOOM_STEP ** steps, 1.0), max_zoom)
+        if zoom == self.zoom:
+            return
+
+        # The point under the mouse stays where it is
+        x, y = self.original_point(event.position())
+        center_x, center_y = self.zoom_center or (width / 2, height / 2)
+        factor = self.zoom / zoom
+        self.zoom_center = (x + (center_x - x) * factor,
+                            y + (center_y - y) * factor)
+        self.zoom = zoom
+        self.show_original()
+
+    def original_point(self, position):
+        """Full resolution pixel shown at a position in the original tile"""
+        x, y, view_w, view_h = self.image_processor.zoom_rect(
+            self.zoom, self.zoom_center)
+        label = self.image_labels["Original"]
+        shown_w, shown_h = self.image_processor.display_dimensions(
+            (view_h, view_w), (label.width(), label.height()))
+        fraction_x = (position.x() - (label.width() - shown_w) / 2) / shown_w
+        fraction_y = (position.y() - (label.height() - shown_h) / 2) / shown_h
+        return (x + min(max(fraction_x, 0.0), 1.0) * view_w,
+                y + min(max(fraction_y, 0.0), 1.0) * view_h)
+
+    def show_original(self):
+        """Show the original image at the current zoom"""
+        if self.zoom <= 1.0:
+            self.display_qimage("Original", self.original_image_qimage)
+            return
+        # Only the visible region is scaled, from the nearest pyramid level
+        view = self.image_processor.zoom_for_display(
+            self.zoom, self.zoom_center,
+            (self.display_size.width(), self.display_size.height()))
+        self.display_qimage("Original", self.convert_cv_to_qimage(view))
+
     def enable_buttons(self, enabled):
         self.process_btn_sobel.setEnabled(enabled)
         self.process_btn_prewitt.setEnabled(enabled)
@@ -327,55 +597,373 @@ class EdgeDetectionApp(QMainWindow):
         self.save_btn.setEnabled(enabled and bool(self.processed_images))
 
     def process_image(self, method):
+        if self.stream is not None:
+            self.set_stream_methods([method])
+            return
         if self.original_image is None:
             QMessageBox.warning(
                 self, "Warning", "Please upload an image first")
             return
 
-        try:
-            self.status_bar.showMessage(f"Processing with {method}...")
-            QApplication.processEvents()  # Update UI
-
-            if method == "Sobel":
-                result = self.edge_detector.apply_sobel(self.original_image)
-            elif method == "Prewitt":
-                result = self.edge_detector.apply_prewitt(self.original_image)
-            elif method == "Canny":
-                result = self.edge_detector.apply_canny(self.original_image)
-            elif method == "Laplacian":
-                result = self.edge_detector.apply_laplacian(
-                    self.original_image)
-            else:
-                raise ValueError(f"Unknown method: {method}")
-
-            self.processed_images[method] = result
-            # Convert grayscale to QImage for display
-            # Grayscale QImage needs Format_Grayscale8
-            height, width = result.shape
-            bytes_per_line = width
-            gray_qimage = QImage(result.data, width, height,
-                                 bytes_per_line, QImage.Format.Format_Grayscale8)
-
-            self.display_qimage(method, gray_qimage)
-            self.status_bar.showMessage(f"{method} edge detection completed")
-            self.enable_buttons(True)  # Re-check save button state
-
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Error", f"Processing error with {method}: {str(e)}")
-            self.status_bar.showMessage(f"Error during {method} processing")
+        self.status_bar.showMessage(f"Processing with {method}...")
+        self.start_detection([method], f"{method} edge detection completed")
 
     def process_all(self):
+        if self.stream is not None:
+            self.set_stream_methods(EdgeDetector.METHODS)
+            return
         if self.original_image is None:
             QMessageBox.warning(
                 self, "Warning", "Please upload an image first")
             return
         self.status_bar.showMessage("Applying all edge detection methods...")
-        QApplication.processEvents()
-        methods = ["Sobel", "Prewitt", "Canny", "Laplacian"]
-        for method in methods:
-            self.process_image(method)  # This will update UI for each
-        self.status_bar.showMessage("All edge detection methods applied")
+        # One task per method so the detectors run concurrently; they share
+        # the grayscale conversion and blur of self.preprocessed
+        self.start_detection(EdgeDetector.METHODS,
+                             "All edge detection methods applied",
+                             parallel=True)
+
+    def start_detection(self, methods, done_message, parallel=False,
+                        detector=None, preview=True, params=None):
+        """Run methods on the current image in worker threads
+
+        Parameters:
+        - methods: Names of the methods to apply
+        - done_message: Status bar message once all of them finished
+        - parallel: Start one task per method instead of a single task
+          running them one after another
+        - detector: EdgeDetector to use (default: the cached one)
+        - preview: Show proxy previews first in progressive mode
+        - params: Extra arguments per method (default: method_params())
+        """
+        if params is None:
+            params = self.method_params()
+        if (preview and self.progressive_checkbox.isChecked()
+                and self.preview_context is not None):
+            for method in methods:
+                self.show_preview(method, params)
+
+        groups = [[method] for method in methods] if parallel \
+            else [list(methods)]
+        # Errors of all tasks are reported together once the last finishes
+        batch = {"remaining": len(groups), "errors": [],
+                 "done_message": done_message}
+        for group in groups:
+            task = DetectionTask(
+                detector or self.edge_detector, self.preprocessed, group,
+                self.generation, self.cancelled,
+                (self.display_size.width(), self.display_size.height()),
+                params)
+            task.signals.result.connect(
+                lambda generation, method, result, preview, task=task:
+                    self.on_detection_result(generation, method, result,
+                                             preview, task))
+            task.signals.error.connect(
+                lambda generation, method, message, batch=batch:
+                    self.on_detection_error(generation, method, message,
+                                            batch))
+            task.signals.finished.connect(
+                lambda generation, batch=batch:
+                    self.on_detection_finished(generation, batch))
+            for method in group:
+                # A task superseded for all its methods has nothing to do
+                previous = self.latest_tasks.get(method)
+                self.latest_tasks[method] = task
+                if previous is not None and previous.methods == [method]:
+                    previous.cancel()
+            self.running_tasks += 1
+            self.thread_pool.start(task)
+
+    def method_params(self):
+        """Extra detector arguments per method from the controls"""
+        return {"Canny": self.canny_params()}
+
+    def canny_params(self):
+        """Canny thresholds and blur kernel size set by the controls"""
+        params = {
+            "threshold1": self.canny_sliders["threshold1"].value(),
+            "threshold2": self.canny_sliders["threshold2"].value(),
+            "blur_ksize": 2 * self.canny_sliders["blur_ksize"].value() + 1,
+        }
+        auto_threshold = self.canny_mode_combo.currentData()
+        if auto_threshold is not None:
+            params["auto_threshold"] = auto_threshold
+        return params
+
+    def slider_params(self):
+        """method_params() for re-running Canny as the sliders move"""
+        params = self.method_params()
+        # Slider moves then only redo non-maximum suppression and
+        # hysteresis on the gradients kept in the context. That is slower
+        # for a single run and keeps 4 bytes per pixel, so other runs
+        # leave it out.
+        params["Canny"]["keep_gradients"] = True
+        return params
+
+    def update_canny_labels(self):
+        """Show the current slider values next to the sliders"""
+        params = self.canny_params()
+        for name, value in params.items():
+            if name in self.canny_value_labels:
+                self.canny_value_labels[name].setText(str(value))
+        # Automatic modes replace the threshold sliders
+        manual = "auto_threshold" not in params
+        for name in ("threshold1", "threshold2"):
+            self.canny_sliders[name].setEnabled(manual)
+
+    def on_multiscale_toggled(self):
+        """Switch the detectors between single and multi-scale detection"""
+        scales = MULTI_SCALE_LEVELS if self.multiscale_checkbox.isChecked() \
+            else 1
+        # New detectors, so tasks still running keep their settings
+        self.edge_detector = EdgeDetector(cache=self.result_cache,
+                                          scales=scales)
+        self.live_detector = EdgeDetector(scales=scales)
+        if self.stream is not None:
+            self.stream.detector = self.stream_detector()
+
+    def on_canny_slider_changed(self):
+        """Preview the new Canny parameters and schedule a recompute"""
+        self.update_canny_labels()
+        if self.stream is not None:
+            # Applies from the next frame on
+            self.stream.set_methods(self.stream_methods,
+                                    self.method_params())
+            return
+        if self.original_image is None:
+            return
+        if (self.progressive_checkbox.isChecked()
+                and self.preview_context is not None):
+            self.show_preview("Canny", self.slider_params())
+        self.canny_timer.start()
+
+    def recompute_canny(self):
+        """Run Canny at full resolution with the current slider values"""
+        if self.original_image is None or self.stream is not None:
+            return
+        self.status_bar.showMessage("Processing with Canny...")
+        # The proxy preview was already shown while the slider moved
+        self.start_detection(["Canny"], "Canny edge detection completed",
+                             detector=self.live_detector, preview=False,
+                             params=self.slider_params())
+
+    def show_preview(self, method, params=None):
+        """Show a method's result on the display-sized proxy right away
+
+        The proxy is only as large as the tile, so this takes a few
+        milliseconds even for very large images and runs on the GUI thread.
+        The full resolution result replaces it when it arrives.
+
+        Parameters:
+        - method: Name of the method
+        - params: Extra arguments per method (default: method_params())
+        """
+        if params is None:
+            params = self.method_params()
+        try:
+            preview = self.live_detector.apply(
+                method, self.preview_context, **params.get(method, {}))
+        except Exception:
+            return  # The full resolution run reports the error
+        # Any earlier full result is superseded by the run starting now
+        self.processed_images.pop(method, None)
+        self.display_qimage(method, self.convert_cv_to_qimage(preview))
+        self.info_labels[method].setText("Preview, computing full resolution...")
+        self.enable_buttons(True)
+
+    def cancel_processing(self):
+        """Cancel queued and running detection of the current image"""
+        self.cancelled.set()
+        self.thread_pool.clear()  # Drops tasks that have not started yet
+        self.cancelled = threading.Event()
+        self.generation += 1
+        self.running_tasks = 0
+        self.latest_tasks = {}
+
+    def on_detection_result(self, generation, method, result, preview, task):
+        """Display a result posted by a detection task"""
+        if generation != self.generation:
+            return  # Belongs to an image that was replaced
+        if self.latest_tasks.get(method) is not task:
+            return  # A newer run of this method was started meanwhile
+        self.update_cache_label()
+
+        self.processed_images[method] = result
+        # Display the display-sized preview without copying it
+        self.display_qimage(method, self.convert_cv_to_qimage(preview))
+
+        # Kept with the image, so reopening it shows the result at once
+        entry = self.image_processor.cached_image
+        if entry is not None:
+            key = self.result_key(method, task.detector,
+                                  task.params.get(method, {}))
+            entry.store_result(method, key, result)
+            entry.pixmaps[method] = (key, self.image_labels[method].pixmap())
+            self.image_processor.image_cache.trim()
+            self.update_cache_label()
+        self.status_bar.showMessage(f"{method} edge detection completed")
+        self.enable_buttons(True)  # Re-check save button state
+
+    def on_detection_error(self, generation, method, message, batch):
+        """Collect the error of a method that failed in a detection task"""
+        if generation != self.generation:
+            return
+        batch["errors"].append((method, message))
+
+    def on_detection_finished(self, generation, batch):
+        """Report a finished batch of tasks once its last task is done"""
+        if generation != self.generation:
+            return
+        self.running_tasks -= 1
+        batch["remaining"] -= 1
+        if batch["remaining"] > 0:
+            return
+
+        if batch["errors"]:
+            failed = ", ".join(method for method, _ in batch["errors"])
+            details = "\n".join(f"{method}: {message}"
+                                for method, message in batch["errors"])
+            QMessageBox.critical(
+                self, "Error", f"Processing error with {failed}:\n{details}")
+            self.status_bar.showMessage(f"Error during {failed} processing")
+        elif self.running_tasks == 0:
+            self.status_bar.showMessage(batch["done_message"])
+
+    def open_video(self):
+        """Choose a video file and stream it"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Video", "",
+            "Video files (*.mp4 *.avi *.mov *.mkv *.webm);;All files (*.*)"
+        )
+        if file_path:
+            self.start_stream(file_path)
+
+    def stream_detector(self):
+        """Detector for video frames, splitting each across all CPUs"""
+        scales = MULTI_SCALE_LEVELS if self.multiscale_checkbox.isChecked() \
+            else 1
+        return EdgeDetector(workers=os.cpu_count() or 1, scales=scales)
+
+    def start_stream(self, source):
+        """Show the edges of a video file, camera or test video as it plays
+
+        Frames are processed on the stream's worker thread; the display
+        timer shows the newest finished frame, so frames the detectors
+        cannot keep up with are skipped instead of delaying the display.
+        The Apply buttons choose the methods applied to the frames.
+
+        Parameters:
+        - source: Video file path, camera index, or SYNTHETIC_SOURCE
+        """
+        self.stop_stream()
+        self.cancel_processing()
+        try:
+            self.stream = VideoStream(
+                source, self.stream_methods,
+                detector=self.stream_detector(),
+                params=self.method_params(),
+                display_size=(self.display_size.width(),
+                              self.display_size.height()),
+                temporal=self.temporal_action.isChecked(),
+                # Results are kept for Save Results and after stopping
+                copy_results=True)
+        except (IOError, ValueError) as e:
+            QMessageBox.critical(self, "Error", str(e))
+            self.status_bar.showMessage("Error opening video")
+            return
+        if isinstance(source, int):
+            self.stream_name = f"camera{source}"
+        else:
+            self.stream_name = os.path.splitext(os.path.basename(source))[0]
+        self.stream_index = -1
+        self.zoom, self.zoom_center = 1.0, None
+        self.processed_images = {}
+        self.clear_results(EdgeDetector.METHODS)
+        self.stream.start()
+        self.stream_timer.start()
+        self.stop_stream_action.setEnabled(True)
+        self.status_bar.showMessage(f"Streaming {self.stream_name}...")
+
+    def on_temporal_toggled(self, checked):
+        """Switch reusing unchanged regions of the video frames"""
+        if self.stream is not None:
+            self.stream.temporal = checked
+
+    def set_stream_methods(self, methods):
+        """Change the methods applied to the video frames"""
+        self.stream_methods = list(methods)
+        self.stream.set_methods(self.stream_methods, self.method_params())
+        # Tiles of methods no longer applied would show stale frames
+        self.clear_results([method for method in EdgeDetector.METHODS
+                            if method not in self.stream_methods])
+        for method in list(self.processed_images):
+            if method not in self.stream_methods:
+                del self.processed_images[method]
+
+    def update_stream(self):
+        """Show the newest processed frame, if there is a new one"""
+        if self.stream is None:
+            return
+        result = self.stream.latest(self.stream_index)
+        if result is not None:
+            self.stream_index = result.index
+            self.original_image = result.frame
+            # Save Results names the files after the frame shown
+            self.image_path = f"{self.stream_name}_frame{result.index:06d}"
+            self.processed_images = {
+                method: edges for method, edges in result.results.items()
+                if method in self.stream_methods}
+            for name, preview in result.previews.items():
+                if name == "Original" or name in self.processed_images:
+                    self.display_qimage(name,
+                                        self.convert_cv_to_qimage(preview))
+            self.status_bar.showMessage(
+                f"Frame {result.index}: latency "
+                f"{result.latency * 1000:.0f} ms | "
+                f"{self.stream.stats_text()}")
+            self.enable_buttons(True)
+        if not self.stream.running:
+            error = self.stream.error
+            self.stop_stream()
+            if error:
+                QMessageBox.critical(self, "Error",
+                                     f"Video processing error: {error}")
+                self.status_bar.showMessage("Error during video processing")
+            else:
+                self.status_bar.showMessage("End of video")
+
+    def stop_stream(self):
+        """Stop streaming and keep the last frame as the current image"""
+        if self.stream is None:
+            return
+        self.stream_timer.stop()
+        self.stream.stop()
+        self.stream = None
+        self.stop_stream_action.setEnabled(False)
+        self.status_bar.showMessage("Video stopped")
+        if self.original_image is not None and self.stream_index >= 0:
+            # The last frame can now be processed like an opened image
+            self.image_processor.set_image(self.original_image)
+            self.prepare_image()
+            self.update_cache_label()
+
+    def closeEvent(self, event):
+        # Let running detection finish before the widgets go away
+        self.stop_stream()
+        self.cancel_processing()
+        self.thread_pool.waitForDone()
+        # Files being written are completed
+        self.save_pool.waitForDone()
+        super().closeEvent(event)
+
+    def update_cache_label(self):
+        """Show the image and result cache statistics in the status bar"""
+        self.image_cache_label.setText(
+            self.image_processor.image_cache.stats_text())
+        if self.result_cache is None:
+            self.cache_label.setText("Cache: off")
+        else:
+            self.cache_label.setText(self.result_cache.stats_text())
 
     def update_info_label(self, name):
         if name not in self.info_labels:
@@ -405,40 +993,74 @@ class EdgeDetectionApp(QMainWindow):
                 self.update_info_label(name)
 
     def save_results(self):
+        """Write the original and the results on the save pool
+
+        The files are encoded in parallel in the background; the status
+        bar shows the progress and a message reports the outcome.
+        """
         if not self.processed_images:
             QMessageBox.warning(self, "Warning", "No processed images to save")
             return
+        if self.saving is not None:
+            QMessageBox.warning(
+                self, "Warning", "The previous results are still being saved")
+            return
 
         save_dir = QFileDialog.getExistingDirectory(
             self, "Select Directory to Save Images")
         if not save_dir:
             return
 
-        try:
-            base_name = os.path.splitext(os.path.basename(self.image_path))[0]
-            saved_files_count = 0
-
-            # Save original image (optional, but good for comparison)
-            if self.original_image is not None:
-                original_save_path = os.path.join(
-                    save_dir, f"Original_{base_name}.png")
-                cv2.imwrite(original_save_path, self.original_image)
-                saved_files_count += 1
-
-            for method, img_data in self.processed_images.items():
-                save_path = os.path.join(save_dir, f"{method}_{base_name}.png")
-                # img_data is the raw cv2 image
-                cv2.imwrite(save_path, img_data)
-                saved_files_count += 1
-
-            QMessageBox.information(
-                self, "Success", f"Saved {saved_files_count} images to:\\n{save_dir}")
-            self.status_bar.showMessage(f"Images saved to {save_dir}")
+        _, save_format, options = SAVE_PRESETS[
+            self.save_format_group.checkedAction().data()]
+        options = dict(options, bilevel=self.bilevel_action.isChecked())
+        extension = SAVE_FORMATS[save_format]
+
+        # Save original image (optional, but good for comparison)
+        images = []
+        if self.original_image is not None:
+            images.append(("Original", self.original_image))
+        images.extend(self.processed_images.items())
+
+        self.saving = {"save_dir": save_dir, "total": len(images),
+                       "done": 0, "failed": []}
+        self.save_progress.setRange(0, len(images))
+        self.save_progress.setValue(0)
+        self.save_progress.show()
+        self.status_bar.showMessage(f"Saving images to {save_dir}...")
+        for name, image in images:
+            # Results are never modified in place, so they are not copied
+            save_path = os.path.join(
+                save_dir, self.image_processor.result_filename(
+                    name, self.image_path, extension))
+            task = SaveTask(image, save_path, options)
+            task.signals.saved.connect(self.on_image_saved)
+            self.save_pool.start(task)
+
+    def on_image_saved(self, save_path, success):
+        """Count a written file and report once all of them are done"""
+        saving = self.saving
+        saving["done"] += 1
+        if not success:
+            saving["failed"].append(save_path)
+        self.save_progress.setValue(saving["done"])
+        if saving["done"] < saving["total"]:
+            return
 
-        except Exception as e:
+        self.saving = None
+        self.save_progress.hide()
+        saved_files_count = saving["total"] - len(saving["failed"])
+        if saving["failed"]:
             QMessageBox.critical(
-                self, "Error", f"Error saving images: {str(e)}")
+                self, "Error", "Error saving images:\n"
+                + "\n".join(saving["failed"]))
             self.status_bar.showMessage("Error saving images")
+        else:
+            QMessageBox.information(
+                self, "Success",
+                f"Saved {saved_files_count} images to:\n{saving['save_dir']}")
+            self.status_bar.showMessage(
+                f"Images saved to {saving['save_dir']}")
 
     def create_menu(self):
         menu_bar = self.menuBar()
@@ -450,11 +1072,56 @@ class EdgeDetectionApp(QMainWindow):
         open_action.triggered.connect(self.upload_image)
         file_menu.addAction(open_action)
 
+        # Images still held in memory, filled in when the menu opens
+        self.recent_menu = file_menu.addMenu("Open &Recent")
+        self.recent_menu.aboutToShow.connect(self.update_recent_menu)
+
+        file_menu.addSeparator()
+        video_action = QAction("Open &Video...", self)
+        video_action.triggered.connect(self.open_video)
+        file_menu.addAction(video_action)
+        camera_action = QAction("Open &Camera", self)
+        camera_action.triggered.connect(lambda: self.start_stream(0))
+        file_menu.addAction(camera_action)
+        test_video_action = QAction("Open &Test Video", self)
+        test_video_action.triggered.connect(
+            lambda: self.start_stream(SYNTHETIC_SOURCE))
+        file_menu.addAction(test_video_action)
+        # Reusing the edges of unchanged regions saves most of the work
+        # for fixed cameras
+        self.temporal_action = QAction("Skip &Unchanged Regions", self)
+        self.temporal_action.setCheckable(True)
+        self.temporal_action.setChecked(True)
+        self.temporal_action.toggled.connect(self.on_temporal_toggled)
+        file_menu.addAction(self.temporal_action)
+        self.stop_stream_action = QAction("S&top Video", self)
+        self.stop_stream_action.triggered.connect(self.stop_stream)
+        self.stop_stream_action.setEnabled(False)
+        file_menu.addAction(self.stop_stream_action)
+        file_menu.addSeparator()
+
         save_action = QAction(QIcon.fromTheme(
             "document-save"), "&Save Results...", self)
         save_action.triggered.connect(self.save_results)
         file_menu.addAction(save_action)
 
+        save_format_menu = file_menu.addMenu("Save &Format")
+        self.save_format_group = QActionGroup(self)
+        for index, (label, _, _) in enumerate(SAVE_PRESETS):
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(index == 0)
+            action.setData(index)
+            self.save_format_group.addAction(action)
+            save_format_menu.addAction(action)
+        save_format_menu.addSeparator()
+        # Canny edge maps only hold black and white, so 1 bit per pixel
+        # keeps them exactly
+        self.bilevel_action = QAction("&1-Bit Binary Maps", self)
+        self.bilevel_action.setCheckable(True)
+        self.bilevel_action.setChecked(True)
+        save_format_menu.addAction(self.bilevel_action)
+
         file_menu.addSeparator()
         exit_action = QAction("&Exit", self)
         exit_action.triggered.connect(self.close)
@@ -484,6 +1151,35 @@ class EdgeDetectionApp(QMainWindow):
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
 
+    def update_recent_menu(self):
+        """List the cached images and the image cache statistics"""
+        image_cache = self.image_processor.image_cache
+        self.recent_menu.clear()
+        for path in image_cache.paths():
+            action = QAction(os.path.basename(path), self)
+            action.setToolTip(path)
+            action.triggered.connect(
+                lambda checked=False, p=path: self.open_image(p))
+            self.recent_menu.addAction(action)
+        if not len(image_cache):
+            empty_action = QAction("No recent images", self)
+            empty_action.setEnabled(False)
+            self.recent_menu.addAction(empty_action)
+
+        self.recent_menu.addSeparator()
+        stats_action = QAction(image_cache.stats_text(), self)
+        stats_action.setEnabled(False)
+        self.recent_menu.addAction(stats_action)
+        clear_action = QAction("Clear Recent Images", self)
+        clear_action.triggered.connect(self.clear_image_cache)
+        self.recent_menu.addAction(clear_action)
+
+    def clear_image_cache(self):
+        """Free the memory of all images except the current one"""
+        self.image_processor.image_cache.clear(
+            keep=self.image_processor.cached_image)
+        self.update_cache_label()
+
     def show_about(self):
         # Use an explicit QMessageBox for better compatibility and control
         about_box = QMessageBox(self)
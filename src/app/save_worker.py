@@ -0,0 +1,39 @@
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from src.utils.image_processor import ImageProcessor
+
+
+class SaveSignals(QObject):
+    """Signals of a SaveTask, delivered on the GUI thread"""
+
+    saved = pyqtSignal(str, bool)  # file path, success
+
+
+class SaveTask(QRunnable):
+    """Write one image file on a QThreadPool thread
+
+    cv2.imwrite releases the GIL while encoding, so several tasks on a
+    pool write their files in parallel and the GUI stays responsive. The
+    image is not copied; it must not be modified until the task finished.
+    """
+
+    def __init__(self, image, save_path, options=None):
+        """Create a save task
+
+        Parameters:
+        - image: OpenCV image (numpy array) to write
+        - save_path: Path of the file; its extension selects the format
+        - options: Dict of ImageProcessor.save_image arguments, e.g. the
+          PNG compression level
+        """
+        super().__init__()
+        self.image = image
+        self.save_path = save_path
+        self.options = options or {}
+        self.image_processor = ImageProcessor()
+        self.signals = SaveSignals()
+
+    def run(self):
+        saved = self.image_processor.save_image(
+            self.image, self.save_path, **self.options)
+        self.signals.saved.emit(self.save_path, bool(saved))
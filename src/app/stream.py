@@ -0,0 +1,159 @@
+"""
+Headless video streaming for Flower Edge Detection.
+
+Runs the edge detectors on every frame of a video file, a camera or the
+generated test video without starting the PyQt6 GUI, and reports the
+throughput and per-frame latency:
+
+    python main.py stream SOURCE [options]
+    python -m src.app.stream SOURCE [options]
+
+SOURCE is a video file, a camera index such as 0, or "synthetic" for a
+generated 1080p test video ("synthetic-static" as seen by a fixed camera,
+either optionally followed by ":WIDTHxHEIGHT").
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+from src.app.batch import (add_detector_arguments, add_save_arguments,
+                           method_params, save_options)
+from src.utils.edge_detection import EdgeDetector
+from src.utils.image_processor import ImageProcessor, SAVE_FORMATS
+from src.utils.temporal import DEFAULT_CHANGE_THRESHOLD
+from src.utils.video import VideoStream
+
+logger = logging.getLogger('edge_detection.stream')
+
+# Seconds between two progress lines
+REPORT_INTERVAL = 1.0
+
+
+def run_stream(args):
+    """Process the frames of the source until it ends or enough are done
+
+    Returns:
+    - The VideoStream, stopped, for its statistics
+    """
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+    image_processor = ImageProcessor()
+    extension = SAVE_FORMATS[args.format]
+    options = save_options(args)
+
+    def frame_done(result):
+        # Called for every processed frame on the stream's worker thread
+        logger.debug(f"Frame {result.index}: "
+                     f"{result.latency * 1000:.1f} ms")
+        if not args.save_dir:
+            return
+        for method, edges in result.results.items():
+            save_path = os.path.join(
+                args.save_dir,
+                f"{method}_frame{result.index:06d}{extension}")
+            if not image_processor.save_image(edges, save_path, **options):
+                raise IOError(f"Could not write {save_path}")
+
+    detector = EdgeDetector(precision=args.precision, workers=args.threads,
+                            scales=args.scales, fusion=args.fusion)
+    stream = VideoStream(args.source, args.methods, detector=detector,
+                         params=method_params(args), paced=not args.unpaced,
+                         callback=frame_done, temporal=args.temporal,
+                         change_threshold=args.change_threshold,
+                         max_frames=args.frames or None)
+    last = -1
+    next_report = time.perf_counter() + REPORT_INTERVAL
+    with stream:
+        while stream.running:
+            result = stream.latest(last, timeout=0.1)
+            if result is None:
+                continue
+            last = result.index
+            if time.perf_counter() >= next_report:
+                logger.info(f"Frame {result.index}: {stream.stats_text()}")
+                next_report += REPORT_INTERVAL
+    if stream.error:
+        logger.error(stream.error)
+    return stream
+
+
+def build_parser():
+    """Create the command line parser"""
+    parser = argparse.ArgumentParser(
+        prog="stream",
+        description="Apply edge detection to the frames of a video file or "
+                    "camera without starting the GUI, reporting the "
+                    "throughput and per-frame latency.")
+    parser.add_argument(
+        "source",
+        help="Video file, camera index (e.g. 0), or 'synthetic' or "
+             "'synthetic-static' for a generated test video, optionally "
+             "followed by ':WIDTHxHEIGHT'")
+    parser.add_argument(
+        "-m", "--methods", nargs="+", choices=EdgeDetector.METHODS,
+        default=["Sobel"], metavar="METHOD",
+        help="Methods to apply: %(choices)s (default: %(default)s)")
+    parser.add_argument(
+        "--frames", type=int, default=0,
+        help="Stop after this many processed frames, 0 for the whole "
+             "source (default: %(default)s)")
+    parser.add_argument(
+        "--unpaced", action="store_true",
+        help="Process every frame of a file as fast as possible instead of "
+             "at its frame rate, dropping none")
+    parser.add_argument(
+        "--temporal", action="store_true",
+        help="Only process the regions that changed since the previous "
+             "frame, e.g. for fixed cameras watching static scenes")
+    parser.add_argument(
+        "--change-threshold", type=float, default=DEFAULT_CHANGE_THRESHOLD,
+        help="Grey level change that marks a region as changed with "
+             "--temporal; raise it for noisy cameras (default: %(default)s)")
+    parser.add_argument(
+        "--save-dir", metavar="DIR",
+        help="Save the edge maps of every processed frame to DIR")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true",
+        help="Log the latency of every frame")
+    add_detector_arguments(parser)
+    add_save_arguments(parser)
+    # Frames are small, so the row bands default to one per CPU
+    parser.set_defaults(threads=os.cpu_count() or 1)
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the stream mode
+
+    Parameters:
+    - argv: Command line arguments (default: sys.argv[1:])
+
+    Returns:
+    - Process exit code
+    """
+    args = build_parser().parse_args(argv)
+    if args.blur_ksize < 1 or args.blur_ksize % 2 == 0:
+        print("Error: --blur-ksize must be a positive odd number")
+        return 2
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    try:
+        stream = run_stream(args)
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        return 2
+    logger.info(f"Processed {stream.frames_processed} of "
+                f"{stream.frames_read} frames; {stream.stats_text()}")
+    return 1 if stream.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,4 +5,16 @@ This package contains various utility modules including:
 - check_dependencies: Tool to verify required packages and dependencies
 - file_operations: Utilities for file handling and management
 - image_processing: Core image processing helper functions
+- preprocessing: Grayscale/blur context shared between edge detectors
+- workspace: Reusable scratch buffers for allocation-free edge detection
+- tiling: Tile-by-tile edge detection for images too large for memory
+- batch_executor: Process pool running detectors on shared memory frames
+- pipeline: Concurrent decode, detect and encode stages with bounded queues
+- result_cache: Content-addressed on-disk cache of edge detection results
+- pyramid: Lazily built image pyramid for display scaling and zoom
+- multiscale: Edge detection fused across Gaussian pyramid levels
+- image_cache: In-memory LRU cache of recently opened images and results
+- video: Edge detection on video files, cameras and a test video
+- temporal: Reuse of edges in unchanged regions between video frames
+- binary_maps: Bit-packed and sparse storage of binary edge maps
 """
\ No newline at end of file
@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import collections
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.workspace import Workspace
+
+# Detector state of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _attach(name):
+    """Attach to an existing shared memory block"""
+    if sys.version_info >= (3, 13):
+        # The parent owns the block; keep the worker's tracker out of it
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(precision, threads, scales, fusion, methods, params):
+    """Create the detector and workspace of a worker process"""
+    _worker["detector"] = EdgeDetector(precision=precision, workers=threads,
+                                       scales=scales, fusion=fusion)
+    _worker["workspace"] = Workspace()
+    _worker["methods"] = methods
+    _worker["params"] = params
+
+
+def _process_chunk(chunk):
+    """Run the detectors on a chunk of frames held in shared memory
+
+    Each entry is (block name, frame shape, frame dtype). The results are
+    written into the same block right after the frame, one uint8 image per
+    method, so nothing but the block names crosses the process boundary.
+
+    Returns:
+    - List with None or an error message per frame
+    """
+    detector = _worker["detector"]
+    workspace = _worker["workspace"]
+    errors = []
+    for name, shape, dtype in chunk:
+        block = _attach(name)
+        try:
+            frame, results = _block_views(
+                block, shape, dtype, len(_worker["methods"]))
+            context = detector.prepare(frame, workspace)
+            for method, out in zip(_worker["methods"], results):
+                detector.apply(method, context, out=out, workspace=workspace,
+                               **_worker["params"].get(method, {}))
+            errors.append(None)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            # Views into the block must be gone before it can be closed
+            frame = results = context = None
+            block.close()
+    return errors
+
+
+def _block_size(shape, dtype, method_count):
+    """Bytes needed for a frame and its uint8 results"""
+    return (int(np.prod(shape)) * np.dtype(dtype).itemsize
+            + method_count * shape[0] * shape[1])
+
+
+def _block_views(block, shape, dtype, method_count):
+    """Numpy views of the frame and result images inside a block"""
+    frame = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    offset = frame.nbytes
+    result_size = shape[0] * shape[1]
+    results = [np.ndarray(shape[:2], dtype=np.uint8, buffer=block.buf,
+                          offset=offset + i * result_size)
+               for i in range(method_count)]
+    return frame, results
+
+
+class SharedMemoryExecutor:
+    """Run edge detection on a pool of worker processes
+
+    Frames and results are exchanged through multiprocessing shared memory
+    blocks instead of pickled numpy arrays: the parent copies each frame
+    into a block, a worker computes every requested method directly into
+    the same block and only the block name is sent between processes.
+    Blocks are recycled, and at most max_in_flight frames are queued or
+    being processed at any time, which bounds memory for any input size.
+    """
+
+    def __init__(self, methods=EdgeDetector.METHODS, processes=None,
+                 precision=EdgeDetector.PRECISION_FLOAT32, threads=1,
+                 params=None, max_in_flight=None, chunk_size=1, scales=1,
+                 fusion=EdgeDetector.FUSION_MAX):
+        """Initialize the executor
+
+        Parameters:
+        - methods: Edge detection methods applied to every frame
+        - processes: Number of worker processes (default: CPU count)
+        - precision: EdgeDetector precision used by the workers
+        - threads: Row-band threads per worker (see EdgeDetector)
+        - params: Dict of extra arguments per method, e.g. thresholds
+        - max_in_flight: Maximum frames submitted but not yet delivered
+          (default: four chunks per process)
+        - chunk_size: Frames sent to a worker per task
+        - scales: Pyramid levels per method (see EdgeDetector)
+        - fusion: How the levels are combined (see EdgeDetector)
+        """
+        for method in methods:
+            if method not in EdgeDetector.METHODS:
+                raise ValueError(f"Unknown method: {method}")
+        self.methods = list(methods)
+        self.chunk_size = max(1, chunk_size)
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes, initializer=_init_worker,
+            initargs=(precision, threads, scales, fusion, self.methods,
+                      params or {}))
+        self.max_in_flight = max(
+            max_in_flight or 4 * self.processes * self.chunk_size,
+            self.chunk_size)
+        self._free_blocks = []
+        self.frames_done = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def images_per_second(self):
+        """Throughput of all map() calls so far"""
+        return self.frames_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def free_blocks(self):
+        """Number of shared memory blocks waiting to be reused"""
+        return len(self._free_blocks)
+
+    def _acquire_block(self, size):
+        """Take a recycled block of at least size bytes, or create one"""
+        for i, block in enumerate(self._free_blocks):
+            if block.size >= size:
+                return self._free_blocks.pop(i)
+        if len(self._free_blocks) >= self.max_in_flight:
+            # Too many small blocks around; replace the smallest
+            smallest = min(self._free_blocks, key=lambda block: block.size)
+            self._free_blocks.remove(smallest)
+            self._release_block(smallest)
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    @staticmethod
+    def _release_block(block):
+        block.close()
+        block.unlink()
+
+    def map(self, frames, ordered=True):
+        """Process frames on the worker pool
+
+        Parameters:
+        - frames: Iterable of (key, image) pairs; it is consumed lazily
+        - ordered: Deliver results in input order instead of as they finish
+
+        Yields:
+        - (key, results, error) where results maps each method to its
+          uint8 edge image, or is None with an error message on failure
+        """
+        start = time.perf_counter()
+        pending = collections.OrderedDict()  # future -> chunk entries
+        frames = iter(frames)
+        in_flight = 0
+        exhausted = False
+        chunk = []  # Frames copied into blocks but not submitted yet
+        delivering = []  # (entry, error) of a finished chunk not yet yielded
+
+        try:
+            while True:
+                # Keep submitting chunks until the in-flight limit is hit
+                while not exhausted and (
+                        in_flight + self.chunk_size <= self.max_in_flight):
+                    chunk = []
+                    for key, image in frames:
+                        size = _block_size(image.shape, image.dtype,
+                                           len(self.methods))
+                        block = self._acquire_block(size)
+                        chunk.append((key, block, image.shape, image.dtype))
+                        frame, _ = _block_views(block, image.shape,
+                                                image.dtype, 0)
+                        frame[...] = image
+                        frame = None
+                        if len(chunk) == self.chunk_size:
+                            break
+                    else:
+                        exhausted = True
+                    if chunk:
+                        future = self._pool.submit(_process_chunk, [
+                            (block.name, shape, dtype.str)
+                            for _, block, shape, dtype in chunk])
+                        pending[future] = chunk
+                        in_flight += len(chunk)
+                        chunk = []
+
+                if not pending:
+                    break
+
+                if ordered:
+                    done = [next(iter(pending))]
+                    done[0].result()
+                else:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done = [f for f in pending if f in finished]
+
+                for future in done:
+                    entries = pending.pop(future)
+                    in_flight -= len(entries)
+                    delivering = collections.deque(
+                        zip(entries, future.result()))
+                    while delivering:
+                        entry, error = delivering.popleft()
+                        yield self._collect(entry, error)
+                        self.frames_done += 1
+        finally:
+            # Recycle the blocks of chunks abandoned by an early exit or a
+            # failing frames iterator once no worker uses them any more
+            self._free_blocks.extend(block for _, block, _, _ in chunk)
+            self._free_blocks.extend(
+                block for (_, block, _, _), _ in delivering)
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            for entries in pending.values():
+                self._free_blocks.extend(block for _, block, _, _ in entries)
+            self.elapsed += time.perf_counter() - start
+
+    def _collect(self, entry, error):
+        """Copy a frame's results out of its block and recycle the block"""
+        key, block, shape, dtype = entry
+        self._free_blocks.append(block)
+        if error is not None:
+            return key, None, error
+        _, views = _block_views(block, shape, dtype, len(self.methods))
+        return key, {method: view.copy()
+                     for method, view in zip(self.methods, views)}, None
+
+    def shutdown(self):
+        """Stop the worker processes and free all shared memory"""
+        self._pool.shutdown()
+        for block in self._free_blocks:
+            self._release_block(block)
+        self._free_blocks = []
@@ -0,0 +1,181 @@
+import cv2
+import numpy as np
+
+# Bytes a stored edge point takes, two int32 coordinates
+POINT_BYTES = 8
+
+# Set bits of every byte value, for counting edge pixels in packed rows
+# (np.bitwise_count needs NumPy 2)
+_BIT_COUNTS = np.array([bin(value).count("1") for value in range(256)],
+                       dtype=np.uint8)
+
+
+def is_binary(image):
+    """Check whether an image only holds the values 0 and 255
+
+    Parameters:
+    - image: OpenCV image (numpy array)
+
+    Returns:
+    - True for single channel 8-bit images such as Canny edge maps
+    """
+    if image.ndim != 2 or image.dtype != np.uint8:
+        return False
+    # Every pixel equals 255 where it is nonzero
+    _, nonzero = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY)
+    return cv2.norm(image, nonzero, cv2.NORM_INF) == 0
+
+
+class BinaryEdgeMap:
+    """Compact lossless storage of a binary edge map
+
+    Canny edge maps hold one byte per pixel, but each pixel is only 0 or
+    255. They are stored either bit-packed, one bit per pixel along the
+    rows (np.packbits), which is 8 times smaller, or for sparse maps as
+    the list of edge point coordinates, 8 bytes per edge pixel. decode()
+    restores the uint8 map exactly.
+    """
+
+    ENCODING_PACKED = "packed"
+    ENCODING_POINTS = "points"
+    ENCODING_AUTO = "auto"
+    ENCODINGS = (ENCODING_PACKED, ENCODING_POINTS, ENCODING_AUTO)
+
+    def __init__(self, encoding, data, shape):
+        """Wrap encoded data; use encode() or load() to create one
+
+        Parameters:
+        - encoding: ENCODING_PACKED or ENCODING_POINTS
+        - data: Packed rows (uint8), or (N, 2) int32 array of (x, y)
+          edge points in row-major order
+        - shape: Shape (height, width) of the edge map
+        """
+        self.encoding = encoding
+        self.data = data
+        self.shape = tuple(int(size) for size in shape)
+
+    @classmethod
+    def encode(cls, image, encoding=ENCODING_AUTO):
+        """Encode a binary edge map
+
+        Parameters:
+        - image: Single channel uint8 image holding only 0 and 255
+        - encoding: One of ENCODINGS; ENCODING_AUTO picks the smaller
+
+        Returns:
+        - BinaryEdgeMap
+        """
+        if encoding not in cls.ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        if not is_binary(image):
+            raise ValueError("Only 8-bit maps of 0 and 255 can be encoded")
+        if encoding == cls.ENCODING_AUTO:
+            height, width = image.shape
+            packed_bytes = height * ((width + 7) // 8)
+            encoding = cls.ENCODING_POINTS \
+                if cv2.countNonZero(image) * POINT_BYTES < packed_bytes \
+                else cls.ENCODING_PACKED
+        if encoding == cls.ENCODING_PACKED:
+            # Any nonzero byte becomes a set bit
+            return cls(encoding, np.packbits(image, axis=1), image.shape)
+        points = cv2.findNonZero(image)
+        points = np.empty((0, 2), np.int32) if points is None \
+            else points.reshape(-1, 2)
+        return cls(encoding, points, image.shape)
+
+    def decode(self, out=None):
+        """Restore the uint8 edge map
+
+        Parameters:
+        - out: Optional uint8 array of the map's shape to write into
+
+        Returns:
+        - Edge map with 255 at edge pixels and 0 elsewhere
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        elif out.shape != self.shape or out.dtype != np.uint8:
+            raise ValueError(
+                f"Output buffer must be uint8 with shape {self.shape}")
+        if self.encoding == self.ENCODING_PACKED:
+            out[...] = np.unpackbits(self.data, axis=1, count=self.shape[1])
+            # Negating 1 wraps around to 255 in uint8
+            return np.negative(out, out=out)
+        out.fill(0)
+        out[self.data[:, 1], self.data[:, 0]] = 255
+        return out
+
+    def count_nonzero(self):
+        """Number of edge pixels, without decoding the map"""
+        if self.encoding == self.ENCODING_PACKED:
+            return int(_BIT_COUNTS[self.data].sum(dtype=np.int64))
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the encoded data"""
+        return self.data.nbytes
+
+    def save(self, file, compress=True):
+        """Write the map to a .npz file
+
+        Parameters:
+        - file: Path or binary file object
+        - compress: Deflate the data as well, which shrinks sparse maps
+          much further at a few milliseconds per megapixel
+        """
+        savez = np.savez_compressed if compress else np.savez
+        savez(file, shape=np.array(self.shape, dtype=np.int64),
+              **{self.encoding: self.data})
+
+    @classmethod
+    def load(cls, file):
+        """Read a map written by save()
+
+        Parameters:
+        - file: Path or binary file object
+
+        Returns:
+        - BinaryEdgeMap
+        """
+        with np.load(file) as arrays:
+            for encoding in (cls.ENCODING_PACKED, cls.ENCODING_POINTS):
+                if encoding in arrays:
+                    return cls(encoding, arrays[encoding], arrays["shape"])
+        raise ValueError("Not a binary edge map file")
+
+
+def save_npz(image, save_path, compress=True):
+    """Write an image losslessly to a .npz file
+
+    Binary edge maps are stored as a BinaryEdgeMap, other images as their
+    plain array under the name "image".
+
+    Parameters:
+    - image: OpenCV image (numpy array)
+    - save_path: Path of the file
+    - compress: Deflate the data
+    """
+    # File objects keep numpy from appending another .npz to the name
+    with open(save_path, "wb") as f:
+        if is_binary(image):
+            BinaryEdgeMap.encode(image).save(f, compress)
+        elif compress:
+            np.savez_compressed(f, image=image)
+        else:
+            np.savez(f, image=image)
+
+
+def load_npz(path):
+    """Read an image written by save_npz
+
+    Parameters:
+    - path: Path of the .npz file
+
+    Returns:
+    - The image (numpy array), binary edge maps decoded to uint8
+    """
+    with np.load(path) as arrays:
+        if "image" in arrays:
+            return arrays["image"]
+    return BinaryEdgeMap.load(path).decode()
@@ -55,6 +55,13 @@ def check_dependencies():
     except ImportError:
         missing_packages.append("threading")
 
+    # Optional: memory-mapped TIFF input in batch mode
+    try:
+        import tifffile
+        print(f"tifffile {tifffile.__version__} (memory-mapped TIFF input)")
+    except ImportError:
+        print("tifffile not installed (optional, for memory-mapped TIFF input)")
+
     # Check for image saving functionality
     try:
         import os
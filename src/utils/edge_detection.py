@@ -1,113 +1,523 @@
+import inspect
+
 import cv2
 import numpy as np
 
+from src.utils.preprocessing import PreprocessContext
+from src.utils.workspace import Workspace
+
+# Rows converted at a time when computing the magnitude of integer gradients
+MAGNITUDE_STRIP_ROWS = 64
+
+# Separable Prewitt kernels: [[1, 0, -1]] * 3 rows is the outer product of
+# a 3-tap box filter across rows and a central difference along them
+PREWITT_SMOOTH = np.array([1, 1, 1], dtype=np.float32)
+PREWITT_DIFF = np.array([1, 0, -1], dtype=np.float32)
+
+# Smallest value range cv2.normalize treats as non-constant
+DBL_EPSILON = np.finfo(np.float64).eps
+
+# Sample points per axis used to estimate automatic Canny thresholds
+AUTO_THRESHOLD_GRID = 64
+
 
 class EdgeDetector:
-    """A utility class for various edge detection algorithms"""
+    """A utility class for various edge detection algorithms
+
+    Every method accepts either an image or a PreprocessContext created by
+    prepare(). Passing the same context to several methods shares the
+    grayscale conversion and blurs between them.
+
+    The precision controls the arithmetic used for gradients:
+    - "float32" (default): single precision gradients
+    - "float64": the original double precision computation
+    - "int16": integer gradients
+    All three produce results within one grey level of each other. The
+    float32 and int16 magnitudes are squared exactly in float32 strips and
+    rounded by np.sqrt, so they do not depend on buffer alignment.
+
+    Every method also takes optional out= and workspace= arguments. The
+    result is written into out (a uint8 array of the image size) and all
+    intermediate images into the Workspace buffers, so repeated calls on
+    same-sized frames allocate no new full-frame arrays.
+
+    With workers > 1, apply() splits the image into one row band per worker
+    and processes the bands on a thread pool (see TiledEdgeDetector), with
+    results identical to the single threaded ones.
+
+    With scales > 1, apply() runs each method on that many Gaussian
+    pyramid levels and fuses the responses by their maximum or weighted
+    sum (see MultiScaleEdgeDetector). With workers > 1 as well, each level
+    is processed in row bands.
+
+    With a ResultCache, apply() loads results computed before for the same
+    image content, method and parameters instead of computing them again.
+    """
+
+    PRECISION_FLOAT32 = "float32"
+    PRECISION_FLOAT64 = "float64"
+    PRECISION_INT16 = "int16"
+    PRECISIONS = (PRECISION_FLOAT32, PRECISION_FLOAT64, PRECISION_INT16)
+
+    METHODS = ("Sobel", "Prewitt", "Canny", "Laplacian")
+
+    # Automatic Canny threshold modes
+    AUTO_MEDIAN = "median"
+    AUTO_OTSU = "otsu"
+    AUTO_THRESHOLDS = (AUTO_MEDIAN, AUTO_OTSU)
+
+    # Ways to combine the responses of several scales
+    FUSION_MAX = "max"
+    FUSION_SUM = "sum"
+    FUSIONS = (FUSION_MAX, FUSION_SUM)
+
+    _GRADIENT_DEPTHS = {
+        PRECISION_FLOAT32: cv2.CV_32F,
+        PRECISION_FLOAT64: cv2.CV_64F,
+        PRECISION_INT16: cv2.CV_16S,
+    }
+    _GRADIENT_DTYPES = {
+        PRECISION_FLOAT32: np.float32,
+        PRECISION_FLOAT64: np.float64,
+        PRECISION_INT16: np.int16,
+    }
+
+    # apply_* arguments that do not change the result
+    _UNCACHED_PARAMS = ("out", "workspace", "keep_gradients")
+
+    def __init__(self, precision=PRECISION_FLOAT32, workers=1, cache=None,
+                 scales=1, fusion=FUSION_MAX):
+        """Initialize the edge detector
+
+        Parameters:
+        - precision: One of EdgeDetector.PRECISIONS
+        - workers: Number of threads apply() splits each image across
+        - cache: Optional ResultCache consulted by apply()
+        - scales: Number of pyramid levels apply() works on, 1 for the
+          image resolution only
+        - fusion: One of EdgeDetector.FUSIONS, how the levels are combined
+        """
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        if fusion not in self.FUSIONS:
+            raise ValueError(f"Unknown fusion: {fusion}")
+        self.precision = precision
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.scales = max(1, scales)
+        self.fusion = fusion
+        self._banded = None
+        self._multiscale = None
 
     @staticmethod
-    def apply_sobel(image):
-        """Apply Sobel edge detection to an image
+    def prepare(image, workspace=None):
+        """Create a preprocessing context to share between detectors
 
         Parameters:
-        - image: Input image (numpy array)
+        - image: Input image (numpy array) or PreprocessContext
+        - workspace: Optional Workspace for the grayscale and blurred images
+
+        Returns:
+        - PreprocessContext wrapping the image
+        """
+        return PreprocessContext.from_image(image, workspace)
+
+    def apply(self, method, image, **kwargs):
+        """Apply the edge detection method with the given name
+
+        Parameters:
+        - method: One of EdgeDetector.METHODS
+        - image: Input image (numpy array) or PreprocessContext
+        - kwargs: Extra arguments for the apply_* method
 
         Returns:
         - Edge detected image
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(
-            image.shape) > 2 else image
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method: {method}")
+        if self.cache is not None:
+            return self._apply_cached(method, image, **kwargs)
+        return self._compute(method, image, **kwargs)
 
-        # Apply Sobel in x and y directions
-        sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
+    def _compute(self, method, image, **kwargs):
+        """Run a method at several scales or on row bands if configured"""
+        if self.scales > 1:
+            return self._apply_multiscale(method, image, **kwargs)
+        if self.workers > 1:
+            return self._apply_banded(method, image, **kwargs)
+        return getattr(self, f"apply_{method.lower()}")(image, **kwargs)
 
-        # Compute the magnitude
-        magnitude = np.sqrt(np.square(sobelx) + np.square(sobely))
+    def cache_key(self, method, image, **kwargs):
+        """Key of a result in the ResultCache
+
+        The key covers the image content, the method, the precision and
+        every parameter including defaults, so an explicit default value
+        hits the same entry as an omitted one.
+        """
+        context = self.prepare(image)
+        signature = inspect.signature(getattr(self, f"apply_{method.lower()}"))
+        params = {name: parameter.default
+                  for name, parameter in signature.parameters.items()
+                  if parameter.default is not inspect.Parameter.empty
+                  and name not in self._UNCACHED_PARAMS}
+        params.update((name, value) for name, value in kwargs.items()
+                      if name not in self._UNCACHED_PARAMS)
+        params["precision"] = self.precision
+        if self.scales > 1:
+            params["scales"] = self.scales
+            params["fusion"] = self.fusion
+        return self.cache.key(context.digest, method, params)
 
-        # Normalize to 0-255
-        normalized = cv2.normalize(magnitude, None, 0, 255, cv2.NORM_MINMAX)
-        result = normalized.astype(np.uint8)
+    def _apply_cached(self, method, image, out=None, **kwargs):
+        """Load a result from the cache, computing and storing it on a miss"""
+        key = self.cache_key(method, image, **kwargs)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._compute(method, image, out=out, **kwargs)
+            self.cache.put(key, result)
+            return result
+        if out is None:
+            return result
+        out = self._output(out, result.shape)
+        np.copyto(out, result)
+        return out
 
-        return result
+    def _apply_banded(self, method, image, out=None, workspace=None,
+                      **kwargs):
+        """Run a method on row bands of the image in parallel"""
+        # Imported here because the tiling module builds on this one
+        from src.utils.tiling import TiledEdgeDetector
+
+        # Bands of a context share its grayscale and blurred images
+        if self._banded is None:
+            self._banded = TiledEdgeDetector(
+                self, tile_size=None, workers=self.workers,
+                retain_tiles=True)
+        return self._banded.apply(method, image, out=out, **kwargs)
+
+    def _apply_multiscale(self, method, image, **kwargs):
+        """Run a method on several pyramid levels and fuse the results"""
+        # Imported here because the multiscale module builds on this one
+        from src.utils.multiscale import MultiScaleEdgeDetector
+
+        multiscale = self._multiscale
+        if multiscale is None or (multiscale.scales, multiscale.fusion) \
+                != (self.scales, self.fusion):
+            multiscale = MultiScaleEdgeDetector(self, self.scales,
+                                                self.fusion)
+            self._multiscale = multiscale
+        return multiscale.apply(method, image, **kwargs)
 
     @staticmethod
-    def apply_prewitt(image):
+    def _output(out, shape):
+        """Return out, or a new uint8 result array when out is None"""
+        if out is None:
+            return np.empty(shape, dtype=np.uint8)
+        if out.shape != shape or out.dtype != np.uint8:
+            raise ValueError(
+                f"Output buffer must be uint8 with shape {shape}")
+        return out
+
+    def _magnitude(self, gx, gy, workspace):
+        """Compute the gradient magnitude sqrt(gx^2 + gy^2) in place"""
+        if self.precision == self.PRECISION_FLOAT64:
+            magnitude = workspace.buffer("magnitude", gx.shape, np.float64)
+            squared = workspace.buffer("squared", gx.shape, np.float64)
+            np.square(gx, out=magnitude, dtype=np.float64)
+            np.square(gy, out=squared, dtype=np.float64)
+            np.add(magnitude, squared, out=magnitude)
+            return np.sqrt(magnitude, out=magnitude)
+
+        # The squares of gradients of uint8 images are integers small enough
+        # to be exact in float32, and np.sqrt rounds correctly. With IPP,
+        # cv2.magnitude rounds differently when its destination is not
+        # 32-byte aligned, so results varied between processes. Strips keep
+        # the temporaries cache resident.
+        magnitude = workspace.buffer("magnitude", gx.shape, np.float32)
+        strip_shape = (MAGNITUDE_STRIP_ROWS,) + gx.shape[1:]
+        strip_x = workspace.buffer("strip_x", strip_shape, np.float32)
+        strip_y = workspace.buffer("strip_y", strip_shape, np.float32)
+        for row in range(0, gx.shape[0], MAGNITUDE_STRIP_ROWS):
+            rows = slice(row, row + MAGNITUDE_STRIP_ROWS)
+            count = len(gx[rows])
+            x, y = strip_x[:count], strip_y[:count]
+            np.copyto(x, gx[rows])
+            np.copyto(y, gy[rows])
+            np.multiply(x, x, out=x)
+            np.multiply(y, y, out=y)
+            np.add(x, y, out=x)
+            np.sqrt(x, out=magnitude[rows])
+        return magnitude
+
+    def normalize_magnitude(self, magnitude, out=None, workspace=None,
+                            value_range=None):
+        """Stretch a magnitude map to the full 0-255 range as uint8
+
+        Parameters:
+        - magnitude: Gradient magnitude map from a *_magnitude method
+        - out: Optional uint8 array receiving the result
+        - workspace: Optional Workspace for intermediate buffers
+        - value_range: Optional (min, max) to map to 0-255 instead of the
+          minimum and maximum of this map, e.g. whole-image statistics
+          when normalizing one tile of a larger image
+
+        Returns:
+        - Normalized uint8 image
+        """
+        workspace = workspace if workspace is not None else Workspace()
+        out = self._output(out, magnitude.shape)
+        if value_range is None:
+            low, high = cv2.minMaxLoc(magnitude)[:2]
+        else:
+            low, high = value_range
+
+        # Same scale and shift as cv2.normalize with NORM_MINMAX
+        scale = 255.0 / (high - low) if high - low > DBL_EPSILON else 0.0
+        shift = -low * scale
+
+        if self.precision == self.PRECISION_FLOAT64:
+            normalized = workspace.buffer(
+                "normalized", magnitude.shape, np.float64)
+            np.multiply(magnitude, scale, out=normalized)
+            np.add(normalized, shift, out=normalized)
+            # Truncating cast, as astype(np.uint8) did
+            np.copyto(out, normalized, casting="unsafe")
+            return out
+        cv2.convertScaleAbs(magnitude, dst=out, alpha=scale, beta=shift)
+        return out
+
+    def sobel_magnitude(self, image, workspace=None):
+        """Compute the unnormalized Sobel gradient magnitude
+
+        Parameters:
+        - image: Input image (numpy array) or PreprocessContext
+        - workspace: Optional Workspace for intermediate buffers
+
+        Returns:
+        - Floating point magnitude map (owned by the workspace)
+        """
+        workspace = workspace if workspace is not None else Workspace()
+        gray = PreprocessContext.from_image(image, workspace).gray
+        depth = self._GRADIENT_DEPTHS[self.precision]
+        dtype = self._GRADIENT_DTYPES[self.precision]
+
+        # Apply Sobel in x and y directions
+        sobelx = workspace.buffer("gradient_x", gray.shape, dtype)
+        sobely = workspace.buffer("gradient_y", gray.shape, dtype)
+        cv2.Sobel(gray, depth, 1, 0, dst=sobelx, ksize=3)
+        cv2.Sobel(gray, depth, 0, 1, dst=sobely, ksize=3)
+
+        return self._magnitude(sobelx, sobely, workspace)
+
+    def prewitt_magnitude(self, image, workspace=None):
+        """Compute the unnormalized Prewitt gradient magnitude
+
+        Parameters:
+        - image: Input image (numpy array) or PreprocessContext
+        - workspace: Optional Workspace for intermediate buffers
+
+        Returns:
+        - Floating point magnitude map (owned by the workspace)
+        """
+        workspace = workspace if workspace is not None else Workspace()
+        gray = PreprocessContext.from_image(image, workspace).gray
+
+        # The 3x3 Prewitt sums of uint8 pixels are exact in int16, so only
+        # the float64 mode filters in floating point
+        if self.precision == self.PRECISION_FLOAT64:
+            depth, dtype = cv2.CV_64F, np.float64
+        else:
+            depth, dtype = cv2.CV_16S, np.int16
+
+        # Signed gradients from two separable 1x3/3x1 passes, so negative
+        # responses are kept instead of being clipped to a uint8 result
+        prewittx = workspace.buffer("gradient_x", gray.shape, dtype)
+        prewitty = workspace.buffer("gradient_y", gray.shape, dtype)
+        cv2.sepFilter2D(gray, depth, PREWITT_DIFF, PREWITT_SMOOTH,
+                        dst=prewittx)
+        cv2.sepFilter2D(gray, depth, PREWITT_SMOOTH, PREWITT_DIFF,
+                        dst=prewitty)
+
+        return self._magnitude(prewittx, prewitty, workspace)
+
+    def apply_sobel(self, image, out=None, workspace=None):
+        """Apply Sobel edge detection to an image
+
+        Parameters:
+        - image: Input image (numpy array) or PreprocessContext
+        - out: Optional uint8 array receiving the result
+        - workspace: Optional Workspace for intermediate buffers
+
+        Returns:
+        - Edge detected image
+        """
+        workspace = workspace if workspace is not None else Workspace()
+        magnitude = self.sobel_magnitude(image, workspace)
+        return self.normalize_magnitude(magnitude, out, workspace)
+
+    def apply_prewitt(self, image, out=None, workspace=None):
         """Apply Prewitt edge detection to an image
 
         Parameters:
-        - image: Input image (numpy array)
+        - image: Input image (numpy array) or PreprocessContext
+        - out: Optional uint8 array receiving the result
+        - workspace: Optional Workspace for intermediate buffers
 
         Returns:
         - Edge detected image
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(
-            image.shape) > 2 else image
+        workspace = workspace if workspace is not None else Workspace()
+        magnitude = self.prewitt_magnitude(image, workspace)
+        return self.normalize_magnitude(magnitude, out, workspace)
+
+    def canny_thresholds(self, image, mode=AUTO_MEDIAN, sigma=0.33,
+                         blur_ksize=5):
+        """Estimate Canny thresholds from image statistics
+
+        Modes:
+        - "median": thresholds (1 - sigma) and (1 + sigma) times the
+          median intensity of the blurred image
+        - "otsu": Otsu's threshold of the gradient magnitude cv2.Canny
+          compares (|dx| + |dy|) as the high threshold, half of it as the
+          low threshold
+
+        The statistics come from a fixed grid of sample points. Each sample
+        is computed from a small neighbourhood gathered by numpy indexing,
+        so the cost does not depend on the image size and the values equal
+        those of the whole blurred image at these points. Tiles of a large
+        image therefore get the same thresholds as the whole image.
+
+        Parameters:
+        - image: Input image (numpy array) or PreprocessContext
+        - mode: One of EdgeDetector.AUTO_THRESHOLDS
+        - sigma: Spread around the median for the "median" mode
+        - blur_ksize: Kernel size of the Gaussian blur applied before Canny
+
+        Returns:
+        - Tuple (low threshold, high threshold)
+        """
+        if mode not in self.AUTO_THRESHOLDS:
+            raise ValueError(f"Unknown automatic threshold mode: {mode}")
+        image = PreprocessContext.from_image(image).image
+        height, width = image.shape[:2]
 
-        # Define Prewitt kernels
-        kernelx = np.array([[1, 0, -1], [1, 0, -1], [1, 0, -1]])
-        kernely = np.array([[1, 1, 1], [0, 0, 0], [-1, -1, -1]])
+        # Sample points keep a blur and Sobel radius from the borders, so
+        # the border handling of the whole image plays no role
+        radius = blur_ksize // 2 + 1
 
-        # Apply kernels
-        prewittx = cv2.filter2D(gray, -1, kernelx)
-        prewitty = cv2.filter2D(gray, -1, kernely)
+        def centers(size):
+            low, high = radius, size - 1 - radius
+            if high < low:
+                low, high = 0, size - 1
+            count = min(AUTO_THRESHOLD_GRID, high - low + 1)
+            return np.unique(np.linspace(low, high, count).round()).astype(
+                np.intp)
 
-        # Compute the magnitude - convert to float for the calculation
-        prewittx_float = prewittx.astype(np.float64)
-        prewitty_float = prewitty.astype(np.float64)
-        magnitude = np.sqrt(np.square(prewittx_float) +
-                            np.square(prewitty_float))
+        offsets = np.arange(-radius, radius + 1)
+        rows = np.clip(centers(height)[:, None] + offsets, 0, height - 1)
+        cols = np.clip(centers(width)[:, None] + offsets, 0, width - 1)
+        # Fancy indexing instead of cv2.remap, which only accepts sides
+        # below 32767 pixels
+        mosaic = image[np.ix_(rows.ravel(), cols.ravel())]
+        if len(mosaic.shape) > 2:
+            mosaic = cv2.cvtColor(mosaic, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(mosaic, (blur_ksize, blur_ksize), 0)
 
-        # Normalize to 0-255
-        normalized = cv2.normalize(magnitude, None, 0, 255, cv2.NORM_MINMAX)
-        result = normalized.astype(np.uint8)
+        # The center of every neighbourhood is one sample
+        center = slice(radius, None, 2 * radius + 1)
+        if mode == self.AUTO_MEDIAN:
+            samples = np.ascontiguousarray(blurred[center, center])
+            histogram = cv2.calcHist([samples], [0], None, [256], [0, 256])
+            cumulative = np.cumsum(histogram.ravel())
+            median = float(np.searchsorted(cumulative, cumulative[-1] / 2))
+            return (max(0.0, (1.0 - sigma) * median),
+                    min(255.0, (1.0 + sigma) * median))
 
-        return result
+        dx = cv2.Sobel(blurred, cv2.CV_16S, 1, 0, ksize=3)
+        dy = cv2.Sobel(blurred, cv2.CV_16S, 0, 1, ksize=3)
+        magnitude = (np.abs(dx[center, center].astype(np.int32))
+                     + np.abs(dy[center, center]))
+        peak = int(magnitude.max())
+        if peak == 0:
+            return 0.0, 0.0
+        scaled = cv2.convertScaleAbs(magnitude, alpha=255.0 / peak)
+        otsu, _ = cv2.threshold(scaled, 0, 255,
+                                cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        high = max(otsu, 1.0) * peak / 255.0
+        return high / 2, high
 
-    @staticmethod
-    def apply_canny(image, threshold1=100, threshold2=200):
+    def apply_canny(self, image, threshold1=100, threshold2=200,
+                    blur_ksize=5, keep_gradients=False, auto_threshold=None,
+                    sigma=0.33, out=None, workspace=None):
         """Apply Canny edge detection to an image
 
         Parameters:
-        - image: Input image (numpy array)
+        - image: Input image (numpy array) or PreprocessContext
         - threshold1: First threshold for hysteresis procedure
         - threshold2: Second threshold for hysteresis procedure
+        - blur_ksize: Kernel size of the Gaussian blur applied first
+        - keep_gradients: Compute the Sobel gradients separately and keep
+          them in the context, so later calls on the same context with
+          other thresholds only redo non-maximum suppression and
+          hysteresis. Slower for a single call; the result is the same.
+        - auto_threshold: None, or one of EdgeDetector.AUTO_THRESHOLDS to
+          replace threshold1/threshold2 by canny_thresholds()
+        - sigma: Spread of the "median" automatic thresholds
+        - out: Optional uint8 array receiving the result
+        - workspace: Optional Workspace for intermediate buffers
 
         Returns:
         - Edge detected image
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(
-            image.shape) > 2 else image
-
-        # Apply Gaussian blur to reduce noise
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # Gaussian blur to reduce noise, shared through the context
+        context = PreprocessContext.from_image(image, workspace)
+        out = self._output(out, context.shape)
+        if auto_threshold is not None:
+            threshold1, threshold2 = self.canny_thresholds(
+                context, auto_threshold, sigma, blur_ksize)
 
         # Apply Canny edge detector
-        edges = cv2.Canny(blurred, threshold1, threshold2)
+        if keep_gradients:
+            dx, dy = context.gradients(blur_ksize)
+            cv2.Canny(dx, dy, threshold1, threshold2, edges=out)
+        else:
+            cv2.Canny(context.blurred(blur_ksize), threshold1, threshold2,
+                      edges=out)
 
-        return edges
+        return out
 
-    @staticmethod
-    def apply_laplacian(image):
+    def apply_laplacian(self, image, blur_ksize=5, out=None, workspace=None):
         """Apply Laplacian edge detection to an image
 
         Parameters:
-        - image: Input image (numpy array)
+        - image: Input image (numpy array) or PreprocessContext
+        - blur_ksize: Kernel size of the Gaussian blur applied first
+        - out: Optional uint8 array receiving the result
+        - workspace: Optional Workspace for intermediate buffers
 
         Returns:
         - Edge detected image
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(
-            image.shape) > 2 else image
+        workspace = workspace if workspace is not None else Workspace()
 
-        # Apply Gaussian blur to reduce noise
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # Gaussian blur to reduce noise, shared through the context
+        context = PreprocessContext.from_image(image, workspace)
+        blurred = context.blurred(blur_ksize)
+        out = self._output(out, blurred.shape)
+        dtype = self._GRADIENT_DTYPES[self.precision]
 
         # Apply Laplacian operator
-        laplacian = cv2.Laplacian(blurred, cv2.CV_64F)
+        laplacian = workspace.buffer("laplacian", blurred.shape, dtype)
+        cv2.Laplacian(blurred, self._GRADIENT_DEPTHS[self.precision],
+                      dst=laplacian)
 
-        # Convert back to uint8
-        laplacian = np.absolute(laplacian)
-        laplacian = np.uint8(np.clip(laplacian, 0, 255))
+        if self.precision == self.PRECISION_FLOAT64:
+            # Convert back to uint8
+            np.absolute(laplacian, out=laplacian)
+            np.clip(laplacian, 0, 255, out=laplacian)
+            np.copyto(out, laplacian, casting="unsafe")
+            return out
 
-        return laplacian
+        # Absolute value and saturation to uint8 in a single pass
+        cv2.convertScaleAbs(laplacian, dst=out)
+        return out
@@ -0,0 +1,215 @@
+import os
+import threading
+import collections
+
+from src.utils.binary_maps import BinaryEdgeMap, is_binary
+
+# Memory the recently opened images may take together before the least
+# recently used are dropped
+DEFAULT_IMAGE_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+class CachedImage:
+    """Everything kept in memory for one opened image
+
+    Besides the decoded image and its pyramid, the application stores
+    what it derived from the image here, so reopening the image restores
+    it instead of computing it again.
+    """
+
+    def __init__(self, path, signature, image, pyramid=None,
+                 pack_binary=False):
+        """Create an entry for a decoded image
+
+        Parameters:
+        - path: Path the image was loaded from
+        - signature: File modification time and size when it was loaded
+        - image: Decoded image (numpy array)
+        - pyramid: ImagePyramid of the image, if any
+        - pack_binary: Keep binary edge maps, e.g. Canny results, as
+          BinaryEdgeMap, about 8 times smaller
+        """
+        self.path = path
+        self.signature = signature
+        self.image = image
+        self.pyramid = pyramid
+        self.context = None  # PreprocessContext shared by the detectors
+        self.preview_context = None  # PreprocessContext of the proxy
+        self.results = {}  # method -> (parameters, edge map)
+        self.pixmaps = {}  # display name -> (key, QPixmap)
+        self.pack_binary = pack_binary
+
+    def store_result(self, method, key, result):
+        """Keep the result of a method, encoded compactly if binary
+
+        Parameters:
+        - method: Edge detection method name
+        - key: Everything the result depends on besides the image
+        - result: Edge map (numpy array)
+        """
+        if self.pack_binary and is_binary(result):
+            result = BinaryEdgeMap.encode(result)
+        self.results[method] = (key, result)
+
+    def result(self, method):
+        """Edge map of a method stored with store_result, as uint8 array"""
+        result = self.results[method][1]
+        if isinstance(result, BinaryEdgeMap):
+            return result.decode()
+        return result
+
+    def release_levels(self):
+        """Free the pyramid levels of the image and its contexts
+
+        They are recomputed when the display or a detector needs them
+        again.
+        """
+        if self.pyramid is not None:
+            self.pyramid.release()
+        for context in (self.context, self.preview_context):
+            if context is not None:
+                context.release_pyramids()
+
+    @property
+    def nbytes(self):
+        """Bytes held by the entry, including everything derived"""
+        size = self.image.nbytes
+        if self.pyramid is not None:
+            size += self.pyramid.nbytes
+        for context in (self.context, self.preview_context):
+            if context is not None:
+                size += context.nbytes
+                if context.image is not self.image:
+                    size += context.image.nbytes
+        size += sum(result.nbytes for _, result in self.results.values())
+        for _, pixmap in self.pixmaps.values():
+            size += pixmap.width() * pixmap.height() * pixmap.depth() // 8
+        return size
+
+
+class ImageCache:
+    """In-memory LRU cache of recently opened images
+
+    Flipping between images in a session finds them here instead of
+    decoding them and running the detectors again. When the entries take
+    more than max_bytes together the least recently used are dropped;
+    the most recently used entry is always kept, however large it is,
+    with only its pyramid levels freed. Entries of files modified since
+    they were loaded are not returned.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_IMAGE_CACHE_BYTES,
+                 pack_binary=False):
+        """Create an empty cache
+
+        Parameters:
+        - max_bytes: Memory budget of all entries together
+        - pack_binary: Keep the binary edge maps of the entries compactly
+          encoded (see CachedImage)
+        """
+        self.max_bytes = max_bytes
+        self.pack_binary = pack_binary
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # path -> entry, LRU first
+
+    @staticmethod
+    def signature(path):
+        """Modification time and size of a file, or None if it is missing"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def get(self, path):
+        """Look up an image and mark it as most recently used
+
+        Returns:
+        - The CachedImage, or None on a miss
+        """
+        key = self._key(path)
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature != signature:
+                # The file changed since it was decoded
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def add(self, path, image, pyramid=None):
+        """Add a decoded image as the most recently used entry
+
+        Returns:
+        - The new CachedImage
+        """
+        entry = CachedImage(path, self.signature(path), image, pyramid,
+                            self.pack_binary)
+        with self._lock:
+            self._entries[self._key(path)] = entry
+            self._entries.move_to_end(self._key(path))
+        self.trim()
+        return entry
+
+    def trim(self):
+        """Drop least recently used entries beyond the memory budget
+
+        Call it after adding results or pixmaps to an entry. When the
+        most recently used entry alone exceeds the budget, the levels of
+        its pyramids are freed as well.
+        """
+        with self._lock:
+            sizes = {key: entry.nbytes
+                     for key, entry in self._entries.items()}
+            total = sum(sizes.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                key, _ = self._entries.popitem(last=False)
+                total -= sizes[key]
+                self.evictions += 1
+            if total > self.max_bytes:
+                for entry in self._entries.values():
+                    entry.release_levels()
+
+    def paths(self):
+        """Paths of the cached images, most recently used first"""
+        with self._lock:
+            return [entry.path for entry in reversed(self._entries.values())]
+
+    @property
+    def nbytes(self):
+        """Bytes currently held by all entries"""
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self, keep=None):
+        """Drop every entry, or all but one
+
+        Parameters:
+        - keep: Optional CachedImage to keep, e.g. the image shown
+        """
+        with self._lock:
+            kept = [(key, entry) for key, entry in self._entries.items()
+                    if entry is keep]
+            self._entries.clear()
+            self._entries.update(kept)
+
+    def stats_text(self):
+        """Short summary for status displays"""
+        return (f"Images: {len(self)} cached ({self.nbytes / 2**20:.0f} MB), "
+                f"{self.hits} hits, {self.misses} misses, "
+                f"{self.evictions} evicted")
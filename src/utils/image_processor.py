@@ -2,22 +2,82 @@ import os
 import cv2
 import numpy as np
 from PIL import Image  # Removed ImageTk
-from PyQt6.QtGui import QImage, QPixmap  # Added QImage and QPixmap imports
+
+from src.utils import binary_maps
+from src.utils.image_cache import ImageCache
+from src.utils.pyramid import ImagePyramid
+
+# cv2.imread flags decoding at 1/factor of the size, by (factor, grayscale).
+# JPEG images are scaled during decoding (DCT scaling), so decoding time
+# and memory shrink with the square of the factor.
+REDUCED_DECODE_FLAGS = {
+    (1, False): cv2.IMREAD_COLOR,
+    (2, False): cv2.IMREAD_REDUCED_COLOR_2,
+    (4, False): cv2.IMREAD_REDUCED_COLOR_4,
+    (8, False): cv2.IMREAD_REDUCED_COLOR_8,
+    (1, True): cv2.IMREAD_GRAYSCALE,
+    (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# EXIF orientations that swap width and height when applied
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Lossless file formats results can be saved in, by name: file extension.
+# WebP files are smaller than PNG files but take many times longer to write.
+# NumPy archives hold binary edge maps bit-packed or as edge point lists
+# (see binary_maps), for reading back without an image codec.
+SAVE_FORMATS = {"png": ".png", "webp": ".webp", "npz": ".npz"}
+
+# zlib strategies of the PNG encoder, by name. "rle" is the fastest at a
+# given compression level and compresses edge maps best.
+PNG_STRATEGIES = {
+    "default": cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+    "filtered": cv2.IMWRITE_PNG_STRATEGY_FILTERED,
+    "huffman": cv2.IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY,
+    "rle": cv2.IMWRITE_PNG_STRATEGY_RLE,
+    "fixed": cv2.IMWRITE_PNG_STRATEGY_FIXED,
+}
+
+# WebP quality above 100 selects lossless encoding
+WEBP_LOSSLESS_QUALITY = 101
+
+# Uncompressed image files map_image can memory-map instead of reading
+MAPPABLE_EXTENSIONS = (".npy", ".raw", ".tif", ".tiff")
 
 
 class ImageProcessor:
     """A utility class for image processing operations"""
 
-    def __init__(self):
-        """Initialize the image processor"""
+    def __init__(self, cache_bytes=None, pack_binary=False):
+        """Initialize the image processor
+
+        Parameters:
+        - cache_bytes: Memory budget of an ImageCache keeping recently
+          loaded images, or None to decode every load again
+        - pack_binary: Keep binary edge maps in the ImageCache compactly
+          encoded (see binary_maps.BinaryEdgeMap)
+        """
         self.current_image = None
         self.original_image = None
+        # Downsampled versions of original_image for display and zoom
+        self.pyramid = None
+        self.image_cache = ImageCache(cache_bytes, pack_binary) \
+            if cache_bytes else None
+        # Cache entry of original_image, where derived data can be kept
+        self.cached_image = None
 
-    def load_image(self, image_path):
+    def load_image(self, image_path, target_size=None, grayscale=False):
         """Load an image from the given path
 
         Parameters:
         - image_path: Path to the image file
+        - target_size: Optional tuple (width, height) the image only needs
+          to fit in, e.g. for previews (see read_image)
+        - grayscale: Decode straight to grayscale, e.g. when only edge
+          maps are computed
 
         Returns:
         - OpenCV image (numpy array) or None if failed
@@ -25,30 +85,229 @@ class ImageProcessor:
         if not os.path.exists(image_path):
             return None
 
+        # Only full size colour images are cached
+        cacheable = (self.image_cache is not None and target_size is None
+                     and not grayscale)
+        if cacheable:
+            entry = self.image_cache.get(image_path)
+            if entry is not None:
+                self.set_image(entry.image, entry.pyramid)
+                self.cached_image = entry
+                return entry.image
+
         try:
-            image = cv2.imread(image_path)
-            self.original_image = image.copy()
-            self.current_image = image
+            image = self.read_image(image_path, target_size, grayscale)
+            if image is None:
+                return None
+            self.set_image(image)
+            if cacheable:
+                self.cached_image = self.image_cache.add(
+                    image_path, image, self.pyramid)
             return image
         except Exception as e:
             print(f"Error loading image: {e}")
             return None
 
-    def resize_for_display(self, image, display_size):
-        """Resize an image for display purposes while maintaining aspect ratio
+    @staticmethod
+    def image_header(image_path):
+        """Read the format and size of an image from its file header
 
         Parameters:
-        - image: OpenCV image (numpy array)
-        - display_size: Tuple (width, height) for target size
+        - image_path: Path to the image file
 
         Returns:
-        - Resized image
+        - Tuple (PIL format name, (width, height)) with the size as
+          cv2.imread returns it, or None if the header cannot be read
         """
-        if image is None:
+        try:
+            with Image.open(image_path) as image:
+                image_format = image.format
+                width, height = image.size
+                orientation = None
+                # JPEG keeps EXIF in a header segment; other formats may
+                # store it after the pixel data, so it is not looked up
+                if image_format == "JPEG":
+                    orientation = image.getexif().get(EXIF_ORIENTATION_TAG)
+        except Exception:
+            return None
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        return image_format, (width, height)
+
+    @staticmethod
+    def decode_factor(image_size, target_size):
+        """Largest reduced decoding factor that still fills the target size
+
+        Parameters:
+        - image_size: Tuple (width, height) of the full image
+        - target_size: Tuple (width, height) the image has to fit in
+
+        Returns:
+        - 1, 2, 4 or 8
+        """
+        width, height = image_size
+        scale = min(target_size[0] / width, target_size[1] / height)
+        for factor in (8, 4, 2):
+            if scale * factor <= 1:
+                return factor
+        return 1
+
+    @classmethod
+    def read_image(cls, image_path, target_size=None, grayscale=False):
+        """Decode an image file, at reduced size when that is enough
+
+        With a target size, JPEG files are decoded with the strongest
+        cv2.IMREAD_REDUCED_* reduction (DCT scaling) that keeps the image
+        at least as large as its fit into the target size, chosen from the
+        size in the file header, which cuts decoding time and memory. The
+        image is then scaled to fit the target size exactly. Other formats
+        are decoded at full size and scaled down.
+
+        Grayscale decoding of JPEG files skips the chroma decoding and the
+        colour conversion. The result can differ by a grey level from
+        converting the colour image.
+
+        Parameters:
+        - image_path: Path to the image file
+        - target_size: Optional tuple (width, height) to fit the image in;
+          smaller images are not enlarged
+        - grayscale: Decode to a single channel grayscale image
+
+        Returns:
+        - OpenCV image (numpy array) or None if it cannot be read
+        """
+        header = cls.image_header(image_path)
+        if header is None or header[0] != "JPEG":
+            # Reduced and grayscale decoding bring no speedup outside JPEG,
+            # and grayscale PNG decoding rounds differently than cvtColor
+            image = cv2.imread(image_path)
+            if image is not None and grayscale:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            factor = 1
+            if target_size is not None:
+                factor = cls.decode_factor(header[1], target_size)
+            image = cv2.imread(image_path,
+                               REDUCED_DECODE_FLAGS[factor, grayscale])
+        if image is None or target_size is None:
+            return image
+
+        height, width = image.shape[:2]
+        if width <= target_size[0] and height <= target_size[1]:
+            return image
+        return cv2.resize(image, cls.display_dimensions(image.shape,
+                                                        target_size),
+                          interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def map_image(image_path, raw_shape=None):
+        """Memory-map an uncompressed image file instead of reading it
+
+        Pixels are only read from disk when they are accessed, and the
+        operating system can drop them again under memory pressure, so
+        images larger than the RAM can be processed region by region, e.g.
+        by TiledEdgeDetector. Supported files:
+        - .npy: NumPy arrays (np.load with mmap_mode="r")
+        - .raw: Headerless pixels in row-major order, of shape raw_shape
+        - .tif/.tiff: Uncompressed TIFF files, with the optional tifffile
+          package; colour images are mapped with the channels in BGR order
+
+        Parameters:
+        - image_path: Path to the image file
+        - raw_shape: Tuple (height, width) or (height, width, 3) of .raw
+          files
+
+        Returns:
+        - Read-only uint8 memory map of shape (height, width) or
+          (height, width, 3), or None if the file cannot be mapped
+        """
+        extension = os.path.splitext(image_path)[1].lower()
+        if extension not in MAPPABLE_EXTENSIONS:
             return None
+        if extension == ".raw":
+            if raw_shape is None:
+                raise ValueError("The shape of .raw images must be given")
+            if os.path.getsize(image_path) != int(np.prod(raw_shape)):
+                print(f"Size of {image_path} does not match the shape "
+                      f"{tuple(raw_shape)}")
+                return None
+
+        try:
+            if extension == ".npy":
+                image = np.load(image_path, mmap_mode="r")
+            elif extension == ".raw":
+                image = np.memmap(image_path, dtype=np.uint8, mode="r",
+                                  shape=tuple(raw_shape))
+            else:
+                try:
+                    import tifffile
+                except ImportError:
+                    print("Install tifffile to memory-map TIFF files")
+                    return None
+                # Fails for compressed or tiled TIFF files
+                image = tifffile.memmap(image_path, mode="r")
+                if image.ndim == 3:
+                    image = image[..., ::-1]
+        except (OSError, ValueError) as e:
+            print(f"Error mapping image: {e}")
+            return None
+
+        if image.dtype != np.uint8 or not (
+                image.ndim == 2 or (image.ndim == 3 and image.shape[2] == 3)):
+            print(f"Unsupported pixel layout {image.shape} {image.dtype} "
+                  f"in {image_path}")
+            return None
+        return image
+
+    @staticmethod
+    def map_output(save_path, shape):
+        """Create a memory-mapped .npy file to write a result into
+
+        Parameters:
+        - save_path: Path of the .npy file
+        - shape: Tuple (height, width) of the result
+
+        Returns:
+        - Writable uint8 memory map; flush() it, then drop the reference,
+          to complete the file
+        """
+        os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+        return np.lib.format.open_memmap(save_path, mode="w+",
+                                         dtype=np.uint8, shape=tuple(shape))
+
+    def set_image(self, image, pyramid=None):
+        """Make an image the original image and start its pyramid
+
+        The image is held without copying and made read-only, as the
+        pyramid, the display and the detectors all share its buffer.
+        Code that needs to modify it works on a copy.
+
+        Parameters:
+        - image: OpenCV image (numpy array)
+        - pyramid: Existing ImagePyramid of the image to reuse, if any
+        """
+        if image is not None:
+            image.flags.writeable = False
+        self.original_image = image
+        self.current_image = image
+        self.cached_image = None
+        if pyramid is None and image is not None:
+            pyramid = ImagePyramid(image)
+        self.pyramid = pyramid
+
+    @staticmethod
+    def display_dimensions(shape, display_size):
+        """Size an image is shown at to fit the display size
 
+        Parameters:
+        - shape: Shape of the image
+        - display_size: Tuple (width, height) for target size
+
+        Returns:
+        - Tuple (width, height) keeping the aspect ratio
+        """
         # Get original dimensions
-        h, w = image.shape[:2]
+        h, w = shape[:2]
         target_w, target_h = display_size
 
         # Calculate aspect ratio
@@ -68,12 +327,109 @@ class ImageProcessor:
                 new_w = target_w
                 new_h = int(new_w / aspect)
 
+        return max(new_w, 1), max(new_h, 1)
+
+    def resize_for_display(self, image, display_size):
+        """Resize an image for display purposes while maintaining aspect ratio
+
+        The original image is scaled from its pyramid, so repeated calls
+        with different sizes do not read the full resolution image again.
+
+        Parameters:
+        - image: OpenCV image (numpy array)
+        - display_size: Tuple (width, height) for target size
+
+        Returns:
+        - Resized image
+        """
+        if image is None:
+            return None
+
+        new_size = self.display_dimensions(image.shape, display_size)
+        if self.pyramid is not None and image is self.pyramid.base:
+            return self.pyramid.resize(new_size)
+
         # Resize the image
-        resized = cv2.resize(image, (new_w, new_h),
+        resized = cv2.resize(image, new_size,
                              interpolation=cv2.INTER_AREA)
 
         return resized
 
+    def zoom_for_display(self, zoom, center, display_size):
+        """Zoomed view of the original image from its pyramid
+
+        Parameters:
+        - zoom: Magnification relative to showing the whole image (>= 1)
+        - center: Tuple (x, y) of the view center in full resolution pixels
+        - display_size: Tuple (width, height) for target size
+
+        Returns:
+        - Image of the visible region, or None without an original image
+        """
+        if self.pyramid is None:
+            return None
+        rect = self.zoom_rect(zoom, center)
+        new_size = self.display_dimensions((rect[3], rect[2]), display_size)
+        return self.pyramid.region(rect, new_size)
+
+    def zoom_rect(self, zoom, center=None):
+        """Region of the original image a zoomed view shows
+
+        Parameters:
+        - zoom: Magnification relative to showing the whole image (>= 1)
+        - center: Tuple (x, y) of the view center in full resolution
+          pixels, or None for the image center
+
+        Returns:
+        - Tuple (x, y, width, height) in full resolution pixels, kept
+          inside the image
+        """
+        height, width = self.original_image.shape[:2]
+        if center is None:
+            center = (width / 2, height / 2)
+        zoom = max(zoom, 1.0)
+        view_w = max(int(round(width / zoom)), 1)
+        view_h = max(int(round(height / zoom)), 1)
+        x = min(max(int(center[0] - view_w / 2), 0), width - view_w)
+        y = min(max(int(center[1] - view_h / 2), 0), height - view_h)
+        return x, y, view_w, view_h
+
+    @staticmethod
+    def convert_to_qimage(image):
+        """Wrap an OpenCV image in a QImage without copying its pixels
+
+        BGR images use QImage.Format_BGR888, so no RGB conversion is
+        needed either. The QImage keeps a reference to the array, which
+        therefore lives at least as long as the QImage.
+
+        Parameters:
+        - image: OpenCV image (numpy array), BGR or grayscale
+
+        Returns:
+        - QImage object or None if failed
+        """
+        if image is None:
+            return None
+
+        # Imported here so the batch mode can use this class without Qt
+        from PyQt6.QtGui import QImage
+
+        if len(image.shape) == 3 and image.shape[2] == 3:  # Color image
+            image_format = QImage.Format.Format_BGR888
+        elif len(image.shape) == 2:  # Grayscale image
+            image_format = QImage.Format.Format_Grayscale8
+        else:
+            print("Unsupported image format for QImage conversion.")
+            return None
+
+        # Rows must be contiguous; only views with gaps are copied
+        image = np.ascontiguousarray(image)
+        h, w = image.shape[:2]
+        qt_image = QImage(image.data, w, h, image.strides[0], image_format)
+        # QImage does not own external pixel data, so keep the array alive
+        qt_image.ndarray = image
+        return qt_image
+
     def convert_to_qpixmap(self, image):
         """Convert an OpenCV image to a QPixmap for display in PyQt.
 
@@ -83,37 +439,82 @@ class ImageProcessor:
         Returns:
         - QPixmap object or None if failed
         """
-        if image is None:
-            return None
+        # Imported here so the batch mode can use this class without Qt
+        from PyQt6.QtGui import QPixmap
 
         try:
-            # OpenCV images are typically BGR. Convert to RGB.
-            if len(image.shape) == 3 and image.shape[2] == 3:  # Color image
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                h, w, ch = rgb_image.shape
-                bytes_per_line = ch * w
-                qt_image = QImage(rgb_image.data, w, h,
-                                  bytes_per_line, QImage.Format.Format_RGB888)
-            elif len(image.shape) == 2:  # Grayscale image
-                h, w = image.shape
-                bytes_per_line = w
-                qt_image = QImage(image.data, w, h, bytes_per_line,
-                                  QImage.Format.Format_Grayscale8)
-            else:
-                print("Unsupported image format for QPixmap conversion.")
+            qt_image = self.convert_to_qimage(image)
+            if qt_image is None:
                 return None
-
             return QPixmap.fromImage(qt_image)
         except Exception as e:
             print(f"Error converting image to QPixmap: {e}")
             return None
 
-    def save_image(self, image, save_path):
+    @staticmethod
+    def result_filename(method, image_path, extension=".png"):
+        """Build the file name a result is saved under
+
+        Parameters:
+        - method: Name of the edge detection method, or "Original"
+        - image_path: Path of the source image
+        - extension: File extension including the dot
+
+        Returns:
+        - File name in the form {Method}_{basename}{extension}
+        """
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        return f"{method}_{base_name}{extension}"
+
+    # Whether an image only holds 0 and 255, like Canny edge maps
+    is_binary = staticmethod(binary_maps.is_binary)
+
+    @staticmethod
+    def encode_params(save_path, compression=None, strategy=None,
+                      bilevel=False):
+        """Build the cv2.imwrite parameters for a file
+
+        Without options, PNG files are written with OpenCV's defaults,
+        which are tuned for speed. WebP files are always lossless.
+
+        Parameters:
+        - save_path: Path of the file; its extension selects the format
+        - compression: PNG zlib level from 0 (fastest, largest) to 9
+          (slowest, smallest), or None for OpenCV's default
+        - strategy: Name of a PNG zlib strategy in PNG_STRATEGIES, or None
+          for OpenCV's default
+        - bilevel: Pack PNG pixels into 1 bit each; only for binary images
+
+        Returns:
+        - List of cv2.IMWRITE_* flags and values
+        """
+        if strategy is not None and strategy not in PNG_STRATEGIES:
+            raise ValueError(f"Unknown PNG strategy: {strategy}")
+        extension = os.path.splitext(save_path)[1].lower()
+        params = []
+        if extension == ".png":
+            if compression is not None:
+                params += [cv2.IMWRITE_PNG_COMPRESSION, int(compression)]
+            if strategy is not None:
+                params += [cv2.IMWRITE_PNG_STRATEGY, PNG_STRATEGIES[strategy]]
+            if bilevel:
+                params += [cv2.IMWRITE_PNG_BILEVEL, 1]
+        elif extension == ".webp":
+            params += [cv2.IMWRITE_WEBP_QUALITY, WEBP_LOSSLESS_QUALITY]
+        return params
+
+    def save_image(self, image, save_path, compression=None, strategy=None,
+                   bilevel=False):
         """Save an image to the specified path
 
         Parameters:
         - image: OpenCV image (numpy array)
-        - save_path: Path to save the image
+        - save_path: Path to save the image; its extension selects the
+          format, .npz for a NumPy archive (see binary_maps.save_npz)
+        - compression, strategy: PNG encoder options (see encode_params)
+        - bilevel: Write binary images, e.g. Canny edge maps, as PNG with
+          1 bit per pixel, which is faster and several times smaller.
+          Other images are written as usual, so nothing is lost.
 
         Returns:
         - Boolean indicating success/failure
@@ -125,8 +526,16 @@ class ImageProcessor:
             # Ensure directory exists
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
+            if save_path.lower().endswith(".npz"):
+                binary_maps.save_npz(image, save_path)
+                return True
+
+            bilevel = (bilevel and save_path.lower().endswith(".png")
+                       and self.is_binary(image))
+            params = self.encode_params(save_path, compression, strategy,
+                                        bilevel)
             # Save the image
-            result = cv2.imwrite(save_path, image)
+            result = cv2.imwrite(save_path, image, params)
             return result
         except Exception as e:
             print(f"Error saving image: {e}")
@@ -0,0 +1,442 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.utils.edge_detection import EdgeDetector, MAGNITUDE_STRIP_ROWS
+from src.utils.preprocessing import PreprocessContext
+from src.utils.workspace import Workspace
+
+# Shorter side in pixels below which no further pyramid level is used
+MIN_LEVEL_SIZE = 16
+
+
+class MultiScaleEdgeDetector:
+    """Run EdgeDetector methods across Gaussian pyramid levels
+
+    The operator runs on the image itself and on its cv2.pyrDown levels,
+    where the same 3x3 kernels cover 2x, 4x, ... larger neighbourhoods.
+    Coarse levels respond to broad outlines such as petal edges and
+    average out fine texture noise. The responses are fused from the
+    coarsest level to the finest, each upsampled only to the next finer
+    level, by taking the maximum or a weighted sum:
+
+    - Sobel/Prewitt: gradient magnitudes, normalized once at the end
+    - Laplacian: absolute Laplacian responses
+    - Canny: the Sobel gradient vectors (with "max", those of the level
+      with the strongest |dx| + |dy|), so non-maximum suppression and
+      hysteresis run once at full resolution and edges stay one pixel wide
+
+    With workers > 1 in the detector, each level is split into row bands
+    processed on a thread pool, as in the single-scale path; the results
+    are the same as with one worker.
+
+    Every level has a quarter of the pixels of the one below, so all
+    coarse levels together cost about a third of the full resolution pass.
+    Upsampling the half resolution level and fusing it at full resolution
+    costs about as much again. Measured with 3 levels on a 12 MP image and
+    one worker, relative to a single pass on a new image (on a context
+    whose grayscale and blurred images already exist):
+
+    - Sobel, Prewitt: 1.4-1.55x (1.4-1.5x)
+    - Laplacian: 1.65x (1.9x)
+    - Canny: 1.9x with "sum", 2.1x with "max" (2.5x and 2.9x)
+
+    Canny costs the most: a single pass is little more than cv2.Canny,
+    which computes its gradients internally, while the fusion computes,
+    upsamples and compares two gradient images per level.
+    """
+
+    def __init__(self, detector=None, scales=3, fusion=EdgeDetector.FUSION_MAX,
+                 weights=None):
+        """Initialize the multi-scale detector
+
+        Parameters:
+        - detector: EdgeDetector providing the operators (default: a new one)
+        - scales: Number of pyramid levels, including the full image
+        - fusion: One of EdgeDetector.FUSIONS
+        - weights: Weight of each level for the "sum" fusion, finest first
+          (default: equal weights); normalized to sum to one
+        """
+        if fusion not in EdgeDetector.FUSIONS:
+            raise ValueError(f"Unknown fusion: {fusion}")
+        self.detector = detector if detector is not None else EdgeDetector()
+        self.scales = max(1, scales)
+        self.fusion = fusion
+        self.weights = weights
+        self._local = threading.local()
+        self._executor = None
+        # Threads sharing the detector must not start two pools
+        self._executor_lock = threading.Lock()
+
+    def _level_workspace(self, level):
+        """Workspace of the calling thread for a pyramid level"""
+        workspaces = getattr(self._local, "workspaces", None)
+        if workspaces is None:
+            workspaces = self._local.workspaces = {}
+        workspace = workspaces.get(level)
+        if workspace is None:
+            workspace = workspaces[level] = Workspace()
+        return workspace
+
+    def level_count(self, pyramid):
+        """Number of levels used for an image, at most scales"""
+        return max(1, min(self.scales, pyramid.level_count(MIN_LEVEL_SIZE)))
+
+    def _level_weights(self, count):
+        """Weights of the first count levels, summing to one"""
+        weights = list(self.weights or [1.0] * count)[:count]
+        weights += [weights[-1]] * (count - len(weights))
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("Level weights must have a positive sum")
+        return [weight / total for weight in weights]
+
+    def apply(self, method, image, out=None, workspace=None, **params):
+        """Apply an edge detection method at several scales
+
+        Parameters:
+        - method: One of EdgeDetector.METHODS
+        - image: Input image (numpy array) or PreprocessContext
+        - out: Optional uint8 array receiving the result
+        - workspace: Optional Workspace for the full resolution buffers
+        - params: Extra arguments for the method (thresholds, blur_ksize)
+
+        Returns:
+        - Edge detected image of the input size
+        """
+        workspace = workspace if workspace is not None else Workspace()
+        context = PreprocessContext.from_image(image, workspace)
+        if method == "Sobel":
+            return self._apply_gradient(self.detector.sobel_magnitude,
+                                        context, out, workspace)
+        if method == "Prewitt":
+            return self._apply_gradient(self.detector.prewitt_magnitude,
+                                        context, out, workspace)
+        if method == "Canny":
+            return self._apply_canny(context, out, workspace, **params)
+        if method == "Laplacian":
+            return self._apply_laplacian(context, out, workspace, **params)
+        raise ValueError(f"Unknown method: {method}")
+
+    def _bands(self, height):
+        """Split the rows of a level into one band per worker
+
+        Bands start at multiples of MAGNITUDE_STRIP_ROWS, so the strips of
+        the upsampled coarser level line up with them.
+        """
+        rows = -(-height // self.detector.workers)
+        rows = -(-rows // MAGNITUDE_STRIP_ROWS) * MAGNITUDE_STRIP_ROWS
+        return [slice(row, min(row + rows, height))
+                for row in range(0, height, rows)]
+
+    def _run(self, function, bands, level, workspace):
+        """Call function(rows, workspace) for every band of a level
+
+        A single band runs on the calling thread with the given workspace.
+        Several bands run on the thread pool, each with the pool thread's
+        workspace for the level.
+
+        Returns:
+        - List of the return values in band order
+        """
+        if len(bands) == 1:
+            return [function(bands[0], workspace)]
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.detector.workers,
+                    thread_name_prefix="MultiScaleEdgeDetector")
+            executor = self._executor
+        return list(executor.map(
+            lambda rows: function(rows, self._level_workspace(level)),
+            bands))
+
+    def shutdown(self):
+        """Stop the worker threads, if any were started"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _upsampled_strips(self, image, shape, workspace, name, rows=None):
+        """Resize a coarser level's image to the next finer level in strips
+
+        Yields (rows, strip) pairs covering the finer level, or the given
+        slice of its rows, from top to bottom, MAGNITUDE_STRIP_ROWS rows at
+        a time, so each strip can be fused into the finer level while it is
+        cache resident. When the finer level has exactly twice the rows,
+        each strip is resized from the source rows it interpolates plus one
+        row of halo, which gives the same interpolation weights, and
+        results, as resizing the whole image; rows must then start at a
+        multiple of MAGNITUDE_STRIP_ROWS. Odd heights do not map onto whole
+        source rows, so their level is resized at once and handed out in
+        slices, as is an image that already has the finer level's size.
+        """
+        height, width = shape
+        rows = rows if rows is not None else slice(0, height)
+        if height != 2 * image.shape[0]:
+            upsampled = image
+            if image.shape[:2] != (height, width):
+                upsampled = cv2.resize(
+                    image, (width, height),
+                    dst=workspace.buffer(name, shape, image.dtype),
+                    interpolation=cv2.INTER_LINEAR)
+            for row in range(rows.start, rows.stop, MAGNITUDE_STRIP_ROWS):
+                strip = slice(row, min(row + MAGNITUDE_STRIP_ROWS, rows.stop))
+                yield strip, upsampled[strip]
+            return
+
+        # Rows 2k and 2k + 1 interpolate between source rows k - 1, k and
+        # k + 1; two extra rows on each side cover the halo
+        buffer = workspace.buffer(
+            name, (MAGNITUDE_STRIP_ROWS + 4, width), image.dtype)
+        half = MAGNITUDE_STRIP_ROWS // 2
+        for row in range(rows.start, rows.stop, MAGNITUDE_STRIP_ROWS):
+            first = max(row // 2 - 1, 0)
+            last = min(row // 2 + half + 1, image.shape[0])
+            resized = cv2.resize(
+                image[first:last], (width, 2 * (last - first)),
+                dst=buffer[:2 * (last - first)],
+                interpolation=cv2.INTER_LINEAR)
+            top = row - 2 * first
+            count = min(MAGNITUDE_STRIP_ROWS, rows.stop - row)
+            yield slice(row, row + count), resized[top:top + count]
+
+    def _fuse_levels(self, images, dtypes, respond, fuse, workspace):
+        """Compute the responses of every level and fuse them
+
+        The levels are processed from the coarsest to the finest, each in
+        row bands on the detector's workers. A band computes the responses
+        of its rows, with one row of halo for the 3x3 operators, and fuses
+        the coarser level's result into them strip by strip.
+
+        Parameters:
+        - images: Level images, finest first
+        - dtypes: Dtypes of the responses
+        - respond: Function (image, workspace) returning a tuple of
+          responses of the image with these dtypes
+        - fuse: Function (level, responses, upsampled, workspace) fusing
+          strips of the upsampled coarser result into strips of the
+          responses, in place
+        - workspace: Workspace for the full resolution buffers
+
+        Returns:
+        - Tuple of the fused full resolution responses
+        - Row bands of the full resolution level
+        """
+        fused = None
+        for level in reversed(range(len(images))):
+            level_workspace = (workspace if level == 0
+                               else self._level_workspace(level))
+            fused, bands = self._fuse_level(
+                level, images[level], fused, dtypes, respond, fuse,
+                level_workspace)
+        return fused, bands
+
+    def _fuse_level(self, level, image, coarser, dtypes, respond, fuse,
+                    workspace):
+        """Compute the responses of one level and fuse the coarser result
+
+        Returns:
+        - Tuple of the fused responses of the level
+        - Row bands of the level
+        """
+        height, width = image.shape[:2]
+        bands = self._bands(height)
+        results = None
+        if len(bands) > 1:
+            # The bands' responses are gathered into whole level images
+            results = tuple(
+                workspace.buffer(f"multiscale_fused_{index}", image.shape,
+                                 dtype)
+                for index, dtype in enumerate(dtypes))
+            if coarser is not None and height != 2 * coarser[0].shape[0]:
+                # Odd heights do not map onto whole source rows per band
+                coarser = tuple(
+                    cv2.resize(response, (width, height),
+                               dst=workspace.buffer(
+                                   f"multiscale_upsampled_{index}",
+                                   image.shape, response.dtype),
+                               interpolation=cv2.INTER_LINEAR)
+                    for index, response in enumerate(coarser))
+
+        def fuse_band(rows, band_workspace):
+            padded = slice(max(rows.start - 1, 0), min(rows.stop + 1, height))
+            core = slice(rows.start - padded.start, rows.stop - padded.start)
+            responses = tuple(response[core] for response
+                              in respond(image[padded], band_workspace))
+            if coarser is not None:
+                strips = zip(*(
+                    self._upsampled_strips(response, image.shape,
+                                           band_workspace,
+                                           f"multiscale_up_{index}", rows)
+                    for index, response in enumerate(coarser)))
+                for strip in strips:
+                    strip_rows, _ = strip[0]
+                    local = slice(strip_rows.start - rows.start,
+                                  strip_rows.stop - rows.start)
+                    fuse(level, tuple(response[local]
+                                      for response in responses),
+                         tuple(upsampled for _, upsampled in strip),
+                         band_workspace)
+            if results is None:
+                return responses
+            for result, response in zip(results, responses):
+                np.copyto(result[rows], response)
+            return results
+
+        return self._run(fuse_band, bands, level, workspace)[0], bands
+
+    def _fusion(self, count, strongest=False):
+        """Function fusing strips of an upsampled coarser result into a level
+
+        With "sum", each level keeps the running result a weighted average
+        of the levels fused so far, so no level needs a separate scaling
+        pass. With strongest, "max" compares (dx, dy) gradient vectors
+        instead of single responses.
+        """
+        if self.fusion == EdgeDetector.FUSION_MAX:
+            return self._fuse_strongest if strongest else self._fuse_max
+
+        weights = self._level_weights(count)
+        factors = {}
+        remaining = weights[-1]
+        for level in reversed(range(count - 1)):
+            total = remaining + weights[level]
+            factors[level] = (weights[level] / total, remaining / total)
+            remaining = total
+
+        def fuse_sum(level, responses, upsampled, workspace):
+            alpha, beta = factors[level]
+            for response, strip in zip(responses, upsampled):
+                cv2.addWeighted(response, alpha, strip, beta, 0.0,
+                                dst=response)
+
+        return fuse_sum
+
+    @staticmethod
+    def _fuse_max(level, responses, upsampled, workspace):
+        """Keep the larger of each response and its upsampled counterpart"""
+        for response, strip in zip(responses, upsampled):
+            np.maximum(response, strip, out=response)
+
+    @staticmethod
+    def _fuse_strongest(level, responses, upsampled, workspace):
+        """Keep the gradient vector of the level with the largest |dx|+|dy|"""
+        (dx, dy), (up_dx, up_dy) = responses, upsampled
+        # |dx| + |dy| of 3x3 Sobel derivatives of uint8 images fits in
+        # int16
+        strip_shape = (MAGNITUDE_STRIP_ROWS, dx.shape[1])
+        count = len(dx)
+        strength = workspace.buffer(
+            "multiscale_strength", strip_shape, np.int16)[:count]
+        up_strength = workspace.buffer(
+            "multiscale_up_strength", strip_shape, np.int16)[:count]
+        scratch = workspace.buffer(
+            "multiscale_abs", strip_shape, np.int16)[:count]
+        stronger = workspace.buffer(
+            "multiscale_stronger", strip_shape, np.uint8)[:count]
+        cv2.add(np.absolute(dx, out=strength),
+                np.absolute(dy, out=scratch), dst=strength)
+        cv2.add(np.absolute(up_dx, out=up_strength),
+                np.absolute(up_dy, out=scratch), dst=up_strength)
+        cv2.compare(up_strength, strength, cv2.CMP_GT, dst=stronger)
+        cv2.copyTo(up_dx, stronger, dx)
+        cv2.copyTo(up_dy, stronger, dy)
+
+    def _levels(self, pyramid):
+        """Images of the levels used for a pyramid, finest first"""
+        return [pyramid.level(level)
+                for level in range(self.level_count(pyramid))]
+
+    def _apply_gradient(self, magnitude_function, context, out, workspace):
+        """Sobel/Prewitt: fuse magnitudes, then normalize once"""
+        images = self._levels(context.pyramid())
+        if self.detector.precision == EdgeDetector.PRECISION_FLOAT64:
+            dtype = np.float64
+        else:
+            dtype = np.float32
+        (fused,), bands = self._fuse_levels(
+            images, (dtype,),
+            lambda image, band_workspace: (
+                magnitude_function(image, band_workspace),),
+            self._fusion(len(images)), workspace)
+
+        ranges = self._run(lambda rows, band_workspace:
+                           cv2.minMaxLoc(fused[rows])[:2],
+                           bands, 0, workspace)
+        value_range = (min(low for low, _ in ranges),
+                       max(high for _, high in ranges))
+        out = self.detector._output(out, context.shape)
+        self._run(lambda rows, band_workspace:
+                  self.detector.normalize_magnitude(
+                      fused[rows], out[rows], band_workspace, value_range),
+                  bands, 0, workspace)
+        return out
+
+    def _apply_laplacian(self, context, out, workspace, blur_ksize=5):
+        """Laplacian: fuse absolute responses, then saturate to uint8"""
+        images = self._levels(context.pyramid(blur_ksize))
+        if self.detector.precision == EdgeDetector.PRECISION_FLOAT64:
+            depth, dtype = cv2.CV_64F, np.float64
+        else:
+            depth, dtype = cv2.CV_32F, np.float32
+
+        def respond(image, band_workspace):
+            response = band_workspace.buffer(
+                "laplacian_abs", image.shape, dtype)
+            cv2.Laplacian(image, depth, dst=response)
+            np.absolute(response, out=response)
+            return (response,)
+
+        (fused,), bands = self._fuse_levels(
+            images, (dtype,), respond, self._fusion(len(images)), workspace)
+
+        out = self.detector._output(out, context.shape)
+
+        def convert(rows, band_workspace):
+            if depth == cv2.CV_64F:
+                np.clip(fused[rows], 0, 255, out=fused[rows])
+                np.copyto(out[rows], fused[rows], casting="unsafe")
+            else:
+                cv2.convertScaleAbs(fused[rows], dst=out[rows])
+
+        self._run(convert, bands, 0, workspace)
+        return out
+
+    def _apply_canny(self, context, out, workspace, threshold1=100,
+                     threshold2=200, blur_ksize=5, keep_gradients=False,
+                     auto_threshold=None, sigma=0.33):
+        """Canny on the fused Sobel gradients of all levels
+
+        Automatic thresholds are estimated on the full resolution image.
+        The fused gradients differ from the context's single-scale ones,
+        so keep_gradients has no effect here.
+        """
+        if auto_threshold is not None:
+            threshold1, threshold2 = self.detector.canny_thresholds(
+                context, auto_threshold, sigma, blur_ksize)
+        images = self._levels(context.pyramid(blur_ksize))
+
+        def respond(image, band_workspace):
+            # Same derivatives as inside cv2.Canny
+            dx = cv2.Sobel(image, cv2.CV_16S, 1, 0, ksize=3,
+                           dst=band_workspace.buffer(
+                               "multiscale_dx", image.shape, np.int16),
+                           borderType=cv2.BORDER_REPLICATE)
+            dy = cv2.Sobel(image, cv2.CV_16S, 0, 1, ksize=3,
+                           dst=band_workspace.buffer(
+                               "multiscale_dy", image.shape, np.int16),
+                           borderType=cv2.BORDER_REPLICATE)
+            return dx, dy
+
+        (dx, dy), _ = self._fuse_levels(
+            images, (np.int16, np.int16), respond,
+            self._fusion(len(images), strongest=True), workspace)
+
+        out = self.detector._output(out, context.shape)
+        cv2.Canny(dx, dy, threshold1, threshold2, edges=out)
+        return out
@@ -0,0 +1,202 @@
+import queue
+import threading
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.image_processor import ImageProcessor
+
+# Marks the end of the work items in a stage queue
+_DONE = object()
+
+
+class EdgeDetectionPipeline:
+    """Decode, detect and encode images in concurrent stages
+
+    Each stage runs on its own threads and hands its output to the next
+    stage through a bounded queue:
+
+        decode (cv2.imread) -> detect (EdgeDetector) -> encode (cv2.imwrite)
+
+    OpenCV releases the GIL while decoding, detecting and encoding, so disk
+    I/O and codec time overlap with the edge detection. A full queue blocks
+    the stage feeding it, so at most a few images per queue are held in
+    memory no matter how many are processed.
+    """
+
+    def __init__(self, methods=EdgeDetector.METHODS, detector=None,
+                 params=None, queue_size=4, decoders=1, encoders=1,
+                 target_size=None, grayscale=False, save_options=None):
+        """Initialize the pipeline
+
+        Parameters:
+        - methods: Edge detection methods applied to every image
+        - detector: EdgeDetector used by the detect stage (default: new one)
+        - params: Dict of extra arguments per method, e.g. thresholds
+        - queue_size: Capacity of each queue between two stages
+        - decoders: Number of threads decoding images
+        - encoders: Number of threads encoding results
+        - target_size: Optional (width, height) the images are decoded to
+          fit in (see ImageProcessor.read_image)
+        - grayscale: Decode the images to grayscale
+        - save_options: Dict of ImageProcessor.save_image arguments, e.g.
+          the PNG compression level
+        """
+        for method in methods:
+            if method not in EdgeDetector.METHODS:
+                raise ValueError(f"Unknown method: {method}")
+        self.methods = list(methods)
+        self.detector = detector if detector is not None else EdgeDetector()
+        self.params = params or {}
+        self.queue_size = max(1, queue_size)
+        self.decoders = max(1, decoders)
+        self.encoders = max(1, encoders)
+        self.target_size = target_size
+        self.grayscale = grayscale
+        self.save_options = save_options or {}
+        self.image_processor = ImageProcessor()
+
+    def run(self, jobs):
+        """Process images through the pipeline
+
+        Parameters:
+        - jobs: Iterable of (image path, {method: save path}) pairs; it is
+          consumed lazily as the decode stage has room
+
+        Yields:
+        - (image path, saved result count, error message or None) in the
+          order the images finish
+        """
+        stop = threading.Event()
+        paths = queue.Queue(self.queue_size)
+        decoded = queue.Queue(self.queue_size)
+        detected = queue.Queue(self.queue_size)
+        finished = queue.Queue()
+
+        stages = [(self._feed, (jobs, paths, stop), 1),
+                  (self._decode, (paths, decoded, finished, stop),
+                   self.decoders),
+                  (self._detect, (decoded, detected, finished, stop), 1),
+                  (self._encode, (detected, finished, stop), self.encoders)]
+        threads = [threading.Thread(target=self._stage,
+                                    args=(target, args, finished, stop),
+                                    daemon=True)
+                   for target, args, count in stages
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            # Every encoder thread signals the end of its work with _DONE
+            remaining = self.encoders
+            while remaining:
+                item = finished.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            # Also stops the stages when the caller stops iterating early
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def _put(target_queue, item, stop):
+        """Put an item into a bounded queue unless the pipeline stops
+
+        Returns:
+        - False if the pipeline was stopped before there was room
+        """
+        while not stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @staticmethod
+    def _get(source_queue, stop):
+        """Get the next item from a queue, or _DONE when stopped"""
+        while not stop.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    @staticmethod
+    def _stage(target, args, finished, stop):
+        """Run a stage, stopping the whole pipeline if it fails"""
+        try:
+            target(*args)
+        except Exception as e:
+            # Queued before stopping so it arrives ahead of the encoders' _DONE
+            finished.put(e)
+            stop.set()
+
+    def _drain(self, source_queue, producers, stop):
+        """Yield items from a queue until all its producers have finished"""
+        remaining = producers
+        while remaining:
+            item = self._get(source_queue, stop)
+            if item is _DONE:
+                if stop.is_set():
+                    return
+                remaining -= 1
+            else:
+                yield item
+
+    def _feed(self, jobs, paths, stop):
+        """Feed the jobs into the decode queue"""
+        for job in jobs:
+            if not self._put(paths, job, stop):
+                return
+        for _ in range(self.decoders):
+            self._put(paths, _DONE, stop)
+
+    def _decode(self, paths, decoded, finished, stop):
+        """Decode stage: read images from disk"""
+        for image_path, save_paths in self._drain(paths, 1, stop):
+            image = ImageProcessor.read_image(image_path, self.target_size,
+                                              self.grayscale)
+            if image is None:
+                finished.put((image_path, 0, "Could not read the image"))
+                continue
+            if not self._put(decoded, (image_path, image, save_paths), stop):
+                return
+        self._put(decoded, _DONE, stop)
+
+    def _detect(self, decoded, detected, finished, stop):
+        """Detect stage: run every method on the decoded images"""
+        for image_path, image, save_paths in self._drain(
+                decoded, self.decoders, stop):
+            try:
+                context = self.detector.prepare(image)
+                results = {method: self.detector.apply(
+                               method, context,
+                               **self.params.get(method, {}))
+                           for method in self.methods}
+            except Exception as e:
+                finished.put((image_path, 0, str(e)))
+                continue
+            if not self._put(detected, (image_path, results, save_paths),
+                             stop):
+                return
+        for _ in range(self.encoders):
+            self._put(detected, _DONE, stop)
+
+    def _encode(self, detected, finished, stop):
+        """Encode stage: write the results to disk"""
+        for image_path, results, save_paths in self._drain(detected, 1, stop):
+            saved = 0
+            error = None
+            for method, result in results.items():
+                if not self.image_processor.save_image(
+                        result, save_paths[method], **self.save_options):
+                    error = f"Could not write {save_paths[method]}"
+                    break
+                saved += 1
+            finished.put((image_path, saved, error))
+        finished.put(_DONE)
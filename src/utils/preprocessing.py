@@ -0,0 +1,195 @@
+import threading
+
+import cv2
+import numpy as np
+
+from src.utils.pyramid import ImagePyramid
+from src.utils.result_cache import image_digest
+
+
+class PreprocessContext:
+    """Preprocessing shared by every edge detector applied to one image
+
+    The grayscale conversion and the Gaussian blurred variants are computed
+    lazily on first use and then cached, so running several detectors on
+    the same image converts and blurs it only once. When a Workspace is
+    given the intermediate images are written into its buffers instead of
+    newly allocated arrays.
+
+    A context may be shared by detectors running on several threads; each
+    intermediate image is still computed only once.
+    """
+
+    def __init__(self, image, workspace=None):
+        """Create a context for the given image
+
+        Parameters:
+        - image: Input image (numpy array), BGR or already grayscale
+        - workspace: Optional Workspace providing reusable buffers
+        """
+        self.image = image
+        self.workspace = workspace
+        self._gray = None
+        self._blurred = {}
+        self._digest = None
+        self._gradients = None  # (ksize, dx, dy) of the latest blur size
+        self._pyramids = {}  # blur ksize (None: unblurred) -> ImagePyramid
+        # Reentrant because blurred() computes the grayscale image
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_image(cls, image, workspace=None):
+        """Wrap an image in a context, passing existing contexts through
+
+        Parameters:
+        - image: Input image (numpy array) or PreprocessContext
+        - workspace: Optional Workspace used when a new context is created
+
+        Returns:
+        - PreprocessContext for the image
+        """
+        if isinstance(image, cls):
+            return image
+        return cls(image, workspace)
+
+    def region(self, slices, workspace=None):
+        """Context of a rectangular part of the image
+
+        The intermediate images this context already computed are shared
+        as views, so the part does not compute them again. Near the edges
+        of the part they hold the values of the whole image rather than
+        of the part processed on its own.
+
+        Parameters:
+        - slices: Tuple (rows, columns) of slices selecting the part
+        - workspace: Optional Workspace for what the part still computes
+
+        Returns:
+        - PreprocessContext of the part
+        """
+        context = PreprocessContext(self.image[slices], workspace)
+        with self._lock:
+            if self._gray is not None:
+                context._gray = self._gray[slices]
+            context._blurred = {ksize: blurred[slices]
+                                for ksize, blurred in self._blurred.items()}
+            if self._gradients is not None:
+                ksize, dx, dy = self._gradients
+                context._gradients = (ksize, dx[slices], dy[slices])
+        return context
+
+    @property
+    def shape(self):
+        """Height and width of the image"""
+        return self.image.shape[:2]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the intermediate images of this context"""
+        with self._lock:
+            arrays = list(self._blurred.values())
+            if self._gray is not None and self._gray is not self.image:
+                arrays.append(self._gray)
+            if self._gradients is not None:
+                arrays.extend(self._gradients[1:])
+            return (sum(array.nbytes for array in arrays)
+                    + sum(pyramid.nbytes
+                          for pyramid in self._pyramids.values()))
+
+    @property
+    def digest(self):
+        """Hash of the image content, computed on first access"""
+        with self._lock:
+            if self._digest is None:
+                self._digest = image_digest(self.image)
+            return self._digest
+
+    def _buffer(self, name, dtype=np.uint8):
+        """Return an image-sized workspace buffer, or None"""
+        if self.workspace is None:
+            return None
+        return self.workspace.buffer(name, self.shape, dtype)
+
+    @property
+    def gray(self):
+        """Grayscale version of the image, computed on first access"""
+        with self._lock:
+            if self._gray is None:
+                image = self.image
+                if len(image.shape) > 2:
+                    self._gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY,
+                                              dst=self._buffer("gray"))
+                else:
+                    self._gray = image
+            return self._gray
+
+    def blurred(self, ksize=5):
+        """Return the grayscale image smoothed by a Gaussian blur
+
+        Parameters:
+        - ksize: Odd kernel size of the square Gaussian kernel
+
+        Returns:
+        - Blurred grayscale image, cached per kernel size
+        """
+        with self._lock:
+            blurred = self._blurred.get(ksize)
+            if blurred is None:
+                blurred = cv2.GaussianBlur(
+                    self.gray, (ksize, ksize), 0,
+                    dst=self._buffer(f"blurred_{ksize}"))
+                self._blurred[ksize] = blurred
+            return blurred
+
+    def gradients(self, ksize=5):
+        """Return the Sobel gradients cv2.Canny computes internally
+
+        The 3x3 int16 Sobel derivatives of the blurred image with
+        replicated borders, so cv2.Canny(dx, dy, ...) gives the same edges
+        as cv2.Canny(blurred, ...). Only the gradients of the most recent
+        kernel size are kept, as they need four bytes per pixel.
+
+        Parameters:
+        - ksize: Kernel size of the Gaussian blur
+
+        Returns:
+        - Tuple (dx, dy) of int16 gradient images
+        """
+        with self._lock:
+            if self._gradients is None or self._gradients[0] != ksize:
+                blurred = self.blurred(ksize)
+                dx = cv2.Sobel(blurred, cv2.CV_16S, 1, 0, ksize=3,
+                               dst=self._buffer("canny_dx", np.int16),
+                               borderType=cv2.BORDER_REPLICATE)
+                dy = cv2.Sobel(blurred, cv2.CV_16S, 0, 1, ksize=3,
+                               dst=self._buffer("canny_dy", np.int16),
+                               borderType=cv2.BORDER_REPLICATE)
+                self._gradients = (ksize, dx, dy)
+            return self._gradients[1:]
+
+    def pyramid(self, ksize=None):
+        """Return a Gaussian pyramid of the grayscale image
+
+        Levels are computed on first use and shared by every detector
+        working on this context, e.g. Canny and Laplacian at several scales.
+
+        Parameters:
+        - ksize: Kernel size of the blurred image forming level 0, or None
+          for the unblurred grayscale image
+
+        Returns:
+        - ImagePyramid with cv2.pyrDown levels
+        """
+        with self._lock:
+            pyramid = self._pyramids.get(ksize)
+            if pyramid is None:
+                base = self.gray if ksize is None else self.blurred(ksize)
+                pyramid = ImagePyramid(base, ImagePyramid.GAUSSIAN)
+                self._pyramids[ksize] = pyramid
+            return pyramid
+
+    def release_pyramids(self):
+        """Free the levels of every pyramid; they are rebuilt on use"""
+        with self._lock:
+            for pyramid in self._pyramids.values():
+                pyramid.release()
@@ -0,0 +1,204 @@
+import math
+import threading
+import collections
+
+import cv2
+
+# Bytes of downsampled levels a pyramid keeps before freeing the least
+# recently used ones
+DEFAULT_PYRAMID_BYTES = 256 * 1024 * 1024
+
+
+class ImagePyramid:
+    """Lazily built image pyramid of an image
+
+    Level 0 is the image itself and every further level halves the width
+    and height of the previous one. Levels are computed on first use from
+    the nearest smaller level that is already available, so building the
+    whole pyramid reads the full resolution image only once. Display
+    scaling and zooming start from the smallest level that still has
+    enough pixels, so they never touch the full resolution image once
+    that level exists.
+
+    Downsampled levels are freed, least recently used first, when they
+    take more than max_bytes together, and can be recomputed at any time.
+    """
+
+    AREA = "area"
+    GAUSSIAN = "gaussian"
+    DOWNSAMPLING = (AREA, GAUSSIAN)
+
+    def __init__(self, image, downsampling=AREA,
+                 max_bytes=DEFAULT_PYRAMID_BYTES):
+        """Create the pyramid of an image
+
+        Parameters:
+        - image: Full resolution image (numpy array), level 0
+        - downsampling: "area" (2x2 box average, best for display) or
+          "gaussian" (cv2.pyrDown, best for multi-scale detection)
+        - max_bytes: Memory budget of the downsampled levels
+        """
+        if downsampling not in self.DOWNSAMPLING:
+            raise ValueError(f"Unknown downsampling: {downsampling}")
+        self.base = image
+        self.downsampling = downsampling
+        self.max_bytes = max_bytes
+        self._levels = collections.OrderedDict()  # level -> image, LRU first
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.base.shape
+
+    @property
+    def nbytes(self):
+        """Bytes held by the downsampled levels"""
+        # Detector threads may add levels while another thread measures
+        with self._lock:
+            return self._nbytes()
+
+    def _nbytes(self):
+        """Bytes held by the levels, with the lock held"""
+        return sum(level.nbytes for level in self._levels.values())
+
+    def level_count(self, min_size=1):
+        """Number of levels whose shorter side is at least min_size"""
+        shorter = min(self.base.shape[:2])
+        if shorter < min_size:
+            return 1
+        return int(math.log2(shorter / min_size)) + 1
+
+    def level_shape(self, level):
+        """Height and width of a level"""
+        height, width = self.base.shape[:2]
+        for _ in range(level):
+            if self.downsampling == self.GAUSSIAN:
+                height, width = (height + 1) // 2, (width + 1) // 2
+            else:
+                height, width = max(height // 2, 1), max(width // 2, 1)
+        return height, width
+
+    def _downsample(self, image):
+        if self.downsampling == self.GAUSSIAN:
+            return cv2.pyrDown(image)
+        height, width = image.shape[:2]
+        return cv2.resize(image, (max(width // 2, 1), max(height // 2, 1)),
+                          interpolation=cv2.INTER_AREA)
+
+    def level(self, level):
+        """Return a pyramid level, computing it if needed
+
+        Parameters:
+        - level: 0 for the full image, n for 1/2^n of its size
+
+        Returns:
+        - The level image (shared, do not modify)
+        """
+        if level <= 0:
+            return self.base
+        with self._lock:
+            image = self._levels.get(level)
+            if image is not None:
+                self._levels.move_to_end(level)
+                return image
+
+            # Start from the nearest smaller level that is available
+            start = max((n for n in self._levels if n < level), default=0)
+            image = self._levels[start] if start else self.base
+            for n in range(start + 1, level + 1):
+                image = self._downsample(image)
+                self._levels[n] = image
+            self._trim(keep=level)
+            return image
+
+    def _trim(self, keep=None):
+        """Free least recently used levels beyond the memory budget"""
+        size = self._nbytes()
+        for level in list(self._levels):
+            if size <= self.max_bytes:
+                break
+            if level == keep:
+                continue
+            size -= self._levels.pop(level).nbytes
+
+    def release(self, max_bytes=0):
+        """Free levels when memory runs short
+
+        Parameters:
+        - max_bytes: Bytes of levels to keep at most; freed levels are
+          recomputed when they are used again
+        """
+        with self._lock:
+            budget, self.max_bytes = self.max_bytes, max_bytes
+            self._trim()
+            self.max_bytes = budget
+
+    def level_for_scale(self, scale):
+        """Smallest level with at least the given fraction of the full size
+
+        Parameters:
+        - scale: Target size relative to the full image, e.g. 0.1
+
+        Returns:
+        - Level number
+        """
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log2(1 / scale)))
+        # Integer halving can drop just below the requested size
+        height, width = self.level_shape(level)
+        base_height, base_width = self.base.shape[:2]
+        while level > 0 and (width < base_width * scale
+                             or height < base_height * scale):
+            level -= 1
+            height, width = self.level_shape(level)
+        return level
+
+    def resize(self, size):
+        """Resize the image to the given size starting from the pyramid
+
+        Parameters:
+        - size: Tuple (width, height) of the result
+
+        Returns:
+        - Resized image
+        """
+        width, height = size
+        base_height, base_width = self.base.shape[:2]
+        scale = max(width / base_width, height / base_height)
+        source = self.level(self.level_for_scale(scale))
+        if source.shape[1] == width and source.shape[0] == height:
+            return source
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(source, (width, height),
+                          interpolation=interpolation)
+
+    def region(self, rect, size):
+        """Resize a region of the image, e.g. for a zoomed view
+
+        Parameters:
+        - rect: Tuple (x, y, width, height) in full resolution pixels
+        - size: Tuple (width, height) of the result
+
+        Returns:
+        - Image of the region at the requested size
+        """
+        x, y, rect_width, rect_height = rect
+        scale = max(size[0] / rect_width, size[1] / rect_height)
+        level = self.level_for_scale(scale)
+        source = self.level(level)
+        base_height, base_width = self.base.shape[:2]
+        factor_y = source.shape[0] / base_height
+        factor_x = source.shape[1] / base_width
+        y0 = int(y * factor_y)
+        x0 = int(x * factor_x)
+        y1 = max(int(math.ceil((y + rect_height) * factor_y)), y0 + 1)
+        x1 = max(int(math.ceil((x + rect_width) * factor_x)), x0 + 1)
+        crop = source[y0:y1, x0:x1]
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(crop, size, interpolation=interpolation)
+
+    def clear(self):
+        """Free all downsampled levels"""
+        with self._lock:
+            self._levels.clear()
@@ -0,0 +1,209 @@
+import os
+import json
+import hashlib
+import zipfile
+import threading
+import collections
+
+import numpy as np
+
+from src.utils.binary_maps import BinaryEdgeMap, is_binary
+
+# Where edge maps are cached unless another directory is given
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "flower-edge-detection")
+
+# Total size of the cached edge maps before the least recently used go
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def image_digest(image):
+    """Hash the pixel data of an image
+
+    Parameters:
+    - image: Image (numpy array)
+
+    Returns:
+    - Hex digest identifying the image content, shape and type
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.shape}{image.dtype.str}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of edge detection results
+
+    Results are stored as .npy files named by a hash of the image content,
+    the method and every parameter affecting the result, so reopening an
+    image and running the same methods again loads the edge maps instead
+    of computing them. When the cache grows beyond max_bytes the least
+    recently used results are deleted. Recency survives restarts through
+    the file modification times.
+
+    With pack_binary, binary edge maps such as Canny results are stored
+    as .npz files of a BinaryEdgeMap instead, at most an eighth of the
+    size, and decoded to the same uint8 map when loaded.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR,
+                 max_bytes=DEFAULT_MAX_BYTES, pack_binary=False):
+        """Open or create a cache directory
+
+        Parameters:
+        - directory: Directory holding the cached results
+        - max_bytes: Size cap of the cache in bytes
+        - pack_binary: Store binary edge maps compactly encoded
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pack_binary = pack_binary
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> size, LRU first
+        self._packed = set()  # Keys stored as .npz BinaryEdgeMap files
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index the results already on disk, oldest use first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith((".npy", ".npz")):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size,
+                            name.endswith(".npz")))
+        for _, key, size, packed in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+            if packed:
+                self._packed.add(key)
+        self._evict()
+
+    @staticmethod
+    def key(digest, method, params):
+        """Cache key of one result
+
+        Parameters:
+        - digest: image_digest() of the input image
+        - method: Edge detection method name
+        - params: Dict of everything else affecting the result
+
+        Returns:
+        - Hex key naming the cached file
+        """
+        description = json.dumps([digest, method, params], sort_keys=True,
+                                 default=str)
+        return hashlib.blake2b(description.encode(),
+                               digest_size=20).hexdigest()
+
+    def _path(self, key, packed=None):
+        if packed is None:
+            packed = key in self._packed
+        return os.path.join(self.directory,
+                            key + (".npz" if packed else ".npy"))
+
+    def get(self, key):
+        """Load a cached result
+
+        Returns:
+        - The result image, or None on a miss
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            packed = key in self._packed
+        path = self._path(key, packed)
+        try:
+            if packed:
+                result = BinaryEdgeMap.load(path).decode()
+            else:
+                result = np.load(path)
+            os.utime(path)  # Keep the recency across restarts
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Error reading cached result: {e}")
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self._packed.discard(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """Store a result, evicting old ones beyond the size cap"""
+        packed = self.pack_binary and is_binary(result)
+        path = self._path(key, packed)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            # Written under a temporary name so readers never see a
+            # partial file
+            with open(temp_path, "wb") as f:
+                if packed:
+                    BinaryEdgeMap.encode(result).save(f)
+                else:
+                    np.save(f, result)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Error writing cached result: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self._lock:
+            if key in self._entries and (key in self._packed) != packed:
+                # Stored the other way before; that file is replaced
+                self._remove(key)
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            if packed:
+                self._packed.add(key)
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used results until under the size cap"""
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            self._remove(key)
+
+    def _remove(self, key):
+        """Delete the file of a key that was taken out of the index"""
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        self._packed.discard(key)
+
+    @property
+    def size(self):
+        """Bytes currently used by cached results"""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Delete every cached result"""
+        with self._lock:
+            while self._entries:
+                key, _ = self._entries.popitem()
+                self._remove(key)
+            self._size = 0
+
+    def stats_text(self):
+        """Short hit/miss summary for status displays"""
+        return (f"Cache: {self.hits} hits, {self.misses} misses, "
+                f"{len(self)} results ({self._size / 2**20:.1f} MB)")
@@ -0,0 +1,386 @@
+import cv2
+import numpy as np
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.preprocessing import PreprocessContext
+from src.utils.tiling import TiledEdgeDetector
+from src.utils.workspace import Workspace
+
+# Edge length of the square blocks compared between frames, in pixels
+DEFAULT_BLOCK_SIZE = 64
+
+# Factor frames are shrunk by before their blocks are compared
+CHANGE_DOWNSCALE = 4
+
+# Grey levels a downscaled pixel may change by before its block is dirty
+DEFAULT_CHANGE_THRESHOLD = 8
+
+# Fraction of dirty blocks above which the whole frame is recomputed
+FULL_FRAME_FRACTION = 0.5
+
+
+class _MethodState:
+    """Edge map of one method and what it was computed with"""
+
+    def __init__(self, key, grid_shape, frame_shape):
+        self.key = key
+        # Updated in place; callers get the read-only view
+        self.edges = np.zeros(frame_shape, dtype=np.uint8)
+        self.view = self.edges.view()
+        self.view.flags.writeable = False
+        self.magnitude = None  # Sobel/Prewitt magnitude of the whole frame
+        # Minimum and maximum magnitude of every block, and the range the
+        # edge map was normalized with
+        self.block_low = np.empty(grid_shape)
+        self.block_high = np.empty(grid_shape)
+        self.value_range = None
+        # Blocks changed since the edge map was last brought up to date
+        self.pending = np.ones(grid_shape, dtype=bool)
+
+
+class TemporalEdgeDetector:
+    """Reuse the edge maps of unchanged regions between video frames
+
+    Every frame is compared with the pixels the current edge maps were
+    computed from, block by block, on a copy shrunk by CHANGE_DOWNSCALE:
+    a block is dirty when any of its downscaled pixels changed by more
+    than the threshold. Only the dirty blocks of the frame are converted
+    to grayscale, into a grayscale frame kept by the detector. Edge
+    detection then reruns only on the dirty blocks, widened by one block
+    because their pixels also influence the edges within the operator's
+    halo around them, and each region is read together with that halo.
+    Everything else keeps the previous edge map. In a near-static scene,
+    as from a fixed camera, most frames cost little more than the
+    downscaled comparison.
+
+    Sobel and Prewitt keep the unnormalized magnitude of the whole frame
+    and its extremes per block, so the global range they are normalized
+    with is found from the recomputed blocks alone; only when the range
+    changes is the whole map renormalized. Their results, and those of
+    the Laplacian, equal a full computation on the kept grayscale frame,
+    which holds the pixels of every block as of the last frame it was
+    dirty in. Canny resolves hysteresis within each recomputed region
+    plus a margin of half a block, so an edge whose only strong anchor
+    lies farther away outside the region can differ from a full
+    computation until its own block changes.
+
+    The reference pixels of a block are replaced only when the block is
+    dirty, so a slow drift, e.g. in lighting, accumulates until it
+    crosses the threshold instead of going unnoticed. Multi-scale
+    detectors (scales > 1) see the whole frame at coarse levels and are
+    rerun on the whole frame whenever any block changed. With workers > 1
+    the regions are processed on a thread pool.
+
+    The edge maps are updated in place, so frames with changes cost no
+    full-frame copies; apply() returns read-only views of them.
+    """
+
+    def __init__(self, detector=None, block_size=DEFAULT_BLOCK_SIZE,
+                 threshold=DEFAULT_CHANGE_THRESHOLD):
+        """Initialize the temporal detector
+
+        Parameters:
+        - detector: EdgeDetector computing the regions (default: new one)
+        - block_size: Edge length of the compared blocks in pixels,
+          rounded up to a multiple of CHANGE_DOWNSCALE
+        - threshold: Grey level change of a downscaled pixel that marks
+          its block as dirty; raise it for noisy cameras
+        """
+        self.detector = detector if detector is not None else EdgeDetector()
+        self.block_size = -(-max(block_size, 1) // CHANGE_DOWNSCALE) \
+            * CHANGE_DOWNSCALE
+        self.threshold = threshold
+        self._tiles = TiledEdgeDetector(self.detector,
+                                        workers=self.detector.workers)
+        self._workspace = Workspace()
+        self.reset()
+
+    def reset(self):
+        """Forget the previous frames; the next one is computed in full"""
+        self._frame = None
+        self._gray = None  # Grayscale pixels the edge maps were computed on
+        self._reference = None
+        self._states = {}
+        self.frames = 0
+        self.changed_fraction = 1.0  # Dirty blocks of the latest frame
+        self.blocks_computed = 0  # Blocks recomputed by apply() so far
+        self.blocks_requested = 0  # Blocks apply() returned so far
+
+    def shutdown(self):
+        """Stop the worker threads, if any were started"""
+        self._tiles.shutdown()
+
+    def grid_shape(self, shape):
+        """Number of block rows and columns of a frame shape"""
+        return (-(-shape[0] // self.block_size),
+                -(-shape[1] // self.block_size))
+
+    @staticmethod
+    def downscale(frame):
+        """Grayscale frame shrunk by CHANGE_DOWNSCALE
+
+        Bilinear shrinking averages 2x2 of every 4x4 pixels, enough to
+        damp sensor noise at a fraction of the cost of an area average,
+        and converting the small image to grayscale avoids converting the
+        whole frame.
+        """
+        height, width = frame.shape[:2]
+        size = (-(-width // CHANGE_DOWNSCALE),
+                -(-height // CHANGE_DOWNSCALE))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        if len(small.shape) > 2:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def update(self, frame, small=None):
+        """Take the next frame and find the blocks that changed
+
+        Parameters:
+        - frame: Video frame (numpy array), BGR or grayscale
+        - small: downscale() of the frame if already computed, e.g. on
+          the thread reading the frames
+
+        Returns:
+        - Fraction of the blocks that changed
+        """
+        if small is None:
+            small = self.downscale(frame)
+        grid = self.grid_shape(frame.shape)
+        if (self._frame is None or self._frame.shape != frame.shape
+                or self._reference.shape != small.shape):
+            self._states = {}
+            self._reference = small
+            self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            changed = np.ones(grid, dtype=bool)
+        else:
+            step = self.block_size // CHANGE_DOWNSCALE
+            diff = self._workspace.buffer(
+                "block_diff", (grid[0] * step, grid[1] * step), np.uint8)
+            diff.fill(0)
+            cv2.absdiff(small, self._reference,
+                        dst=diff[:small.shape[0], :small.shape[1]])
+            # Block maxima, reducing along contiguous axes, which numpy
+            # does much faster than both axes at once
+            block_max = diff.reshape(grid[0], step, -1).max(axis=1)
+            changed = block_max.reshape(grid[0], grid[1], step).max(
+                axis=2) > self.threshold
+
+            # Changed blocks start over from the new pixels
+            mask = np.repeat(np.repeat(changed, step, axis=0), step,
+                             axis=1)[:small.shape[0], :small.shape[1]]
+            cv2.copyTo(small, mask.view(np.uint8), self._reference)
+
+        for y0, y1, x0, x1 in self._regions(changed, frame.shape):
+            region = frame[y0:y1, x0:x1]
+            if len(region.shape) > 2:
+                cv2.cvtColor(region, cv2.COLOR_BGR2GRAY,
+                             dst=self._gray[y0:y1, x0:x1])
+            else:
+                self._gray[y0:y1, x0:x1] = region
+        for state in self._states.values():
+            state.pending |= changed
+        self._frame = frame
+        self.frames += 1
+        self.changed_fraction = float(changed.mean())
+        return self.changed_fraction
+
+    def _method_key(self, method, params):
+        """Parameters a method's edge map depends on, thresholds resolved"""
+        params = dict(params)
+        params.pop("keep_gradients", None)
+        if method == "Canny" and params.get("auto_threshold") is not None:
+            # Estimated on the whole frame, so every region uses the same
+            params["threshold1"], params["threshold2"] = \
+                self.detector.canny_thresholds(
+                    self._gray, params["auto_threshold"],
+                    params.get("sigma", 0.33), params.get("blur_ksize", 5))
+            params["auto_threshold"] = None
+        return (self.detector.precision, self.detector.scales,
+                self.detector.fusion, tuple(sorted(params.items())))
+
+    def apply(self, method, out=None, **params):
+        """Edge map of the latest frame, recomputing only dirty regions
+
+        Parameters:
+        - method: One of EdgeDetector.METHODS
+        - out: Optional uint8 array receiving the result
+        - params: Extra arguments for the method (thresholds, blur_ksize);
+          changing them recomputes the whole frame
+
+        Returns:
+        - Edge detected image of the latest frame. Without out it is a
+          read-only view of the edge map, which later frames with changes
+          update in place; copy it to keep it.
+        """
+        if method not in EdgeDetector.METHODS:
+            raise ValueError(f"Unknown method: {method}")
+        if self._frame is None:
+            raise ValueError("No frame to process, call update() first")
+        frame = self._gray
+        key = self._method_key(method, params)
+        params = dict(key[3])
+        grid = self.grid_shape(frame.shape)
+
+        state = self._states.get(method)
+        if state is None or state.key != key:
+            state = _MethodState(key, grid, frame.shape[:2])
+            self._states[method] = state
+        dirty = state.pending
+        dirty_count = int(np.count_nonzero(dirty))
+        self.blocks_requested += dirty.size
+
+        if dirty_count:
+            full = dirty_count > FULL_FRAME_FRACTION * dirty.size
+            if self.detector.scales > 1 or (
+                    full and method in ("Canny", "Laplacian")):
+                # Whole frame at once, on row bands if configured
+                self.detector.apply(method, frame, out=state.edges,
+                                    **params)
+                self.blocks_computed += dirty.size
+            else:
+                if full:
+                    dirty[:] = True
+                else:
+                    # Changed pixels also alter the edges within the
+                    # operator's halo, which may reach into neighbouring
+                    # blocks
+                    halo = TiledEdgeDetector.halo(
+                        method, params.get("blur_ksize", 5))
+                    dirty = cv2.dilate(
+                        dirty.view(np.uint8), np.ones((3, 3), np.uint8),
+                        iterations=-(-halo // self.block_size)).view(bool)
+                self.blocks_computed += int(np.count_nonzero(dirty))
+                regions = self._regions(dirty, frame.shape)
+                if method in ("Sobel", "Prewitt"):
+                    self._update_gradient(method, state, regions)
+                else:
+                    self._update_local(method, state, regions, params)
+            state.pending[:] = False
+
+        if out is None:
+            return state.view
+        out = self.detector._output(out, state.edges.shape)
+        np.copyto(out, state.edges)
+        return out
+
+    def _regions(self, blocks, shape):
+        """Merge marked blocks into rectangles
+
+        Runs of marked blocks within a block row are extended downwards
+        while the rows below have the same run, and split into one band
+        per worker so the regions of a mostly dirty frame keep every
+        worker busy.
+
+        Returns:
+        - List of (y0, y1, x0, x1) rectangles in pixels
+        """
+        rows, cols = blocks.shape
+        padded = np.zeros((rows, cols + 2), dtype=np.int8)
+        padded[:, 1:-1] = blocks
+        # Starts and ends of the runs, in row-major order
+        run_rows, run_edges = np.nonzero(np.diff(padded, axis=1))
+        runs_by_row = {}
+        for row, first, end in zip(run_rows[::2], run_edges[::2],
+                                   run_edges[1::2]):
+            runs_by_row.setdefault(row, []).append((first, end))
+
+        rectangles = []
+        open_runs = {}  # (first column, end column) -> first row
+        for row in range(rows + 1):
+            current = {}
+            for run in runs_by_row.get(row, ()):
+                current[run] = open_runs.pop(run, row)
+            for run, first_row in open_runs.items():
+                rectangles.append((first_row, row) + run)
+            open_runs = current
+
+        size = self.block_size
+        height, width = shape[:2]
+        regions = []
+        for first_row, end_row, first_col, end_col in rectangles:
+            band = -(-(end_row - first_row) // self._tiles.workers)
+            for row in range(first_row, end_row, band):
+                regions.append((row * size,
+                                min(min(row + band, end_row) * size, height),
+                                first_col * size,
+                                min(end_col * size, width)))
+        return regions
+
+    def _update_gradient(self, method, state, regions):
+        """Recompute Sobel/Prewitt magnitudes, then renormalize"""
+        frame = self._gray
+        magnitude_function = self.detector.sobel_magnitude \
+            if method == "Sobel" else self.detector.prewitt_magnitude
+        halo = TiledEdgeDetector.halo(method)
+        size = self.block_size
+
+        def region_magnitude(region, workspace):
+            padded, core = TiledEdgeDetector._padded(
+                region, halo, frame.shape)
+            magnitude = magnitude_function(
+                PreprocessContext(frame[padded], workspace), workspace)[core]
+            y0, y1, x0, x1 = region
+            state.magnitude[y0:y1, x0:x1] = magnitude
+
+            # Regions start at block boundaries
+            for y in range(0, y1 - y0, size):
+                for x in range(0, x1 - x0, size):
+                    block = ((y0 + y) // size, (x0 + x) // size)
+                    state.block_low[block], state.block_high[block] = \
+                        cv2.minMaxLoc(magnitude[y:y + size, x:x + size])[:2]
+
+        if state.magnitude is None:
+            # Same dtype as the magnitude maps of the detector
+            dtype = np.float64 \
+                if self.detector.precision == EdgeDetector.PRECISION_FLOAT64 \
+                else np.float32
+            state.magnitude = np.empty(frame.shape[:2], dtype=dtype)
+        self._tiles._run(region_magnitude, regions)
+
+        value_range = (float(state.block_low.min()),
+                       float(state.block_high.max()))
+        if value_range != state.value_range:
+            # A new global range changes every pixel of the result
+            state.value_range = value_range
+            self.detector.normalize_magnitude(
+                state.magnitude, out=state.edges,
+                workspace=self._workspace, value_range=value_range)
+            return
+
+        def normalize_region(region, workspace):
+            y0, y1, x0, x1 = region
+            self.detector.normalize_magnitude(
+                state.magnitude[y0:y1, x0:x1], out=state.edges[y0:y1, x0:x1],
+                workspace=workspace, value_range=value_range)
+
+        self._tiles._run(normalize_region, regions)
+
+    def _update_local(self, method, state, regions, params):
+        """Recompute Canny/Laplacian regions from their surroundings"""
+        frame = self._gray
+        halo = TiledEdgeDetector.halo(method, params.get("blur_ksize", 5))
+        if method == "Canny":
+            # Context for hysteresis beyond what non-maximum suppression
+            # needs
+            halo += self.block_size // 2
+        apply_method = getattr(self.detector, f"apply_{method.lower()}")
+
+        def region_edges(region, workspace):
+            padded, core = TiledEdgeDetector._padded(
+                region, halo, frame.shape)
+            region_image = frame[padded]
+            region_out = workspace.buffer(
+                "temporal_out", region_image.shape[:2], np.uint8)
+            apply_method(PreprocessContext(region_image, workspace),
+                         out=region_out, workspace=workspace, **params)
+            y0, y1, x0, x1 = region
+            state.edges[y0:y1, x0:x1] = region_out[core]
+
+        self._tiles._run(region_edges, regions)
+
+    def stats_text(self):
+        """Share of the blocks recomputed, for status displays"""
+        if not self.blocks_requested:
+            return "Recomputed: -"
+        share = 100.0 * self.blocks_computed / self.blocks_requested
+        return f"Recomputed: {share:.0f}% of blocks"
@@ -0,0 +1,363 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.preprocessing import PreprocessContext
+from src.utils.workspace import Workspace
+
+# Edge length of the square tiles an image is split into
+DEFAULT_TILE_SIZE = 1024
+
+# Output values marking Canny pixels while hysteresis is resolved
+CANNY_WEAK = 1
+CANNY_STRONG = 255
+
+
+class TiledEdgeDetector:
+    """Run EdgeDetector methods over large images tile by tile
+
+    The image is split into square tiles. Each tile is processed together
+    with a halo of neighbouring pixels wide enough for the operator, so the
+    stitched result is identical to processing the whole image at once.
+    Operations that need whole-image information get a second pass:
+    Sobel and Prewitt collect the global magnitude range before
+    normalizing, and Canny resolves hysteresis across tile seams. Besides
+    the input and the output image, memory use is bounded by the tile size.
+
+    With workers > 1 the tiles are processed on a thread pool; OpenCV
+    releases the GIL, so the tiles run in parallel on separate cores.
+
+    Given a PreprocessContext instead of an image, the grayscale and
+    blurred images are computed once in the context and the tiles work on
+    views of them, so several methods applied to the same context share
+    them. Memory is then no longer bounded by the tile size.
+    """
+
+    def __init__(self, detector=None, tile_size=DEFAULT_TILE_SIZE,
+                 workers=1, retain_tiles=False):
+        """Initialize the tiled detector
+
+        Parameters:
+        - detector: EdgeDetector used for each tile (default: a new one)
+        - tile_size: Edge length of the tiles in pixels, a (height, width)
+          tuple for rectangular tiles, or None for one full-width row band
+          per worker
+        - workers: Number of threads processing tiles concurrently
+        - retain_tiles: Keep the Sobel/Prewitt magnitude of every tile
+          between the two passes instead of recomputing it. Faster, but
+          memory is no longer bounded by the tile size.
+        """
+        self.detector = detector if detector is not None else EdgeDetector()
+        self.tile_size = tile_size
+        self.workers = max(1, workers)
+        self.retain_tiles = retain_tiles
+        self._local = threading.local()
+        self._executor = None
+        # Threads sharing the detector must not start two pools
+        self._executor_lock = threading.Lock()
+
+    @property
+    def workspace(self):
+        """Workspace of the calling thread"""
+        workspace = getattr(self._local, "workspace", None)
+        if workspace is None:
+            workspace = Workspace()
+            self._local.workspace = workspace
+        return workspace
+
+    def shutdown(self):
+        """Stop the worker threads, if any were started"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    @staticmethod
+    def halo(method, blur_ksize=5):
+        """Number of neighbouring pixels a tile needs for exact results
+
+        Parameters:
+        - method: One of EdgeDetector.METHODS
+        - blur_ksize: Kernel size of the Gaussian blur for Canny/Laplacian
+
+        Returns:
+        - Halo width in pixels
+        """
+        if method in ("Sobel", "Prewitt"):
+            return 1
+        if method == "Laplacian":
+            # Gaussian blur followed by the 3x3 Laplacian
+            return blur_ksize // 2 + 1
+        if method == "Canny":
+            # Gaussian blur, 3x3 Sobel and non-maximum suppression
+            return blur_ksize // 2 + 2
+        raise ValueError(f"Unknown method: {method}")
+
+    def tiles(self, shape):
+        """Split an image into tiles
+
+        Parameters:
+        - shape: Shape of the image
+
+        Returns:
+        - List of (y0, y1, x0, x1) tile rectangles in row-major order
+        """
+        height, width = shape[:2]
+        if self.tile_size is None:
+            tile_height = max(-(-height // self.workers), 1)
+            tile_width = max(width, 1)
+        elif isinstance(self.tile_size, tuple):
+            tile_height, tile_width = self.tile_size
+        else:
+            tile_height = tile_width = self.tile_size
+        return [(y, min(y + tile_height, height),
+                 x, min(x + tile_width, width))
+                for y in range(0, height, tile_height)
+                for x in range(0, width, tile_width)]
+
+    @staticmethod
+    def _padded(tile, halo, shape):
+        """Expand a tile by its halo, clipped to the image
+
+        Returns:
+        - Slices of the padded tile within the image
+        - Slices of the tile itself within the padded tile
+        """
+        y0, y1, x0, x1 = tile
+        height, width = shape[:2]
+        py0, py1 = max(y0 - halo, 0), min(y1 + halo, height)
+        px0, px1 = max(x0 - halo, 0), min(x1 + halo, width)
+        padded = (slice(py0, py1), slice(px0, px1))
+        core = (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0))
+        return padded, core
+
+    def _run(self, function, tiles):
+        """Call function(tile, workspace) for every tile
+
+        Returns:
+        - List of the return values in tile order
+        """
+        if self.workers == 1 or len(tiles) == 1:
+            return [function(tile, self.workspace) for tile in tiles]
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="TiledEdgeDetector")
+            executor = self._executor
+        return list(executor.map(
+            lambda tile: function(tile, self.workspace), tiles))
+
+    def apply(self, method, image, out=None, **params):
+        """Apply an edge detection method tile by tile
+
+        Parameters:
+        - method: One of EdgeDetector.METHODS
+        - image: Input image (numpy array, may be a memory map) or
+          PreprocessContext
+        - out: Optional uint8 array receiving the result
+        - params: Extra arguments for the method (thresholds, blur_ksize)
+
+        Returns:
+        - Edge detected image, identical to the untiled result
+        """
+        if isinstance(image, PreprocessContext):
+            self._prepare_shared(method, image, **params)
+        out = self.detector._output(out, image.shape[:2])
+        tiles = self.tiles(image.shape)
+        if method == "Sobel":
+            self._apply_gradient(self.detector.sobel_magnitude,
+                                 image, out, tiles)
+        elif method == "Prewitt":
+            self._apply_gradient(self.detector.prewitt_magnitude,
+                                 image, out, tiles)
+        elif method == "Canny":
+            self._apply_canny(image, out, tiles, **params)
+        elif method == "Laplacian":
+            self._apply_laplacian(image, out, tiles, **params)
+        else:
+            raise ValueError(f"Unknown method: {method}")
+        return out
+
+    @staticmethod
+    def _prepare_shared(method, context, blur_ksize=5, keep_gradients=False,
+                        **params):
+        """Compute the intermediate images the tiles of a method share"""
+        if method in ("Sobel", "Prewitt"):
+            context.gray
+        elif keep_gradients and method == "Canny":
+            context.gradients(blur_ksize)
+        else:
+            context.blurred(blur_ksize)
+
+    @staticmethod
+    def _tile_context(image, padded, workspace):
+        """Context of a padded tile of an image or PreprocessContext"""
+        if isinstance(image, PreprocessContext):
+            return image.region(padded, workspace)
+        return PreprocessContext(image[padded], workspace)
+
+    def _apply_gradient(self, magnitude_function, image, out, tiles):
+        """Two-pass Sobel/Prewitt: global magnitude range, then normalize"""
+        halo = self.halo("Sobel")
+
+        def tile_magnitude(tile, workspace):
+            padded, core = self._padded(tile, halo, image.shape)
+            context = self._tile_context(image, padded, workspace)
+            return magnitude_function(context, workspace)[core]
+
+        magnitudes = {}
+
+        def tile_range(tile, workspace):
+            if self.retain_tiles:
+                # A private workspace keeps this tile's magnitude alive
+                workspace = Workspace()
+            magnitude = tile_magnitude(tile, workspace)
+            if self.retain_tiles:
+                magnitudes[tile] = magnitude
+            return cv2.minMaxLoc(magnitude)[:2]
+
+        ranges = self._run(tile_range, tiles)
+        value_range = (min(low for low, _ in ranges),
+                       max(high for _, high in ranges))
+
+        def normalize_tile(tile, workspace):
+            magnitude = magnitudes.pop(tile, None)
+            if magnitude is None:
+                magnitude = tile_magnitude(tile, workspace)
+            y0, y1, x0, x1 = tile
+            self.detector.normalize_magnitude(
+                magnitude, out=out[y0:y1, x0:x1],
+                workspace=workspace, value_range=value_range)
+
+        self._run(normalize_tile, tiles)
+
+    def _apply_laplacian(self, image, out, tiles, blur_ksize=5):
+        """Laplacian is purely local, so a single pass is enough"""
+        halo = self.halo("Laplacian", blur_ksize)
+
+        def laplacian_tile(tile, workspace):
+            padded, core = self._padded(tile, halo, image.shape)
+            context = self._tile_context(image, padded, workspace)
+            tile_out = workspace.buffer("tile_out", context.shape, np.uint8)
+            self.detector.apply_laplacian(
+                context, blur_ksize=blur_ksize, out=tile_out,
+                workspace=workspace)
+            y0, y1, x0, x1 = tile
+            out[y0:y1, x0:x1] = tile_out[core]
+
+        self._run(laplacian_tile, tiles)
+
+    def _apply_canny(self, image, out, tiles, threshold1=100, threshold2=200,
+                     blur_ksize=5, keep_gradients=False, auto_threshold=None,
+                     sigma=0.33):
+        """Canny with hysteresis resolved across tile seams
+
+        The first pass marks every pixel that survives non-maximum
+        suppression above the low threshold as weak and those above the high
+        threshold as strong. The second pass propagates strong edges into
+        connected weak pixels tile by tile until nothing changes, which
+        yields exactly the edges cv2.Canny finds on the whole image.
+
+        Every tile computes its gradients itself, unless a context with
+        kept gradients is given (keep_gradients). Automatic thresholds are
+        estimated once for the whole image.
+        """
+        halo = self.halo("Canny", blur_ksize)
+        if auto_threshold is not None:
+            threshold1, threshold2 = self.detector.canny_thresholds(
+                image, auto_threshold, sigma, blur_ksize)
+        low, high = min(threshold1, threshold2), max(threshold1, threshold2)
+
+        def mark_tile(tile, workspace):
+            padded, core = self._padded(tile, halo, image.shape)
+            context = self._tile_context(image, padded, workspace)
+
+            # Gradients as computed inside cv2.Canny, shared by both passes
+            dx, dy = context.gradients(blur_ksize)
+
+            weak = workspace.buffer("canny_weak", context.shape, np.uint8)
+            strong = workspace.buffer("canny_strong", context.shape,
+                                      np.uint8)
+            cv2.Canny(dx, dy, low, low, edges=weak)
+            cv2.Canny(dx, dy, high, high, edges=strong)
+
+            y0, y1, x0, x1 = tile
+            tile_out = out[y0:y1, x0:x1]
+            np.minimum(weak[core], CANNY_WEAK, out=tile_out)
+            np.maximum(tile_out, strong[core], out=tile_out)
+
+        self._run(mark_tile, tiles)
+        self._hysteresis(out, tiles)
+
+        def clear_weak(tile, workspace):
+            y0, y1, x0, x1 = tile
+            tile_out = out[y0:y1, x0:x1]
+            cv2.threshold(tile_out, CANNY_WEAK, 255, cv2.THRESH_BINARY,
+                          dst=tile_out)
+
+        self._run(clear_weak, tiles)
+
+    def _hysteresis(self, out, tiles):
+        """Promote weak pixels connected to strong ones until stable
+
+        Tiles of one sweep may run concurrently. A tile only writes its own
+        pixels, and any tile that changes marks its neighbours for another
+        sweep, so edges read while a neighbour was still being updated are
+        picked up in the next sweep.
+        """
+        index = {tile: i for i, tile in enumerate(tiles)}
+        rows = sorted({tile[0] for tile in tiles})
+        cols = sorted({tile[2] for tile in tiles})
+        grid = {(rows.index(tile[0]), cols.index(tile[2])): tile
+                for tile in tiles}
+
+        def promote_tile(tile, workspace):
+            return self._promote(out, tile)
+
+        dirty = list(tiles)
+        while dirty:
+            changed = self._run(promote_tile, dirty)
+            neighbours = set()
+            for tile, tile_changed in zip(dirty, changed):
+                if not tile_changed:
+                    continue
+                row, col = rows.index(tile[0]), cols.index(tile[2])
+                for d_row in (-1, 0, 1):
+                    for d_col in (-1, 0, 1):
+                        neighbour = grid.get((row + d_row, col + d_col))
+                        if neighbour is not None and neighbour != tile:
+                            neighbours.add(neighbour)
+            dirty = sorted(neighbours, key=index.get)
+
+    @staticmethod
+    def _promote(out, tile):
+        """Promote the weak pixels of one tile that touch a strong edge
+
+        Connectivity is evaluated over the tile plus a one pixel border, so
+        strong edges in neighbouring tiles are seen. Only the tile itself is
+        written.
+
+        Returns:
+        - True if any pixel was promoted
+        """
+        padded, core = TiledEdgeDetector._padded(tile, 1, out.shape)
+        region = out[padded]
+        tile_out = region[core]
+        weak = tile_out == CANNY_WEAK
+        if not weak.any():
+            return False
+
+        candidates = (region > 0).astype(np.uint8)
+        count, labels = cv2.connectedComponents(candidates, connectivity=8)
+        connected = np.zeros(count, dtype=bool)
+        connected[labels[region == CANNY_STRONG]] = True
+        promote = connected[labels[core]] & weak
+        if not promote.any():
+            return False
+        tile_out[promote] = CANNY_STRONG
+        return True
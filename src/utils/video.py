@@ -0,0 +1,484 @@
+import os
+import time
+import threading
+import collections
+
+import cv2
+import numpy as np
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.image_processor import ImageProcessor
+from src.utils.temporal import DEFAULT_CHANGE_THRESHOLD, TemporalEdgeDetector
+from src.utils.workspace import Workspace
+
+# Source names selecting the generated test video instead of a file or
+# camera, panning across the scene or as seen by a fixed camera
+SYNTHETIC_SOURCE = "synthetic"
+SYNTHETIC_STATIC_SOURCE = "synthetic-static"
+
+# Frame size and rate of the generated test video
+SYNTHETIC_SIZE = (1920, 1080)
+SYNTHETIC_FPS = 30.0
+
+# Frames the latency statistics are computed over
+LATENCY_WINDOW = 120
+
+
+class SyntheticSource:
+    """Generated test video, a stand-in for a camera
+
+    The frames pan across a fixed scene of petal-like ellipses and
+    gradients while a disc moves over it, so every frame has edges at
+    new positions. Without panning only the disc moves, like in front of
+    a fixed camera. The scene is drawn once; a frame is a crop of it
+    plus the disc, which costs about a millisecond at 1080p. The interface is
+    the part of cv2.VideoCapture that VideoStream uses.
+    """
+
+    def __init__(self, size=SYNTHETIC_SIZE, fps=SYNTHETIC_FPS,
+                 frame_count=None, seed=0, pan=True):
+        """Create the generator
+
+        Parameters:
+        - size: Tuple (width, height) of the frames
+        - fps: Nominal frame rate reported by get(cv2.CAP_PROP_FPS)
+        - frame_count: Number of frames before read() fails, or None for
+          an endless stream
+        - seed: Seed of the random scene
+        - pan: Move across the scene; False keeps it still
+        """
+        self.width, self.height = size
+        self.fps = fps
+        self.frame_count = frame_count
+        self.pan = pan
+        self.index = 0
+        self.margin = max(self.width, self.height) // 8
+        self.scene = self._draw_scene(np.random.default_rng(seed))
+        self._opened = True
+
+    def _draw_scene(self, rng):
+        """Background larger than a frame by the panning margin"""
+        height = self.height + 2 * self.margin
+        width = self.width + 2 * self.margin
+        ramp = np.linspace(40, 160, width, dtype=np.float32)
+        scene = np.empty((height, width, 3), dtype=np.uint8)
+        scene[:] = ramp[None, :, None].astype(np.uint8)
+        radius = min(self.width, self.height) // 10
+        for _ in range(24):
+            center = (int(rng.integers(width)), int(rng.integers(height)))
+            color = tuple(int(c) for c in rng.integers(60, 255, 3))
+            for petal in range(6):
+                cv2.ellipse(scene, center, (radius, radius // 3),
+                            petal * 30, 0, 360, color, -1, cv2.LINE_AA)
+            cv2.circle(scene, center, radius // 4, (0, 200, 255), -1,
+                       cv2.LINE_AA)
+        return scene
+
+    def isOpened(self):
+        return self._opened
+
+    def get(self, prop):
+        """Frame rate and size, like cv2.VideoCapture.get"""
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count or 0)
+        return 0.0
+
+    def read(self):
+        """Return (True, frame), or (False, None) after the last frame"""
+        if not self._opened or (self.frame_count is not None
+                                and self.index >= self.frame_count):
+            return False, None
+        phase = 2 * np.pi * self.index / (4 * self.fps)
+        x = y = self.margin
+        if self.pan:
+            x = int(self.margin * (1 + np.sin(phase)))
+            y = int(self.margin * (1 + np.sin(2 * phase)))
+        frame = self.scene[y:y + self.height, x:x + self.width].copy()
+        disc = (int(self.width * (0.5 + 0.4 * np.cos(phase))),
+                int(self.height * (0.5 + 0.4 * np.sin(3 * phase))))
+        cv2.circle(frame, disc, min(self.width, self.height) // 12,
+                   (255, 255, 255), -1, cv2.LINE_AA)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        self._opened = False
+
+
+def open_video_source(source):
+    """Open a video file, camera or the synthetic test video
+
+    Parameters:
+    - source: File path or URL, camera index (int or digit string, e.g.
+      "0" for /dev/video0), "synthetic" or "synthetic-static", optionally
+      followed by ":WIDTHxHEIGHT"
+
+    Returns:
+    - Tuple (capture, live): an opened cv2.VideoCapture or
+      SyntheticSource, and whether the source delivers frames at its own
+      pace (a camera) rather than as fast as they are read
+
+    Raises:
+    - IOError if the source cannot be opened
+    """
+    name = source.split(":")[0] if isinstance(source, str) else None
+    if name in (SYNTHETIC_SOURCE, SYNTHETIC_STATIC_SOURCE):
+        size = SYNTHETIC_SIZE
+        if ":" in source:
+            try:
+                width, height = source.split(":", 1)[1].lower().split("x")
+                size = (int(width), int(height))
+            except ValueError:
+                raise ValueError(f"Invalid synthetic source size: {source}")
+        return SyntheticSource(
+            size, pan=name == SYNTHETIC_SOURCE), False
+
+    live = isinstance(source, int) or str(source).isdigit()
+    if live:
+        capture = cv2.VideoCapture(int(source))
+    else:
+        capture = cv2.VideoCapture(os.fspath(source))
+    if not capture.isOpened():
+        capture.release()
+        raise IOError(f"Could not open video source: {source}")
+    return capture, live
+
+
+class StreamResult:
+    """Edge maps of one processed frame"""
+
+    def __init__(self, index, frame, results, previews, captured, latency):
+        """Create a result
+
+        Parameters:
+        - index: Number of the frame in the source, from 0
+        - frame: The frame image (numpy array)
+        - results: Dict of method name to full size edge map
+        - previews: Dict of name ("Original" or a method) to the image
+          scaled for display, or the full size images without display size
+        - captured: time.perf_counter() when the frame was read
+        - latency: Seconds from reading the frame to its last edge map
+        """
+        self.index = index
+        self.frame = frame
+        self.results = results
+        self.previews = previews
+        self.captured = captured
+        self.latency = latency
+
+
+class VideoStream:
+    """Run edge detection on the frames of a video source as they arrive
+
+    A reader thread takes frames from the source and a worker thread runs
+    the detectors on them. Between the two there is room for a single
+    frame: when the worker falls behind, a newer frame replaces the one
+    still waiting, so the output keeps up with the source and shows the
+    most recent frame instead of drifting further behind. Replaced frames
+    are counted as dropped.
+
+    Video files and the synthetic source are read at their nominal frame
+    rate, cameras at the rate they deliver. With paced=False every frame
+    of a file is processed as fast as possible and none is dropped, e.g.
+    to measure throughput.
+
+    With temporal=True only the regions that changed since the previous
+    frame are processed again (see TemporalEdgeDetector), which takes a
+    fraction of the time for a fixed camera watching a mostly static
+    scene. The reader thread then also shrinks each frame for the change
+    detection, and the edge maps of a result are views that the worker
+    updates with later frames, unless copy_results is set.
+
+    Consumers poll latest() at their display rate, or wait for new results
+    with a timeout; a callback receives every result instead. The worker
+    reuses one Workspace for all frames, so the detectors allocate only
+    the published edge maps.
+    """
+
+    def __init__(self, source, methods=("Sobel",), detector=None,
+                 params=None, display_size=None, paced=True, callback=None,
+                 temporal=False, change_threshold=DEFAULT_CHANGE_THRESHOLD,
+                 max_frames=None, copy_results=False):
+        """Open a stream; processing starts with start()
+
+        Parameters:
+        - source: Anything open_video_source accepts, or an opened capture
+        - methods: Names of the methods applied to every frame
+        - detector: EdgeDetector to use (default: one thread per CPU)
+        - params: Dict of extra arguments per method, e.g. thresholds
+        - display_size: Tuple (width, height) the previews are scaled to
+          fit in on the worker thread, or None for full size previews
+        - paced: Read files at their frame rate, dropping frames the
+          worker cannot keep up with; False processes every frame
+        - callback: Optional function called on the worker thread with
+          every StreamResult, e.g. to save all of them; it delays the
+          next frame while it runs
+        - temporal: Reuse the edges of regions that did not change since
+          the previous frame; may be switched at any time
+        - change_threshold: Grey level change that marks a region as
+          changed with temporal=True
+        - max_frames: Stop after processing this many frames, or None to
+          run until the source ends
+        - copy_results: Give every result its own copies of the edge
+          maps with temporal=True, for consumers keeping results while
+          later frames are processed
+        """
+        if hasattr(source, "read"):
+            self.capture, live = source, False
+        else:
+            self.capture, live = open_video_source(source)
+        self.name = str(source) if not hasattr(source, "read") \
+            else type(source).__name__
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else SYNTHETIC_FPS
+        # Cameras deliver frames at their own pace
+        self.paced = paced and not live
+        self.dropping = paced or live
+        if detector is None:
+            detector = EdgeDetector(workers=os.cpu_count() or 1)
+        self.detector = detector
+        self.set_methods(methods, params)
+        self.display_size = display_size
+        self.callback = callback
+        self.temporal = temporal
+        self.change_threshold = change_threshold
+        self.max_frames = max_frames
+        self.copy_results = copy_results
+        self._temporal = None  # TemporalEdgeDetector of the worker
+        self.image_processor = ImageProcessor()
+        self.workspace = Workspace()
+
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.error = None
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._processed_times = collections.deque(maxlen=LATENCY_WINDOW)
+        # (index, frame, downscaled frame or None, capture time) not taken
+        self._pending = None
+        self._latest = None
+        self._reading = False
+        self._busy = False  # The worker is processing a frame
+        self._stop = threading.Event()
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def set_methods(self, methods, params=None):
+        """Change the methods and their arguments from the next frame on"""
+        for method in methods:
+            if method not in EdgeDetector.METHODS:
+                raise ValueError(f"Unknown method: {method}")
+        # Replaced as a whole, so the worker sees either the old or the
+        # new settings
+        self.settings = (tuple(methods), dict(params or {}))
+
+    def start(self):
+        """Start reading and processing frames"""
+        self._reading = True
+        self._threads = [
+            threading.Thread(target=self._read_frames, daemon=True),
+            threading.Thread(target=self._process_frames, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop the threads and release the source"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._temporal is not None:
+            self._temporal.shutdown()
+        self.capture.release()
+
+    @property
+    def running(self):
+        """Whether frames are still being read or processed"""
+        with self._condition:
+            return (self._reading or self._busy
+                    or self._pending is not None) \
+                and not self._stop.is_set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _read_frames(self):
+        """Reader thread: hand frames to the worker, replacing stale ones"""
+        interval = 1.0 / self.fps
+        next_time = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                if self.paced:
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    # Behind schedule after a stall: restart the clock
+                    # instead of reading a burst of frames
+                    next_time = max(next_time + interval,
+                                    time.perf_counter())
+                ok, frame = self.capture.read()
+                if not ok:
+                    break
+                captured = time.perf_counter()
+                # Shrunk for the change detection here, so the worker only
+                # runs the detectors
+                small = TemporalEdgeDetector.downscale(frame) \
+                    if self.temporal else None
+                with self._condition:
+                    if not self.dropping:
+                        while (self._pending is not None
+                               and not self._stop.is_set()):
+                            self._condition.wait()
+                    elif self._pending is not None:
+                        self.frames_dropped += 1
+                    self._pending = (self.frames_read, frame, small,
+                                     captured)
+                    self.frames_read += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            self.error = f"Could not read frame: {e}"
+        finally:
+            with self._condition:
+                self._reading = False
+                self._condition.notify_all()
+
+    def _process_frames(self):
+        """Worker thread: run the detectors on the newest frame"""
+        while True:
+            with self._condition:
+                while (self._pending is None and self._reading
+                       and not self._stop.is_set()):
+                    self._condition.wait()
+                if self._pending is None or self._stop.is_set():
+                    return
+                index, frame, small, captured = self._pending
+                self._pending = None
+                self._busy = True
+                self._condition.notify_all()
+            try:
+                result = self._process(index, frame, small, captured)
+                if self.callback is not None:
+                    self.callback(result)
+            except Exception as e:
+                self.error = str(e)
+                self._stop.set()
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._busy = False
+                self._latest = result
+                self.frames_processed += 1
+                self._latencies.append(result.latency)
+                self._processed_times.append(time.perf_counter())
+                if self.max_frames and \
+                        self.frames_processed >= self.max_frames:
+                    # Stopped here, so no further frame is processed
+                    self._stop.set()
+                self._condition.notify_all()
+
+    def _process(self, index, frame, small, captured):
+        """Apply the current methods to one frame"""
+        methods, params = self.settings
+        detector = self.detector
+        results = {}
+        if self.temporal:
+            temporal = self._temporal
+            if temporal is None or temporal.detector is not detector:
+                # The detector was replaced, e.g. with other settings
+                if temporal is not None:
+                    temporal.shutdown()
+                temporal = TemporalEdgeDetector(
+                    detector, threshold=self.change_threshold)
+                self._temporal = temporal
+            temporal.update(frame, small)
+            for method in methods:
+                results[method] = temporal.apply(
+                    method, **params.get(method, {}))
+                if self.copy_results:
+                    results[method] = results[method].copy()
+        else:
+            context = detector.prepare(frame, self.workspace)
+            for method in methods:
+                results[method] = detector.apply(
+                    method, context, workspace=self.workspace,
+                    **params.get(method, {}))
+        latency = time.perf_counter() - captured
+
+        previews = {"Original": frame}
+        previews.update(results)
+        if self.display_size is not None:
+            previews = {name: self.image_processor.resize_for_display(
+                            image, self.display_size)
+                        for name, image in previews.items()}
+        return StreamResult(index, frame, results, previews, captured,
+                            latency)
+
+    def latest(self, after=-1, timeout=0):
+        """Return the newest result if it is newer than a given frame
+
+        Parameters:
+        - after: Index of the frame the caller already has
+        - timeout: Seconds to wait for a newer result
+
+        Returns:
+        - StreamResult, or None if there is no newer one yet
+        """
+        deadline = time.perf_counter() + timeout
+        with self._condition:
+            while self._latest is None or self._latest.index <= after:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.running:
+                    break
+                self._condition.wait(remaining)
+            if self._latest is not None and self._latest.index > after:
+                return self._latest
+            return None
+
+    def stats(self):
+        """Throughput and latency over the last frames
+
+        Returns:
+        - Dict with "fps" (processed frames per second), "latency" and
+          "latency_p95" (seconds), "read", "processed" and "dropped"
+        """
+        with self._condition:
+            latencies = sorted(self._latencies)
+            times = list(self._processed_times)
+            stats = {"read": self.frames_read,
+                     "processed": self.frames_processed,
+                     "dropped": self.frames_dropped}
+        stats["fps"] = 0.0
+        if len(times) > 1 and times[-1] > times[0]:
+            stats["fps"] = (len(times) - 1) / (times[-1] - times[0])
+        stats["latency"] = stats["latency_p95"] = 0.0
+        if latencies:
+            stats["latency"] = sum(latencies) / len(latencies)
+            stats["latency_p95"] = latencies[
+                min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        return stats
+
+    def stats_text(self):
+        """Short summary for status displays"""
+        stats = self.stats()
+        text = (f"Stream: {stats['fps']:.1f} fps, latency "
+                f"{stats['latency'] * 1000:.0f} ms (p95 "
+                f"{stats['latency_p95'] * 1000:.0f} ms), "
+                f"{stats['dropped']} dropped")
+        temporal = self._temporal
+        if self.temporal and temporal is not None:
+            text += f", {temporal.stats_text().lower()}"
+        return text
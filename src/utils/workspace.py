@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class Workspace:
+    """Reusable scratch buffers for repeated edge detection on same-sized frames
+
+    Buffers are looked up by name and reallocated only when the requested
+    shape or dtype changes, so processing a stream of equally sized frames
+    with the same workspace performs no new large allocations. A workspace
+    must not be shared between threads running at the same time.
+    """
+
+    def __init__(self):
+        """Initialize an empty workspace"""
+        self._buffers = {}
+
+    def buffer(self, name, shape, dtype):
+        """Return a scratch buffer, allocating it only when needed
+
+        Parameters:
+        - name: Name identifying the buffer within the workspace
+        - shape: Required array shape
+        - dtype: Required numpy dtype
+
+        Returns:
+        - Uninitialized numpy array of the requested shape and dtype
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+    def provide(self, name, array):
+        """Use an existing array as a named buffer
+
+        buffer() returns it for as long as the requested shape and dtype
+        match, e.g. for preallocated or specially aligned memory.
+
+        Parameters:
+        - name: Name identifying the buffer within the workspace
+        - array: Writable numpy array
+        """
+        self._buffers[name] = array
+
+    @property
+    def nbytes(self):
+        """Total size in bytes of all buffers held by the workspace"""
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+    def clear(self):
+        """Release all buffers"""
+        self._buffers.clear()
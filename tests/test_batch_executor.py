@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.utils.batch_executor import SharedMemoryExecutor
+from src.utils.edge_detection import EdgeDetector
+
+
+def make_frames(count=24):
+    """Blurred noise frames of assorted sizes"""
+    rng = np.random.default_rng(2)
+    frames = []
+    for key, scale in enumerate(rng.uniform(0.3, 1.5, count)):
+        shape = (int(600 * scale), int(800 * scale), 3)
+        noise = rng.integers(0, 256, shape).astype(np.uint8)
+        frames.append((key, cv2.GaussianBlur(noise, (0, 0), 3)))
+    return frames
+
+
+@pytest.mark.parametrize("precision", EdgeDetector.PRECISIONS)
+def test_workers_match_in_process_detection(precision):
+    frames = make_frames()
+    detector = EdgeDetector(precision)
+    with SharedMemoryExecutor(processes=2, precision=precision,
+                              chunk_size=3) as executor:
+        results = list(executor.map(frames))
+
+    assert [key for key, _, _ in results] == [key for key, _ in frames]
+    for key, result, error in results:
+        assert error is None
+        for method in EdgeDetector.METHODS:
+            np.testing.assert_array_equal(
+                result[method], detector.apply(method, frames[key][1]))
+
+
+def failing_frames(frames, count):
+    """Yield the first count frames, then raise"""
+    yield from frames[:count]
+    raise RuntimeError("decode failed")
+
+
+def test_failing_frames_return_their_blocks():
+    frames = make_frames(8)
+    with SharedMemoryExecutor(processes=2, chunk_size=3,
+                              max_in_flight=6) as executor:
+        # Five frames: one chunk submitted, two frames of the next one
+        # taken when the iterator fails
+        with pytest.raises(RuntimeError):
+            list(executor.map(failing_frames(frames, 5)))
+        assert executor.free_blocks == 5
+
+        # The recycled blocks serve the next run
+        results = list(executor.map(frames))
+        assert [error for _, _, error in results] == [None] * len(frames)
+
+
+def test_closed_map_returns_undelivered_blocks():
+    frames = make_frames(6)
+    with SharedMemoryExecutor(processes=2, chunk_size=3,
+                              max_in_flight=6) as executor:
+        results = executor.map(frames)
+        next(results)
+        results.close()
+        assert executor.free_blocks == 6
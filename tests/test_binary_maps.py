@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.utils.binary_maps import BinaryEdgeMap, load_npz, save_npz
+from src.utils.image_processor import ImageProcessor
+from src.utils.result_cache import ResultCache
+
+
+def make_edges(shape, density):
+    """Random binary edge map of 0 and 255"""
+    rng = np.random.default_rng(3)
+    return np.where(rng.random(shape) < density, 255, 0).astype(np.uint8)
+
+
+# Empty, full, 1x1 maps and widths that are not multiples of 8
+EDGE_MAPS = {
+    "empty": np.zeros((17, 29), np.uint8),
+    "full": np.full((17, 29), 255, np.uint8),
+    "single_edge": np.full((1, 1), 255, np.uint8),
+    "single_empty": np.zeros((1, 1), np.uint8),
+    "sparse": make_edges((31, 45), 0.01),
+    "dense": make_edges((40, 13), 0.5),
+    "canny": cv2.Canny(cv2.GaussianBlur(make_edges((64, 77), 0.5),
+                                        (0, 0), 2), 50, 100),
+}
+
+
+@pytest.fixture(params=sorted(EDGE_MAPS))
+def edges(request):
+    return EDGE_MAPS[request.param]
+
+
+@pytest.mark.parametrize("encoding", BinaryEdgeMap.ENCODINGS)
+def test_encode_round_trip(edges, encoding):
+    encoded = BinaryEdgeMap.encode(edges, encoding)
+    assert encoded.count_nonzero() == cv2.countNonZero(edges)
+    decoded = encoded.decode()
+    assert decoded.dtype == np.uint8
+    np.testing.assert_array_equal(decoded, edges)
+
+    # Decoding into a dirty buffer overwrites every pixel
+    out = np.full(edges.shape, 7, np.uint8)
+    assert encoded.decode(out) is out
+    np.testing.assert_array_equal(out, edges)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+@pytest.mark.parametrize("encoding", BinaryEdgeMap.ENCODINGS)
+def test_save_load_round_trip(edges, encoding, compress, tmp_path):
+    path = tmp_path / "edges.npz"
+    BinaryEdgeMap.encode(edges, encoding).save(str(path), compress)
+    np.testing.assert_array_equal(
+        BinaryEdgeMap.load(str(path)).decode(), edges)
+
+
+def test_save_npz_round_trip(edges, tmp_path):
+    path = str(tmp_path / "edges.npz")
+    save_npz(edges, path)
+    result = load_npz(path)
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, edges)
+
+
+def test_save_npz_keeps_other_images(tmp_path):
+    image = make_edges((9, 11), 0.5) // 3
+    path = str(tmp_path / "image.npz")
+    save_npz(image, path)
+    np.testing.assert_array_equal(load_npz(path), image)
+
+
+def test_result_cache_packed_round_trip(edges, tmp_path):
+    cache = ResultCache(str(tmp_path), pack_binary=True)
+    cache.put("key", edges)
+    assert (tmp_path / "key.npz").exists()
+    result = cache.get("key")
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, edges)
+
+    # A fresh cache finds the packed entry on disk
+    np.testing.assert_array_equal(
+        ResultCache(str(tmp_path), pack_binary=True).get("key"), edges)
+
+
+@pytest.mark.parametrize("extension", [".png", ".webp"])
+def test_save_image_bilevel_round_trip(edges, extension, tmp_path):
+    path = str(tmp_path / f"edges{extension}")
+    assert ImageProcessor().save_image(edges, path, bilevel=True)
+    result = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    np.testing.assert_array_equal(result, edges)
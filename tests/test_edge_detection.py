@@ -0,0 +1,154 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.workspace import Workspace
+
+
+def make_image():
+    """Fixed BGR test image with smooth gradients, shapes and noise"""
+    rng = np.random.default_rng(0)
+    height, width = 120, 160
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.empty((height, width, 3), dtype=np.float64)
+    image[..., 0] = 255 * x / width
+    image[..., 1] = 255 * y / height
+    image[..., 2] = 128
+    image[30:90, 40:120] = (230, 40, 90)
+    cv2.circle(image, (80, 60), 25, (20, 200, 250), -1)
+    image += rng.normal(0, 8, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def normalize(magnitude):
+    """Baseline float64 normalization to uint8"""
+    normalized = cv2.normalize(magnitude, None, 0, 255, cv2.NORM_MINMAX)
+    return normalized.astype(np.uint8)
+
+
+def baseline_sobel(image):
+    sobelx = cv2.Sobel(gray(image), cv2.CV_64F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(gray(image), cv2.CV_64F, 0, 1, ksize=3)
+    return normalize(np.sqrt(np.square(sobelx) + np.square(sobely)))
+
+
+def baseline_prewitt(image):
+    # Signed gradients, as fixed in user-004; the original filter2D into
+    # uint8 clipped every negative response
+    kernelx = np.array([[1, 0, -1], [1, 0, -1], [1, 0, -1]], np.float64)
+    prewittx = cv2.filter2D(gray(image), cv2.CV_64F, kernelx)
+    prewitty = cv2.filter2D(gray(image), cv2.CV_64F, kernelx.T)
+    return normalize(np.sqrt(np.square(prewittx) + np.square(prewitty)))
+
+
+def baseline_laplacian(image):
+    blurred = cv2.GaussianBlur(gray(image), (5, 5), 0)
+    laplacian = np.absolute(cv2.Laplacian(blurred, cv2.CV_64F))
+    return np.uint8(np.clip(laplacian, 0, 255))
+
+
+BASELINES = {
+    "Sobel": baseline_sobel,
+    "Prewitt": baseline_prewitt,
+    "Laplacian": baseline_laplacian,
+}
+
+
+def max_difference(a, b):
+    return int(np.abs(a.astype(np.int16) - b.astype(np.int16)).max())
+
+
+@pytest.mark.parametrize("precision", EdgeDetector.PRECISIONS)
+@pytest.mark.parametrize("method", sorted(BASELINES))
+def test_precision_within_one_grey_level(method, precision):
+    image = make_image()
+    result = EdgeDetector(precision).apply(method, image)
+    expected = BASELINES[method](image)
+    assert result.dtype == np.uint8
+    assert result.shape == expected.shape
+    assert max_difference(result, expected) <= 1
+
+
+@pytest.mark.parametrize("method", sorted(BASELINES))
+def test_float64_matches_baseline(method):
+    image = make_image()
+    result = EdgeDetector(EdgeDetector.PRECISION_FLOAT64).apply(
+        method, image)
+    np.testing.assert_array_equal(result, BASELINES[method](image))
+
+
+@pytest.mark.parametrize("precision", EdgeDetector.PRECISIONS)
+def test_prewitt_keeps_negative_gradients(precision):
+    # A bright to dark step only has negative gradients
+    image = np.zeros((8, 8), dtype=np.uint8)
+    image[:, :4] = 200
+    result = EdgeDetector(precision).apply_prewitt(image)
+    expected = np.zeros((8, 8), dtype=np.uint8)
+    expected[:, 3:5] = 255
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_unknown_precision():
+    with pytest.raises(ValueError):
+        EdgeDetector("float16")
+
+
+def offset_buffer(shape, dtype, offset):
+    """Uninitialized array starting offset bytes past a 64-byte boundary"""
+    dtype = np.dtype(dtype)
+    raw = np.empty(int(np.prod(shape)) * dtype.itemsize + 128, np.uint8)
+    start = -raw.ctypes.data % 64 + offset
+    return np.ndarray(shape, dtype, buffer=raw, offset=start)
+
+
+@pytest.mark.parametrize("precision", EdgeDetector.PRECISIONS)
+@pytest.mark.parametrize("method", ["Sobel", "Prewitt"])
+def test_magnitude_independent_of_buffer_alignment(method, precision):
+    # With IPP, cv2.magnitude rounds differently when its destination is
+    # not 32-byte aligned. numpy only guarantees 16 bytes, so worker
+    # processes disagreed with the parent on the same frame.
+    image = make_image()
+    detector = EdgeDetector(precision)
+    compute = getattr(detector, f"{method.lower()}_magnitude")
+    dtype = np.float64 if precision == EdgeDetector.PRECISION_FLOAT64 \
+        else np.float32
+    magnitudes = []
+    for offset in (0, 16, 32, 48):
+        workspace = Workspace()
+        workspace.provide("magnitude", offset_buffer(
+            image.shape[:2], dtype, offset))
+        magnitudes.append(compute(image, workspace).copy())
+    for magnitude in magnitudes[1:]:
+        np.testing.assert_array_equal(magnitude, magnitudes[0])
+
+
+@pytest.mark.parametrize("mode", EdgeDetector.AUTO_THRESHOLDS)
+@pytest.mark.parametrize("shape", [(40000, 20), (20, 40000)])
+def test_auto_thresholds_on_very_long_sides(shape, mode):
+    # cv2.remap rejects sides of 32767 pixels or more
+    rng = np.random.default_rng(1)
+    image = cv2.GaussianBlur(
+        rng.integers(0, 256, shape + (3,)).astype(np.uint8), (0, 0), 2)
+    detector = EdgeDetector()
+    low, high = detector.canny_thresholds(image, mode)
+    assert 0 <= low <= high <= 255 * 8
+
+    if mode == EdgeDetector.AUTO_MEDIAN:
+        # Sample points of the whole blurred image give the same median
+        blurred = cv2.GaussianBlur(gray(image), (5, 5), 0)
+        rows = np.unique(np.linspace(3, shape[0] - 4,
+                                     min(64, shape[0] - 6)).round())
+        cols = np.unique(np.linspace(3, shape[1] - 4,
+                                     min(64, shape[1] - 6)).round())
+        samples = blurred[np.ix_(rows.astype(int), cols.astype(int))]
+        median = np.sort(samples, axis=None)[(samples.size - 1) // 2]
+        assert (low, high) == pytest.approx((0.67 * median, 1.33 * median))
+
+    result = detector.apply_canny(image, auto_threshold=mode)
+    np.testing.assert_array_equal(
+        result, detector.apply_canny(image, low, high))
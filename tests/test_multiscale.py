@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.multiscale import MultiScaleEdgeDetector
+from src.utils.workspace import Workspace
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64, np.int16])
+@pytest.mark.parametrize("shape", [(2, 7), (130, 301), (600, 800),
+                                   (653, 871)])
+def test_upsampled_strips_match_whole_resize(shape, dtype):
+    # pyrDown levels have half the size, rounded up
+    rng = np.random.default_rng(0)
+    coarse_shape = ((shape[0] + 1) // 2, (shape[1] + 1) // 2)
+    image = rng.normal(0, 300, coarse_shape).astype(dtype)
+    expected = cv2.resize(image, (shape[1], shape[0]),
+                          interpolation=cv2.INTER_LINEAR)
+
+    upsampled = np.empty(shape, dtype)
+    strips = MultiScaleEdgeDetector()._upsampled_strips(
+        image, shape, Workspace(), "up")
+    for rows, strip in strips:
+        upsampled[rows] = strip
+    np.testing.assert_array_equal(upsampled, expected)
+
+
+@pytest.mark.parametrize("shape", [(181, 233), (653, 871)])
+@pytest.mark.parametrize("fusion", EdgeDetector.FUSIONS)
+@pytest.mark.parametrize("method", EdgeDetector.METHODS)
+def test_row_bands_match_single_thread(method, fusion, shape):
+    # 653 rows give levels of odd height, 181 rows fewer bands than workers
+    rng = np.random.default_rng(1)
+    image = cv2.GaussianBlur(
+        rng.integers(0, 256, shape + (3,)).astype(np.uint8), (0, 0), 2)
+    expected = MultiScaleEdgeDetector(EdgeDetector(), 3, fusion).apply(
+        method, image)
+    banded = MultiScaleEdgeDetector(EdgeDetector(workers=4), 3, fusion)
+    try:
+        for _ in range(2):
+            np.testing.assert_array_equal(
+                banded.apply(method, EdgeDetector.prepare(image)), expected)
+    finally:
+        banded.shutdown()
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.temporal import TemporalEdgeDetector
+
+
+def make_frames(count=6):
+    """Static BGR scene with a solid square moving on a 4 pixel grid
+
+    Every changed pixel lies in a fully changed 4x4 cell, so the
+    downscaled comparison sees all changes.
+    """
+    rng = np.random.default_rng(5)
+    scene = cv2.GaussianBlur(
+        rng.integers(0, 256, (200, 264, 3)).astype(np.uint8), (0, 0), 3)
+    frames = []
+    for index in range(count):
+        frame = scene.copy()
+        x, y = 8 + 16 * index, 12 + 8 * index
+        frame[y:y + 40, x:x + 48] = (250, 250, 250)
+        frames.append(frame)
+    return frames
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("method", ["Sobel", "Prewitt", "Laplacian"])
+def test_matches_full_computation(method, workers):
+    detector = EdgeDetector(workers=workers)
+    temporal = TemporalEdgeDetector(detector, block_size=32)
+    for frame in make_frames():
+        temporal.update(frame)
+        np.testing.assert_array_equal(temporal.apply(method),
+                                      EdgeDetector().apply(method, frame))
+    # Only the blocks around the square were recomputed
+    assert temporal.blocks_computed < temporal.blocks_requested / 2
+
+
+def test_edge_maps_are_read_only_views():
+    frames = make_frames(3)
+    temporal = TemporalEdgeDetector(block_size=32)
+    temporal.update(frames[0])
+    edges = temporal.apply("Sobel")
+    assert not edges.flags.writeable
+
+    out = np.empty(frames[0].shape[:2], np.uint8)
+    temporal.update(frames[1])
+    temporal.apply("Sobel", out=out)
+    # Updated in place; out receives a copy
+    assert temporal.apply("Sobel") is edges
+    np.testing.assert_array_equal(edges, out)
+    np.testing.assert_array_equal(out, EdgeDetector().apply("Sobel",
+                                                            frames[1]))
+
+
+def test_unchanged_frames_compute_nothing():
+    frame = make_frames(1)[0]
+    temporal = TemporalEdgeDetector(block_size=32)
+    temporal.update(frame)
+    expected = temporal.apply("Canny").copy()
+    computed = temporal.blocks_computed
+    for _ in range(3):
+        assert temporal.update(frame.copy()) == 0.0
+        np.testing.assert_array_equal(temporal.apply("Canny"), expected)
+    assert temporal.blocks_computed == computed
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.utils.edge_detection import EdgeDetector
+from src.utils.tiling import TiledEdgeDetector
+
+
+def make_image():
+    """BGR test image whose edges run across many small tiles"""
+    rng = np.random.default_rng(4)
+    height, width = 181, 233
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.empty((height, width, 3), dtype=np.float64)
+    image[..., 0] = 127 + 100 * np.sin(x / 9.0 + y / 23.0)
+    image[..., 1] = 127 + 100 * np.cos(y / 11.0)
+    image[..., 2] = 255 * (x + y) / (width + height)
+    cv2.circle(image, (120, 90), 70, (250, 30, 60), 3)
+    cv2.line(image, (0, 170), (232, 5), (10, 240, 10), 2)
+    image += rng.normal(0, 12, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+# Small tiles, so Canny edges cross many seams
+TILE_SIZES = [37, (37, 64), None]
+
+
+@pytest.mark.parametrize("tile_size", TILE_SIZES)
+@pytest.mark.parametrize("precision", EdgeDetector.PRECISIONS)
+@pytest.mark.parametrize("method", EdgeDetector.METHODS)
+def test_tiled_matches_untiled(method, precision, tile_size):
+    image = make_image()
+    detector = EdgeDetector(precision)
+    tiled = TiledEdgeDetector(detector, tile_size=tile_size, workers=3)
+    try:
+        result = tiled.apply(method, image)
+    finally:
+        tiled.shutdown()
+    np.testing.assert_array_equal(result, detector.apply(method, image))
+
+
+@pytest.mark.parametrize("retain_tiles", [False, True])
+@pytest.mark.parametrize("method", ["Sobel", "Prewitt"])
+def test_retained_tiles_match_untiled(method, retain_tiles):
+    image = make_image()
+    detector = EdgeDetector()
+    tiled = TiledEdgeDetector(detector, tile_size=37,
+                              retain_tiles=retain_tiles)
+    np.testing.assert_array_equal(tiled.apply(method, image),
+                                  detector.apply(method, image))
+
+
+@pytest.mark.parametrize("params", [
+    {"threshold1": 20, "threshold2": 60},
+    {"threshold1": 150, "threshold2": 50, "blur_ksize": 3},
+    {"auto_threshold": EdgeDetector.AUTO_MEDIAN},
+    {"auto_threshold": EdgeDetector.AUTO_OTSU, "blur_ksize": 7},
+])
+def test_tiled_canny_hysteresis_crosses_seams(params):
+    image = make_image()
+    detector = EdgeDetector()
+    expected = detector.apply_canny(image, **params)
+    assert cv2.countNonZero(expected) > 0
+    result = TiledEdgeDetector(detector, tile_size=37).apply(
+        "Canny", image, **params)
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("workers", [2, 3, 8])
+@pytest.mark.parametrize("precision", EdgeDetector.PRECISIONS)
+@pytest.mark.parametrize("method", EdgeDetector.METHODS)
+def test_row_bands_match_single_thread(method, precision, workers):
+    image = make_image()
+    expected = EdgeDetector(precision).apply(method, image)
+    banded = EdgeDetector(precision, workers=workers)
+    np.testing.assert_array_equal(banded.apply(method, image), expected)
+    # The band threads are reused for the next image
+    np.testing.assert_array_equal(banded.apply(method, image), expected)
+
+
+@pytest.mark.parametrize("mode", EdgeDetector.AUTO_THRESHOLDS)
+def test_row_bands_match_single_thread_auto_canny(mode):
+    image = make_image()
+    expected = EdgeDetector().apply("Canny", image, auto_threshold=mode)
+    result = EdgeDetector(workers=4).apply(
+        "Canny", EdgeDetector.prepare(image), auto_threshold=mode)
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("keep_gradients", [False, True])
+def test_row_bands_share_the_context(keep_gradients, monkeypatch):
+    image = make_image()
+    expected = {method: EdgeDetector().apply(method, image)
+                for method in EdgeDetector.METHODS}
+
+    blurs = []
+    gaussian_blur = cv2.GaussianBlur
+    monkeypatch.setattr(cv2, "GaussianBlur",
+                        lambda *args, **kwargs: blurs.append(args[1])
+                        or gaussian_blur(*args, **kwargs))
+    detector = EdgeDetector(workers=4)
+    context = detector.prepare(image)
+    for method in EdgeDetector.METHODS:
+        params = {"keep_gradients": keep_gradients} \
+            if method == "Canny" else {}
+        np.testing.assert_array_equal(
+            detector.apply(method, context, **params), expected[method])
+    # Canny and Laplacian blur the image once for all bands
+    assert blurs == [(5, 5)]